@@ -1,5 +1,11 @@
-from .utilities import open, fetch, fetch_over_ssh
+from .utilities import open, fetch, fetch_many, fetch_over_ssh, iter_models
+from .utilities import configure_fetching, save_models
+from .utilities import open_async, fetch_async, fetch_over_ssh_async
+from .utilities import SSHFetcher
 from .structures import Atom, Residue, Ligand, Chain, Model
+from .snapshot import load_snapshot
+from .dcd import open_dcd
+from .components import open_components, use_components
 
 __author__ = "Sam Ireland"
 __version__ = "1.0.4"
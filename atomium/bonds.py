@@ -0,0 +1,513 @@
+"""Contains the table which atoms' bonds are stored in, and the graph
+algorithms which run on it.
+
+Bonds are held as a compressed sparse row (CSR) table over the atoms that
+have any - an array of the bonded atom indices of every atom, one after the
+other, an array of their bond orders, and an array of where each atom's
+bonds start in the other two. Bonds added since the table was last read are
+kept in a list, and folded into the arrays the next time they are needed, so
+that building up a table one bond at a time stays cheap."""
+
+import numpy as np
+
+class BondTable:
+    """The bonds between a set of atoms. Atoms are given an index, in the
+    order they are first bonded, and bonds are stored as pairs of these
+    indices with a bond order.
+
+    A table is usually shared by every bonded atom in a :py:class:`.Model`,
+    and is created the first time any of them is bonded, so that models
+    without bonds have no table at all. Bonding two atoms from different
+    tables merges the tables into one."""
+
+    def __init__(self):
+        self._atoms, self._indices = [], {}
+        self._pairs = np.zeros((0, 2), dtype="i4")
+        self._orders = np.zeros(0, dtype="i1")
+        self._pending, self._csr = [], None
+
+
+    @classmethod
+    def from_arrays(cls, atoms, pairs, orders=None):
+        """Creates a table from bonds given as pairs of positions in a list
+        of atoms, all at once rather than one bond at a time. Only atoms with
+        bonds are added to the table. The atoms shouldn't have been bonded
+        already.
+
+        :param list atoms: the atoms the positions refer to.
+        :param numpy.ndarray pairs: the positions of the two atoms in each\
+        bond, of shape ``(bonds, 2)``.
+        :param numpy.ndarray orders: the order of each bond - by default they\
+        are all single bonds.
+        :rtype: ``BondTable``"""
+
+        table = cls()
+        pairs = np.asarray(pairs, dtype="i8").reshape(-1, 2)
+        orders = np.ones(len(pairs), dtype="i1") if orders is None else (
+         np.asarray(orders, dtype="i1")
+        )
+        distinct = pairs[:, 0] != pairs[:, 1]
+        pairs, orders = pairs[distinct], orders[distinct]
+        used = np.unique(pairs)
+        table._atoms = [atoms[i] for i in used.tolist()]
+        table._indices = None
+        for atom in table._atoms: atom._bonds = table
+        table._pairs, table._orders = deduplicate_pairs(
+         np.sort(np.searchsorted(used, pairs), axis=1), orders, len(used)
+        )
+        return table
+
+
+    def __repr__(self):
+        return "<BondTable ({} bond{}, {} atom{})>".format(
+         len(self), "" if len(self) == 1 else "s",
+         len(self._atoms), "" if len(self._atoms) == 1 else "s"
+        )
+
+
+    def __len__(self):
+        self._flush()
+        return len(self._pairs)
+
+
+    @property
+    def atoms(self):
+        """The table's atoms, in index order.
+
+        :rtype: ``tuple``"""
+
+        return tuple(self._atoms)
+
+
+    @property
+    def pairs(self):
+        """The indices of the two atoms in each bond, as an array of shape
+        ``(bonds, 2)`` with the lower index first.
+
+        :rtype: ``numpy.ndarray``"""
+
+        self._flush()
+        return self._pairs
+
+
+    @property
+    def orders(self):
+        """The order of each bond, in the same order as :py:attr:`.pairs`.
+
+        :rtype: ``numpy.ndarray``"""
+
+        self._flush()
+        return self._orders
+
+
+    @property
+    def csr(self):
+        """The table as three arrays - where each atom's bonds start and end
+        in the other two, the index of the atom at the far end of each bond,
+        and each bond's order. Every bond appears twice, once for each of its
+        atoms.
+
+        :rtype: ``tuple``"""
+
+        if self._csr is None:
+            self._flush()
+            self._csr = pairs_to_csr(self._pairs, self._orders, len(self._atoms))
+        return self._csr
+
+
+    def index(self, atom):
+        """Returns the index of an atom in the table, or ``None`` if it has
+        never been bonded.
+
+        :param Atom atom: the atom to look up.
+        :rtype: ``int``"""
+
+        return self._get_indices().get(atom)
+
+
+    def add(self, atom1, atom2, order=1):
+        """Bonds two atoms. If they are already bonded, the bond's order is
+        changed. Any other table either atom is in is merged into this one.
+
+        :param Atom atom1: the first atom.
+        :param Atom atom2: the second atom.
+        :param int order: the bond order."""
+
+        for atom in (atom1, atom2):
+            if atom._bonds is not None and atom._bonds is not self:
+                self.merge(atom._bonds)
+        index1, index2 = self._add_atom(atom1), self._add_atom(atom2)
+        self._pending.append((min(index1, index2), max(index1, index2), order))
+        self._csr = None
+
+
+    def merge(self, other):
+        """Moves every bond of another table into this one, after which that
+        table's atoms belong to this one.
+
+        :param BondTable other: the table to merge in."""
+
+        other._flush()
+        indices = np.array([self._add_atom(a) for a in other._atoms], dtype="i4")
+        pairs = np.sort(indices[other._pairs], axis=1)
+        self._pending += zip(*pairs.T.tolist(), other._orders.tolist())
+        self._csr = None
+        other.__init__()
+
+
+    def extend(self, atoms, pairs, orders=None):
+        """Adds bonds given as pairs of positions in a list of atoms, all at
+        once. Bonds the table already has keep the order they have, and any
+        other table the atoms are in is merged into this one first.
+
+        :param list atoms: the atoms the positions refer to.
+        :param numpy.ndarray pairs: the positions of the two atoms in each\
+        bond, of shape ``(bonds, 2)``.
+        :param numpy.ndarray orders: the order of each bond - by default they\
+        are all single bonds."""
+
+        pairs = np.asarray(pairs, dtype="i8").reshape(-1, 2)
+        orders = np.ones(len(pairs), dtype="i1") if orders is None else (
+         np.asarray(orders, dtype="i1")
+        )
+        distinct = pairs[:, 0] != pairs[:, 1]
+        pairs, orders = pairs[distinct], orders[distinct]
+        used = np.unique(pairs)
+        for atom in [atoms[i] for i in used.tolist()]:
+            if atom._bonds is not None and atom._bonds is not self:
+                self.merge(atom._bonds)
+        indices = np.array(
+         [self._add_atom(atoms[i]) for i in used.tolist()], dtype="i8"
+        )
+        self._flush()
+        self._pairs, self._orders = deduplicate_pairs(
+         np.concatenate([
+          np.sort(indices[np.searchsorted(used, pairs)], axis=1), self._pairs
+         ]), np.concatenate([orders, self._orders]), len(self._atoms)
+        )
+        self._csr = None
+
+
+    def bonded_atoms(self, atom):
+        """Returns the atoms bonded to an atom.
+
+        :param Atom atom: the atom to look up.
+        :rtype: ``set``"""
+
+        index = self._get_indices().get(atom)
+        if index is None: return set()
+        starts, neighbours, _ = self.csr
+        return {self._atoms[i] for i in (
+         neighbours[starts[index]:starts[index + 1]].tolist()
+        )}
+
+
+    def order(self, atom1, atom2):
+        """Returns the order of the bond between two atoms, or ``None`` if
+        they are not bonded.
+
+        :param Atom atom1: the first atom.
+        :param Atom atom2: the second atom.
+        :rtype: ``int``"""
+
+        indices = self._get_indices()
+        index1, index2 = indices.get(atom1), indices.get(atom2)
+        if index1 is None or index2 is None: return None
+        starts, neighbours, orders = self.csr
+        row = slice(starts[index1], starts[index1 + 1])
+        matches = np.flatnonzero(neighbours[row] == index2)
+        return int(orders[row][matches[0]]) if len(matches) else None
+
+
+    def graph_distances(self, atom):
+        """Returns the number of bonds between an atom and every atom in the
+        table, in index order, with -1 for atoms it is not connected to.
+
+        :param Atom atom: the atom to measure from.
+        :rtype: ``numpy.ndarray``"""
+
+        starts, neighbours, _ = self.csr
+        distances = np.full(len(self._atoms), -1, dtype="i4")
+        index = self._get_indices().get(atom)
+        if index is None: return distances
+        frontier, distance = np.array([index]), 0
+        distances[index] = 0
+        while len(frontier):
+            distance += 1
+            _, reached = expand_rows(starts, neighbours, frontier)
+            frontier = np.unique(reached[distances[reached] < 0])
+            distances[frontier] = distance
+        return distances
+
+
+    def graph_distance(self, atom1, atom2):
+        """Returns the smallest number of bonds between two atoms, or
+        ``None`` if they are not connected.
+
+        :param Atom atom1: the first atom.
+        :param Atom atom2: the second atom.
+        :rtype: ``int``"""
+
+        index = self._get_indices().get(atom2)
+        if index is None: return None
+        distance = int(self.graph_distances(atom1)[index])
+        return None if distance < 0 else distance
+
+
+    def fragments(self):
+        """Returns the separate groups of bonded atoms in the table - sets of
+        atoms which are connected to each other by bonds, and to no others.
+        They are ordered largest first.
+
+        :rtype: ``list``"""
+
+        self._flush()
+        labels = label_fragments(self._pairs, len(self._atoms))
+        order = np.argsort(labels, kind="stable")
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        groups = np.split(order, bounds) if len(order) else []
+        return sorted([{self._atoms[i] for i in group.tolist()} for group in (
+         groups
+        )], key=len, reverse=True)
+
+
+    def rings(self):
+        """Returns the rings in the table - for every bond which is part of a
+        ring, the smallest ring it is part of. Each ring is a list of its
+        atoms in the order they are bonded, and they are ordered smallest
+        first.
+
+        :rtype: ``list``"""
+
+        starts, neighbours, _ = self.csr
+        cyclic = prune_chains(starts, neighbours, len(self._atoms))
+        rings, seen = [], set()
+        for index1, index2 in self._pairs[
+         cyclic[self._pairs[:, 0]] & cyclic[self._pairs[:, 1]]
+        ].tolist():
+            path = shortest_path(starts, neighbours, index1, index2, cyclic)
+            if path and frozenset(path) not in seen:
+                seen.add(frozenset(path))
+                rings.append([self._atoms[i] for i in path])
+        return sorted(rings, key=len)
+
+
+    def _get_indices(self):
+        """Returns the ``dict`` of atoms to their indices, making it the first
+        time it is needed if the table was made from arrays.
+
+        :rtype: ``dict``"""
+
+        if self._indices is None:
+            self._indices = {atom: i for i, atom in enumerate(self._atoms)}
+        return self._indices
+
+
+    def _add_atom(self, atom):
+        """Gives an atom an index in the table, if it doesn't have one.
+
+        :param Atom atom: the atom to add.
+        :rtype: ``int``"""
+
+        indices = self._get_indices()
+        index = indices.get(atom)
+        if index is None:
+            index = indices[atom] = len(self._atoms)
+            self._atoms.append(atom)
+            atom._bonds = self
+        return index
+
+
+    def _flush(self):
+        """Folds any bonds added since the arrays were last built into them.
+        Where a bond has been added more than once, the last order given is
+        kept."""
+
+        if not self._pending: return
+        pending = np.array(self._pending, dtype="i4").reshape(-1, 3)
+        self._pairs, self._orders = deduplicate_pairs(
+         np.concatenate([self._pairs, pending[:, :2]]),
+         np.concatenate([self._orders, pending[:, 2].astype("i1")]),
+         len(self._atoms)
+        )
+        self._pending = []
+
+
+
+def deduplicate_pairs(pairs, orders, count):
+    """Removes repeated bonds from pairs of atom indices, each with the lower
+    index first. Where a bond appears more than once, the last order given for
+    it is kept.
+
+    :param numpy.ndarray pairs: the atom indices of each bond.
+    :param numpy.ndarray orders: the order of each bond.
+    :param int count: the number of atoms.
+    :rtype: ``tuple``"""
+
+    keys = pairs[:, 0].astype("i8") * count + pairs[:, 1]
+    _, last = np.unique(keys[::-1], return_index=True)
+    keep = np.sort(len(keys) - 1 - last)
+    return pairs[keep].astype("i4"), orders[keep]
+
+
+def find_bonds(coordinates, radii, tolerance=0.45, groups=None):
+    """Finds which atoms are bonded from where they are - every pair closer
+    together than the sum of their covalent radii plus some tolerance, but no
+    closer than :py:data:`MINIMUM_BOND_LENGTH`. Atoms with no radius are never
+    bonded, and nor are atoms in the same group, if groups are given.
+
+    Rather than measuring every pair, the atoms are sorted into a grid of
+    cubic cells as wide as the longest possible bond, so that only atoms in
+    the same or adjacent cells need to be compared. Each pair of adjacent
+    cells is visited once, by looking at half of each cell's neighbours, and
+    the atoms of every pair of cells at a given offset are compared at once.
+
+    :param numpy.ndarray coordinates: the atoms' coordinates, one row each.
+    :param numpy.ndarray radii: the atoms' covalent radii.
+    :param float tolerance: how much longer than the sum of two atoms'\
+    radii a bond between them can be.
+    :param numpy.ndarray groups: a group code for each atom.
+    :returns: the positions of the two atoms in each bond, lower first.
+    :rtype: ``numpy.ndarray``"""
+
+    coordinates = np.asarray(coordinates, dtype="f8").reshape(-1, 3)
+    radii = np.asarray(radii, dtype="f8")
+    if not len(radii) or radii.max() <= 0: return np.zeros((0, 2), dtype="i8")
+    size = 2 * radii.max() + tolerance
+    cells = np.floor(
+     (coordinates - coordinates.min(axis=0)) / size
+    ).astype("i8") + 1
+    dimensions = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dimensions[1] + cells[:, 1]) * dimensions[2] + (
+     cells[:, 2]
+    )
+    order = np.argsort(keys, kind="stable")
+    occupied, starts, counts = np.unique(
+     keys[order], return_index=True, return_counts=True
+    )
+    bonds = []
+    for dx, dy, dz in HALF_SHELL:
+        targets = occupied + (dx * dimensions[1] + dy) * dimensions[2] + dz
+        found = np.minimum(np.searchsorted(occupied, targets), len(occupied) - 1)
+        cells1 = np.flatnonzero(occupied[found] == targets)
+        cells2 = found[cells1]
+        counts1, counts2 = counts[cells1], counts[cells2]
+        totals = counts1 * counts2
+        pair_cells = np.repeat(np.arange(len(totals)), totals)
+        within = np.arange(totals.sum()) - np.repeat(
+         np.cumsum(totals) - totals, totals
+        )
+        atoms1 = order[starts[cells1][pair_cells] + within // counts2[pair_cells]]
+        atoms2 = order[starts[cells2][pair_cells] + within % counts2[pair_cells]]
+        if (dx, dy, dz) == (0, 0, 0):
+            atoms1, atoms2 = atoms1[atoms1 < atoms2], atoms2[atoms1 < atoms2]
+        lengths = ((coordinates[atoms1] - coordinates[atoms2]) ** 2).sum(axis=1)
+        limits = radii[atoms1] + radii[atoms2] + tolerance
+        bonded = (lengths <= limits ** 2) & (lengths >= MINIMUM_BOND_LENGTH ** 2)
+        bonded &= (radii[atoms1] > 0) & (radii[atoms2] > 0)
+        if groups is not None: bonded &= groups[atoms1] != groups[atoms2]
+        bonds.append(np.sort(np.column_stack(
+         [atoms1[bonded], atoms2[bonded]]
+        ), axis=1))
+    return np.concatenate(bonds)
+
+
+def pairs_to_csr(pairs, orders, count):
+    """Turns pairs of bonded atom indices into a compressed sparse row table,
+    in which each bond is listed under both of its atoms.
+
+    :param numpy.ndarray pairs: the atom indices of each bond.
+    :param numpy.ndarray orders: the order of each bond.
+    :param int count: the number of atoms.
+    :rtype: ``tuple``"""
+
+    rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    columns = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    order = np.lexsort((columns, rows))
+    starts = np.zeros(count + 1, dtype="i8")
+    np.cumsum(np.bincount(rows, minlength=count), out=starts[1:])
+    return starts, columns[order], np.concatenate([orders, orders])[order]
+
+
+def expand_rows(starts, neighbours, rows):
+    """Gets the bonds of several atoms at once from a compressed sparse row
+    table.
+
+    :param numpy.ndarray starts: where each atom's bonds start.
+    :param numpy.ndarray neighbours: the far atom of each bond.
+    :param numpy.ndarray rows: the atoms whose bonds are wanted.
+    :returns: the atom each bond belongs to, and the atom at its far end.
+    :rtype: ``tuple``"""
+
+    lengths = starts[rows + 1] - starts[rows]
+    offsets = np.repeat(starts[rows] - np.cumsum(lengths) + lengths, lengths)
+    offsets += np.arange(lengths.sum())
+    return np.repeat(rows, lengths), neighbours[offsets]
+
+
+def label_fragments(pairs, count):
+    """Labels every atom with the lowest index of any atom it is connected to,
+    by passing labels along bonds until they stop changing.
+
+    :param numpy.ndarray pairs: the atom indices of each bond.
+    :param int count: the number of atoms.
+    :rtype: ``numpy.ndarray``"""
+
+    labels = np.arange(count)
+    while True:
+        new = labels.copy()
+        np.minimum.at(new, pairs[:, 0], labels[pairs[:, 1]])
+        np.minimum.at(new, pairs[:, 1], labels[pairs[:, 0]])
+        new = new[new]
+        if np.array_equal(new, labels): return labels
+        labels = new
+
+
+def prune_chains(starts, neighbours, count):
+    """Works out which atoms could be in a ring, by repeatedly removing atoms
+    with fewer than two bonds to atoms that haven't been removed.
+
+    :param numpy.ndarray starts: where each atom's bonds start.
+    :param numpy.ndarray neighbours: the far atom of each bond.
+    :param int count: the number of atoms.
+    :rtype: ``numpy.ndarray``"""
+
+    degrees, kept = np.diff(starts), np.ones(count, dtype=bool)
+    while True:
+        removed = np.flatnonzero(kept & (degrees < 2))
+        if not len(removed): return kept
+        kept[removed] = False
+        np.subtract.at(degrees, expand_rows(starts, neighbours, removed)[1], 1)
+
+
+def shortest_path(starts, neighbours, start, end, allowed):
+    """Finds the shortest path of bonds from one atom to another which doesn't
+    use the bond directly between them, if there is one - which together with
+    that bond makes the smallest ring containing it.
+
+    :param numpy.ndarray starts: where each atom's bonds start.
+    :param numpy.ndarray neighbours: the far atom of each bond.
+    :param int start: the atom to start at.
+    :param int end: the atom to finish at.
+    :param numpy.ndarray allowed: which atoms the path can go through.
+    :returns: the atoms of the path in order, or ``None``.
+    :rtype: ``list``"""
+
+    previous = np.full(len(allowed), -1, dtype="i8")
+    previous[start], frontier = start, np.array([start])
+    while len(frontier) and previous[end] < 0:
+        sources, reached = expand_rows(starts, neighbours, frontier)
+        usable = allowed[reached] & (previous[reached] < 0)
+        usable &= (sources != start) | (reached != end)
+        frontier, first = np.unique(reached[usable], return_index=True)
+        previous[frontier] = sources[usable][first]
+    if previous[end] < 0: return None
+    path = [end]
+    while path[-1] != start: path.append(int(previous[path[-1]]))
+    return path[::-1]
+
+
+MINIMUM_BOND_LENGTH = 0.4
+
+HALF_SHELL = [(0, 0, 0)] + [(dx, dy, dz) for dx in (-1, 0, 1)
+ for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)]
@@ -0,0 +1,374 @@
+"""Contains functions for turning the PDB's Chemical Component Dictionary
+(components.cif) into a compact store on disk, and for looking components up
+in it.
+
+The dictionary describes every kind of residue and ligand in the PDB, but is
+hundreds of megabytes of text, and so is far too slow to parse whenever a
+component's name or bonds are needed. A component store has the same layout
+as a snapshot (see :py:mod:`.snapshot`), starting with the eight bytes
+``ATOMCOMP``, and holds these arrays:
+
+- ``ids`` - the components' IDs, in sorted order.
+- ``names``, ``codes``, ``types`` and ``parents`` - the full name, one letter\
+  code, type and parent component of each component, as string categories.
+- ``atom_offsets`` - where each component's atoms start in the atom arrays,\
+  followed by the total number of atoms.
+- ``atom_names``, ``atom_elements`` and ``atom_charges`` - the atoms of every\
+  component, one after another.
+- ``bond_offsets`` - where each component's bonds start in the bond arrays.
+- ``bond_atoms`` and ``bond_orders`` - the bonds of every component, one\
+  after another, with each atom given as its position among its component's\
+  atoms.
+
+Opening a store only reads its header and memory-maps the arrays, so looking
+up one component only touches the parts of the file it is stored in."""
+
+import numpy as np
+from .snapshot import save_arrays, read_arrays, add_strings
+
+MAGIC = b"ATOMCOMP"
+VERSION = 1
+COMPONENT_SETTINGS = {"store": None}
+
+def build_component_store(path, store_path):
+    """Converts a Chemical Component Dictionary file (or a compressed copy of
+    one) into a component store. The file is read one component at a time, so
+    only the store's compact arrays are ever held in memory.
+
+        >>> atomium.components.build_component_store(
+        ...  'components.cif.gz', 'components.store'
+        ... )
+
+    :param str path: the location of the components.cif file.
+    :param str store_path: the location to save the store to.
+    :returns: the number of components stored.
+    :rtype: ``int``"""
+
+    from .utilities import read_file
+    from .mmcif import iter_lines, mmcif_string_to_mmcif_dict
+    components = []
+    with read_file(path) as filestring:
+        for block in iter_component_blocks(iter_lines(filestring)):
+            component = mmcif_dict_to_component(
+             mmcif_string_to_mmcif_dict("\n".join(block))
+            )
+            if component: components.append(component)
+    save_arrays(components_to_arrays(components), {
+     "count": len(components)
+    }, store_path, MAGIC, VERSION)
+    return len(components)
+
+
+def iter_component_blocks(lines):
+    """Splits the lines of a Chemical Component Dictionary into the lines of
+    each of its data blocks, one component to a block.
+
+    :param lines: the lines of the file.
+    :rtype: ``list``"""
+
+    block = []
+    for line in lines:
+        if line.startswith("data_") and block:
+            yield block
+            block = []
+        block.append(line)
+    if block: yield block
+
+
+def mmcif_dict_to_component(mmcif_dict):
+    """Takes the .mmcif dictionary of one component's data block, and picks
+    out the parts of it that go in a component store - its ID, full name, one
+    letter code, type and parent component, its atoms as names, elements and
+    charges, and its bonds as the positions of their atoms and their orders.
+    Unknown values become ``None``.
+
+    :param dict mmcif_dict: the .mmcif dictionary to read.
+    :rtype: ``tuple``"""
+
+    from .mmcif import BOND_ORDERS
+    if not mmcif_dict.get("chem_comp"): return None
+    info = {k: None if v in ("?", ".") else v
+     for k, v in mmcif_dict["chem_comp"][0].items()}
+    atoms = [(atom["atom_id"], atom["type_symbol"], int(
+     atom["charge"]
+    ) if atom.get("charge", "?") not in ("?", ".") else 0)
+     for atom in mmcif_dict.get("chem_comp_atom", [])]
+    positions = {atom[0]: i for i, atom in enumerate(atoms)}
+    bonds = [(
+     positions[bond["atom_id_1"]], positions[bond["atom_id_2"]],
+     BOND_ORDERS.get(bond.get("value_order", "?").lower(), 1)
+    ) for bond in mmcif_dict.get("chem_comp_bond", [])
+     if bond["atom_id_1"] in positions and bond["atom_id_2"] in positions]
+    return (
+     info["id"], info.get("name"), info.get("one_letter_code"),
+     info.get("type"), info.get("mon_nstd_parent_comp_id"), atoms, bonds
+    )
+
+
+def components_to_arrays(components):
+    """Turns components, as made by :py:func:`.mmcif_dict_to_component`, into
+    the arrays of a component store, sorted by ID.
+
+    :param list components: the components to store.
+    :rtype: ``dict``"""
+
+    components = sorted(components, key=lambda c: c[0])
+    atoms = [atom for c in components for atom in c[5]]
+    bonds = [bond for c in components for bond in c[6]]
+    arrays = {
+     "ids": np.array(
+      [c[0].encode() for c in components], dtype="S"
+     ).reshape(len(components)),
+     "atom_offsets": np.cumsum(
+      [0] + [len(c[5]) for c in components], dtype="i8"
+     ),
+     "atom_charges": np.array([atom[2] for atom in atoms], dtype="i1"),
+     "bond_offsets": np.cumsum(
+      [0] + [len(c[6]) for c in components], dtype="i8"
+     ),
+     "bond_atoms": np.array(
+      [bond[:2] for bond in bonds], dtype="i2"
+     ).reshape(len(bonds), 2),
+     "bond_orders": np.array([bond[2] for bond in bonds], dtype="i1")
+    }
+    for index, name in enumerate(["names", "codes", "types", "parents"], 1):
+        add_strings(arrays, name, [c[index] for c in components])
+    add_strings(arrays, "atom_names", [atom[0] for atom in atoms])
+    add_strings(arrays, "atom_elements", [atom[1] for atom in atoms])
+    return arrays
+
+
+def open_components(path):
+    """Opens a component store made by :py:func:`.build_component_store`.
+
+        >>> components = atomium.open_components('components.store')
+        >>> components.name('MSE')
+        'SELENOMETHIONINE'
+
+    :param str path: the location of the store.
+    :raises ValueError: if the file is not a component store.
+    :rtype: ``ComponentStore``"""
+
+    return ComponentStore(path)
+
+
+def use_components(path):
+    """Makes atomium look up residues and ligands in a component store
+    whenever it doesn't otherwise know about them - for the full names of
+    hets, the one letter codes of residues and sequences, and the bonds
+    within residues and ligands of .pdb and .cif files as they are opened.
+    Giving ``None`` stops this.
+
+        >>> atomium.use_components('components.store')
+
+    :param str path: the location of the store.
+    :raises ValueError: if the file is not a component store.
+    :rtype: ``ComponentStore``"""
+
+    store = None if path is None else ComponentStore(path)
+    COMPONENT_SETTINGS["store"] = store
+    return store
+
+
+def lookup_component(id, attribute):
+    """Looks up something about a component in the store given to
+    :py:func:`.use_components`, if there is one and it has the component.
+
+    :param str id: the component's ID.
+    :param str attribute: the name of the :py:class:`.ComponentStore` method\
+    to look it up with.
+    :returns: the value, or ``None`` if it can't be looked up."""
+
+    store = COMPONENT_SETTINGS["store"]
+    if store is None or id not in store: return None
+    return getattr(store, attribute)(id)
+
+
+def get_component_templates(ids):
+    """Gets the bonds of some components from the store given to
+    :py:func:`.use_components`, in the form that
+    :py:func:`.make_bond_templates` gives them - a list of the two atom
+    names and the order of each bond, for each component that has bonds.
+
+    :param ids: the IDs of the components.
+    :rtype: ``dict``"""
+
+    templates = {}
+    for id in ids:
+        bonds = lookup_component(id, "bonds")
+        if bonds: templates[id] = bonds
+    return templates
+
+
+
+class ComponentStore:
+    """A Chemical Component Dictionary, read from a memory map of a component
+    store. Components are looked up by their ID, and only the values asked for
+    are read from the file.
+
+    :param str path: the location of the store.
+    :raises ValueError: if the file is not a component store."""
+
+    def __init__(self, path):
+        header, self._arrays = read_arrays(
+         path, MAGIC, VERSION, "component store"
+        )
+        self._count = header["count"]
+
+
+    def __repr__(self):
+        return "<ComponentStore ({} component{})>".format(
+         len(self), "" if len(self) == 1 else "s"
+        )
+
+
+    def __len__(self):
+        return self._count
+
+
+    def __iter__(self):
+        for id in self._arrays["ids"].tolist(): yield id.decode()
+
+
+    def __contains__(self, id):
+        return self._find(id) != -1
+
+
+    @property
+    def ids(self):
+        """The IDs of the components in the store, in sorted order.
+
+        :rtype: ``list``"""
+
+        return list(self)
+
+
+    def name(self, id):
+        """Returns a component's full name.
+
+        :param str id: the component's ID.
+        :raises KeyError: if there is no such component.
+        :rtype: ``str``"""
+
+        return self._get_string("names", self._get_index(id))
+
+
+    def code(self, id):
+        """Returns a component's one letter code, if it has one. Modified
+        residues have the code of the residue they are modified from.
+
+        :param str id: the component's ID.
+        :raises KeyError: if there is no such component.
+        :rtype: ``str``"""
+
+        return self._get_string("codes", self._get_index(id))
+
+
+    def type(self, id):
+        """Returns a component's type, such as ``'L-PEPTIDE LINKING'``.
+
+        :param str id: the component's ID.
+        :raises KeyError: if there is no such component.
+        :rtype: ``str``"""
+
+        return self._get_string("types", self._get_index(id))
+
+
+    def parent(self, id):
+        """Returns the ID of the component a component is a modified form of,
+        if it is one.
+
+        :param str id: the component's ID.
+        :raises KeyError: if there is no such component.
+        :rtype: ``str``"""
+
+        return self._get_string("parents", self._get_index(id))
+
+
+    def atoms(self, id):
+        """Returns the name, element and charge of each of a component's
+        atoms.
+
+        :param str id: the component's ID.
+        :raises KeyError: if there is no such component.
+        :rtype: ``list``"""
+
+        start, end = self._get_range("atom_offsets", self._get_index(id))
+        return [(
+         self._get_string("atom_names", index),
+         self._get_string("atom_elements", index), charge
+        ) for index, charge in zip(
+         range(start, end), self._arrays["atom_charges"][start:end].tolist()
+        )]
+
+
+    def bonds(self, id):
+        """Returns the two atom names and the order of each of a component's
+        bonds.
+
+        :param str id: the component's ID.
+        :raises KeyError: if there is no such component.
+        :rtype: ``list``"""
+
+        index = self._get_index(id)
+        atom_start, _ = self._get_range("atom_offsets", index)
+        start, end = self._get_range("bond_offsets", index)
+        return [(
+         self._get_string("atom_names", atom_start + atom1),
+         self._get_string("atom_names", atom_start + atom2), order
+        ) for (atom1, atom2), order in zip(
+         self._arrays["bond_atoms"][start:end].tolist(),
+         self._arrays["bond_orders"][start:end].tolist()
+        )]
+
+
+    def _find(self, id):
+        """Returns the position of a component in the store, or -1 if there
+        is no such component. The IDs are stored sorted, so this is a binary
+        search that only reads a few of them.
+
+        :param str id: the component's ID.
+        :rtype: ``int``"""
+
+        if not isinstance(id, str): return -1
+        ids, key = self._arrays["ids"], id.encode()
+        index = int(np.searchsorted(ids, key))
+        if index < len(ids) and ids[index] == key: return index
+        return -1
+
+
+    def _get_index(self, id):
+        """Returns the position of a component in the store.
+
+        :param str id: the component's ID.
+        :raises KeyError: if there is no such component.
+        :rtype: ``int``"""
+
+        index = self._find(id)
+        if index == -1:
+            raise KeyError("No component {} in store".format(repr(id)))
+        return index
+
+
+    def _get_range(self, name, index):
+        """Returns where a component's rows start and end in one of the
+        store's offset arrays.
+
+        :param str name: the name of the offset array.
+        :param int index: the position of the component.
+        :rtype: ``tuple``"""
+
+        start, end = self._arrays[name][index:index + 2].tolist()
+        return start, end
+
+
+    def _get_string(self, name, index):
+        """Returns one value of one of the store's string columns.
+
+        :param str name: the name of the column.
+        :param int index: the row to get.
+        :rtype: ``str``"""
+
+        code = int(self._arrays[name][index])
+        if code == -1: return None
+        return self._arrays[name + "_values"][code].decode()
@@ -1,6 +1,9 @@
 """Contains logic for turning data dictionaies into a parsed Python objects."""
 
+import numpy as np
+from collections.abc import Sequence
 from .structures import *
+from .bonds import BondTable
 
 class File:
     """When a file is parsed, the result is a ``File``. It contains the
@@ -155,13 +158,25 @@ class File:
 
     @property
     def models(self):
-        """The structure's models.
+        """The structure's models. If they all have the same atoms, this is
+        an :py:class:`.Ensemble`, which can be used as a list.
 
-        :rtype: ``list``"""
+        :rtype: ``list`` or ``Ensemble``"""
 
         return self._models
 
 
+    @property
+    def coordinates(self):
+        """The coordinates of every model's atoms, as a NumPy array of shape
+        ``(models, atoms, 3)``, if the models all have the same atoms - see
+        :py:class:`.Ensemble`. Otherwise this is ``None``.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return getattr(self._models, "coordinates", None)
+
+
     @property
     def model(self):
         """The structure's first model (and only model if it has only one).
@@ -171,6 +186,40 @@ class File:
         return self._models[0]
 
 
+    def save(self, path):
+        """Saves every model in the file to a new file. The file extension
+        given in the filename will be used to determine which file format to
+        save in, and if it ends in .gz the file will be gzip compressed.
+
+        If the models share their atoms (see :py:class:`.Ensemble`), the
+        first model's records are made once, and only the coordinates of
+        the others are written out - models that have not been built are
+        written straight from their coordinates without being built.
+
+        Only the structures are saved - the file's other information is not.
+
+        :param str path: the filename and location to save to.
+        :raises ValueError: if the file extension is not supported."""
+
+        from .utilities import save_models
+        save_models(iter_frames(self._models), path)
+
+
+    def write(self, f, filetype):
+        """Writes every model in the file to any file-like object in the
+        given file format - see :py:meth:`.save`.
+
+        The file object must be open in text mode for 'cif' and 'pdb', and in
+        binary mode for 'mmtf'.
+
+        :param f: the file-like object to write to.
+        :param str filetype: 'cif', 'mmtf' or 'pdb'.
+        :raises ValueError: if the file type is not supported."""
+
+        from .utilities import write_models
+        write_models(iter_frames(self._models), f, filetype)
+
+
     def generate_assembly(self, id):
         """Generates a new model from the existing model using one of the file's
         set of assembly instructions (for which you provide the ID).
@@ -212,45 +261,213 @@ class File:
         return Model(*all_structures)
 
 
-def data_dict_to_file(data_dict, filetype):
+
+class Ensemble(Sequence):
+    """A sequence of models which have the same chains, residues and atoms,
+    and differ only in where those atoms are - the models of an NMR structure,
+    for example. Only the first model is built up front. The coordinates of
+    every model are kept in a single array, along with anything else that
+    differs between them (such as atom IDs), and the other models are built
+    from these and the first model's columns the first time they are
+    accessed, after which they are kept.
+
+    An ensemble can be indexed, sliced and iterated over like a list, and is
+    equal to any list (or other ensemble) of equal models. Adding it to a list
+    gives a list. It can't be changed in place though - ``list(ensemble)``
+    gives a list of its models that can be.
+
+    :param Model model: the first model.
+    :param dict columns: the first model's columns, without coordinates.
+    :param numpy.ndarray frames: the coordinates of every row of the columns\
+    in every model, of shape ``(models, rows, 3)``.
+    :param list changes: for each model, a ``dict`` of any other columns\
+    which are different to the first model's, such as atom IDs.
+    :param str alt_loc: how to handle alternate locations."""
+
+    def __init__(self, model, columns, frames, changes, alt_loc="first"):
+        self._models = {0: model}
+        self._columns, self._frames, self._changes = columns, frames, changes
+        self._alt_loc, self._file = alt_loc, None
+        self._coordinates, self._rows = None, None
+        self._frames.flags.writeable = False
+
+
+    def __repr__(self):
+        return "<Ensemble ({} models)>".format(len(self))
+
+
+    def __len__(self):
+        return len(self._frames)
+
+
+    def __iter__(self):
+        for index in range(len(self)): yield self[index]
+
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, Ensemble)): return NotImplemented
+        return len(self) == len(other) and all(
+         model1 is model2 or model1 == model2
+         for model1, model2 in zip(self, other)
+        )
+
+
+    def __add__(self, other):
+        if not isinstance(other, (list, Ensemble)): return NotImplemented
+        return list(self) + list(other)
+
+
+    def __radd__(self, other):
+        if not isinstance(other, (list, Ensemble)): return NotImplemented
+        return list(other) + list(self)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ensemble index out of range")
+        if index not in self._models:
+            model = columns_to_model(
+             self._frames[index], **{**self._columns, **self._changes[index]},
+             alt_loc=self._alt_loc
+            )
+            model._file = self._file
+            self._models[index] = model
+        return self._models[index]
+
+
+    @property
+    def coordinates(self):
+        """The coordinates of every model's atoms, as a read-only NumPy array
+        of shape ``(models, atoms, 3)``. The atoms are in the order they
+        appear in the file, and the coordinates are those the file gives -
+        moving the atoms of a model afterwards does not change them.
+
+        :rtype: ``numpy.ndarray``"""
+
+        if self._coordinates is None:
+            rows = self._get_rows()
+            if len(rows) == self._frames.shape[1]:
+                self._coordinates = self._frames
+            else:
+                self._coordinates = self._frames[:, rows]
+                self._coordinates.flags.writeable = False
+        return self._coordinates
+
+
+    def _get_rows(self):
+        """Returns the rows of the columns which are made into atoms, working
+        them out the first time.
+
+        :rtype: ``numpy.ndarray``"""
+
+        if self._rows is None:
+            self._rows = get_kept_rows(self._columns, self._alt_loc)
+        return self._rows
+
+
+    def _get_frame(self, index):
+        """Returns the coordinates of one model's atoms in order of their
+        IDs, without building the model.
+
+        :param int index: the model to get.
+        :rtype: ``numpy.ndarray``"""
+
+        rows = self._get_rows()
+        ids = self._changes[index].get("atom_ids", self._columns.get("atom_ids"))
+        coordinates = self._frames[index][rows]
+        if ids is None: return coordinates
+        return coordinates[np.argsort(
+         np.asarray(ids, dtype="i8")[rows], kind="stable"
+        )]
+
+
+    def _set_file(self, f):
+        """Sets the :py:class:`.File` of the ensemble's models, including
+        those that have yet to be built.
+
+        :param File f: the file."""
+
+        self._file = f
+        for model in self._models.values(): model._file = f
+
+
+def iter_frames(models):
+    """Goes through a file's models so that they can be written. Models which
+    have been built are given as they are, but if the models are an
+    :py:class:`.Ensemble`, those that haven't are given as arrays of their
+    coordinates, in order of atom ID, to be written with the first model's
+    atoms.
+
+    :param models: the ``list`` or :py:class:`.Ensemble` of models.
+    :rtype: ``Model`` or ``numpy.ndarray``"""
+
+    if not isinstance(models, Ensemble):
+        yield from models
+        return
+    for index in range(len(models)):
+        if index in models._models:
+            yield models._models[index]
+        else:
+            yield models._get_frame(index)
+
+
+def data_dict_to_file(data_dict, filetype, models=None, alt_loc="first"):
     """Turns an atomium data dictionary into a :py:class:`.File`.
 
     :param dict data_dict: the data dictionary to parse.
     :param str filetype: the file type that is being converted.
+    :param list models: if given, these already built models will be used\
+    instead of those in the data dictionary.
+    :param str alt_loc: how to handle alternate locations - see\
+    :py:func:`.pick_alt_loc`.
+    :raises ValueError: if the alternate location policy is not valid.
     :rtype: ``File``"""
 
+    check_alt_loc_policy(alt_loc)
     f = File(filetype)
     for key in data_dict.keys():
         if key != "models":
             for subkey, value in data_dict[key].items():
                 setattr(f, "_" + subkey, value)
-    f._models = [model_dict_to_model(m) for m in data_dict["models"]]
+    if models is None:
+        models = [model_dict_to_model(m, alt_loc=alt_loc)
+         for m in data_dict["models"]]
+    f._models = models
+    if isinstance(models, Ensemble):
+        models._set_file(f)
+    else:
+        for model in f._models: model._file = f
     return f
 
 
-def model_dict_to_model(model_dict):
+def model_dict_to_model(model_dict, alt_loc="first"):
     """Takes a model dictionary and turns it into a fully processed
     :py:class:`.Model` object.
 
     :param dict model_dict: the model dictionary.
+    :param str alt_loc: how to handle alternate locations.
     :rtype: ``Model``"""
 
-    chains = create_chains(model_dict)
-    ligands = create_ligands(model_dict, chains)
-    waters = create_ligands(model_dict, chains, water=True)
+    chains = create_chains(model_dict, alt_loc=alt_loc)
+    ligands = create_ligands(model_dict, chains, alt_loc=alt_loc)
+    waters = create_ligands(model_dict, chains, water=True, alt_loc=alt_loc)
     model = Model(*(chains + ligands + waters))
     return model
 
 
-def create_chains(model_dict):
+def create_chains(model_dict, alt_loc="first"):
     """Creates a list of :py:class:`.Chain` objects from a model dictionary.
 
     :param dict model_dict: the model dictionary.
+    :param str alt_loc: how to handle alternate locations.
     :rtype: ``list``"""
 
     chains = []
     for chain_id, chain in model_dict["polymer"].items():
-        res = [create_het(r, i) for i, r in sorted(
+        res = [create_het(r, i, alt_loc=alt_loc) for i, r in sorted(
          chain["residues"].items(), key=lambda x: x[1]["number"]
         )]
         res_by_id = {r.id: r for r in res}
@@ -265,12 +482,13 @@ def create_chains(model_dict):
     return chains
 
 
-def create_ligands(model_dict, chains, water=False):
+def create_ligands(model_dict, chains, water=False, alt_loc="first"):
     """Creates a list of :py:class:`.Ligand` objects from a model dictionary.
 
     :param dict model_dict: the model dictionary.
     :param list chains: a list of :py:class:`.Chain` objects to assign by ID.
     :param bool water: if `True``, water ligands will be made.
+    :param str alt_loc: how to handle alternate locations.
     :rtype: ``list``"""
 
     ligands = []
@@ -281,31 +499,54 @@ def create_ligands(model_dict, chains, water=False):
                 chain = c
                 break
         ligands.append(
-         create_het(lig, lig_id, ligand=True, chain=chain, water=water)
+         create_het(lig, lig_id, ligand=True, chain=chain, water=water,
+          alt_loc=alt_loc)
         )
     return ligands
 
 
-def create_het(d, id, ligand=False, chain=None, water=False):
+def create_het(d, id, ligand=False, chain=None, water=False,
+               alt_loc="first"):
     """Creates a :py:class:`.Residue` or :py:class:`.Ligand` from some
     atom-containing dictionary.
 
-    If there is multiple occupancy, only one position will be used.
+    If there is multiple occupancy, only one position will be used, chosen
+    according to the alternate location policy. The occupancies of each
+    alternate location are totalled in a single pass over the atoms, and only
+    the atoms that are kept are created. With the ``'all'`` policy, the other
+    positions are stored on the atoms that are kept.
 
     :param dict d: the dictionary to parse.
     :param str id: the ID of the structure to make.
     :param bool ligand: if ``True`` a ligand will be made, not a residue.
     :param Chain chain: the :py:class:`.Chain` to assign if a ligand.
     :param bool water: if ``True``, the ligand will be a water ligand.
+    :param str alt_loc: how to handle alternate locations.
     :rtype: ``Residue`` or ``Ligand``"""
 
-    alt_loc = None
-    if any([atom["occupancy"] < 1 for atom in d["atoms"].values()]):
-        if any([atom["alt_loc"] for atom in d["atoms"].values()]):
-            alt_loc = sorted([atom["alt_loc"] for atom in d["atoms"].values()
-             if atom["alt_loc"]])[0]
-    atoms = [atom_dict_to_atom(a, i) for i, a in d["atoms"].items()
-     if a["occupancy"] == 1 or a["alt_loc"] is None or a["alt_loc"] == alt_loc]
+    entries, totals, partial = list(d["atoms"].items()), {}, False
+    for _, a in entries:
+        if a["occupancy"] < 1: partial = True
+        if a["alt_loc"]:
+            totals[a["alt_loc"]] = totals.get(a["alt_loc"], 0) + a["occupancy"]
+    keep, alternates = None, {}
+    if partial and totals:
+        chosen = pick_alt_loc(totals, alt_loc)
+        keep = [a["occupancy"] == 1 or a["alt_loc"] in (None, chosen)
+         for _, a in entries]
+        if alt_loc == "all":
+            alternates = match_alt_locs(
+             [a["name"] for _, a in entries], [a["alt_loc"] for _, a in entries],
+             keep
+            )
+    atoms = {index: atom_dict_to_atom(a, atom_id)
+     for index, (atom_id, a) in enumerate(entries) if keep is None or keep[index]}
+    for index, others in alternates.items():
+        atoms[index]._alt_locs = {entries[i][1]["alt_loc"]: (
+         entries[i][1]["x"], entries[i][1]["y"], entries[i][1]["z"],
+         entries[i][1]["occupancy"], entries[i][1]["bvalue"]
+        ) for i in [index] + others}
+    atoms = list(atoms.values())
     if ligand:
         return Ligand(*atoms, id=id, name=d["name"], chain=chain,
          internal_id=d["internal_id"], water=water, full_name=d["full_name"])
@@ -322,10 +563,562 @@ def atom_dict_to_atom(d, atom_id):
 
     return Atom(
      d["element"], d["x"], d["y"], d["z"], atom_id,
-     d["name"], d["charge"], d["bvalue"], d["anisotropy"]
+     d["name"], d["charge"], d["bvalue"], d["anisotropy"], d["occupancy"]
+    )
+
+
+
+def columns_to_model(coords, elements, names, res_ids, chain_ids,
+                     atom_ids=None, res_names=None, full_names=None,
+                     kinds=None, internal_ids=None, charges=None, bvalues=None,
+                     occupancies=None, alt_locs=None, anisotropy=None,
+                     sequences=None, helices=None, strands=None, bonds=None,
+                     alt_loc="first"):
+    """Builds a :py:class:`.Model` from per-atom columns - see
+    :py:meth:`.Model.from_arrays` for what each one is.
+
+    Every atom is given a group code (a polymer residue is identified by its
+    chain and ID, a ligand or water by its ID alone), in the order the groups
+    are first seen. A stable sort on these codes puts each group's atoms
+    together in their original order, so that the hierarchy can be sliced out
+    of the sorted atoms using the group boundaries, in linear time. Bonds are
+    moved from rows to atoms in the same way, and any to rows which aren't
+    made into atoms are dropped.
+
+    :raises ValueError: if the alternate location policy is not valid.
+    :rtype: ``Model``"""
+
+    check_alt_loc_policy(alt_loc)
+    length = len(coords)
+    res_ids, chain_ids, res_names, full_names, internal_ids, alt_locs = map(
+     column_to_list,
+     (res_ids, chain_ids, res_names, full_names, internal_ids, alt_locs)
+    )
+    kinds, codes, firsts = group_columns(kinds, chain_ids, res_ids)
+    order = np.argsort(codes, kind="stable")
+    alternates = {}
+    if occupancies is not None and alt_locs is not None:
+        keep = get_alt_loc_mask(
+         codes, occupancies, alt_locs, len(firsts), policy=alt_loc
+        )
+        if alt_loc == "all" and not keep.all():
+            alternates = match_alt_locs(
+             list(zip(codes.tolist(), column_to_list(names))), alt_locs,
+             keep.tolist()
+            )
+        order = order[keep[order]]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(
+     codes[order], minlength=len(firsts)
+    )))).tolist()
+    order = order.tolist()
+    atoms = create_atoms(
+     np.array(coords, dtype="f8").reshape(length, 3)[order],
+     *[None if column is None else [column[i] for i in order]
+      for column in map(column_to_list, (
+       elements, atom_ids, names, charges, bvalues, anisotropy, occupancies
+      ))]
+    )
+    if atom_ids is None:
+        for atom, index in zip(atoms, order): atom._id = index + 1
+    if alternates:
+        add_alt_locs(
+         dict(zip(order, atoms)), alternates, coords, occupancies, bvalues,
+         alt_locs
+        )
+    res_names = res_names if res_names is not None else [None] * length
+    full_names = full_names if full_names is not None else [None] * length
+    internal_ids = internal_ids if internal_ids is not None else chain_ids
+    polymers, ligands, waters = {}, [], []
+    for code, first in enumerate(firsts):
+        het_atoms = atoms[bounds[code]:bounds[code + 1]]
+        kind, res_id = kinds[first], res_ids[first]
+        if kind == 0:
+            polymers.setdefault(chain_ids[first], []).append((first, Residue(
+             *het_atoms, id=res_id, name=res_names[first],
+             full_name=full_names[first]
+            )))
+        else:
+            (waters if kind == 2 else ligands).append((first, Ligand(
+             *het_atoms, id=res_id, name=res_names[first],
+             full_name=full_names[first], internal_id=internal_ids[first],
+             water=(kind == 2)
+            )))
+    chains = create_chains_from_residues(
+     polymers, internal_ids, sequences or {}, helices or [], strands or []
+    )
+    chains_by_id = {chain._id: chain for chain in chains}
+    for first, ligand in ligands + waters:
+        ligand._chain = chains_by_id.get(chain_ids[first])
+    model = Model(*(chains + [l for _, l in ligands] + [w for _, w in waters]))
+    if bonds is not None and len(bonds):
+        model._bonds = create_bonds(atoms, order, bonds, length)
+    return model
+
+
+def create_bonds(atoms, order, bonds, length):
+    """Creates the :py:class:`.BondTable` of a model built from columns, from
+    bonds between rows of the columns.
+
+    :param list atoms: the atoms that were made.
+    :param list order: the row each atom was made from.
+    :param numpy.ndarray bonds: the two rows and order of each bond.
+    :param int length: the number of rows.
+    :rtype: ``BondTable``"""
+
+    bonds = np.asarray(bonds, dtype="i8").reshape(-1, 3)
+    positions = np.full(length, -1, dtype="i8")
+    positions[order] = np.arange(len(order))
+    pairs = positions[bonds[:, :2]]
+    kept = (pairs >= 0).all(axis=1)
+    if not kept.any(): return None
+    return BondTable.from_arrays(atoms, pairs[kept], bonds[kept, 2])
+
+
+def match_bond_keys(keys, keys1, keys2):
+    """Finds the rows of a model's columns at either end of some bonds, where
+    each row is identified by an integer key and each bond by the keys of its
+    two atoms. Where more than one row has a key, as when an atom has
+    alternate locations, every combination of rows is bonded, so that
+    whichever location is kept keeps the bond. Bonds to keys that no row
+    has are left out.
+
+    :param numpy.ndarray keys: the key of each row.
+    :param numpy.ndarray keys1: the key of the first atom of each bond.
+    :param numpy.ndarray keys2: the key of the second atom of each bond.
+    :returns: the pairs of bonded rows, and the bond each pair comes from.
+    :rtype: ``tuple``"""
+
+    sorter = np.argsort(keys, kind="stable")
+    ordered = np.asarray(keys)[sorter]
+    starts1 = np.searchsorted(ordered, keys1)
+    starts2 = np.searchsorted(ordered, keys2)
+    counts1 = np.searchsorted(ordered, keys1, side="right") - starts1
+    counts2 = np.searchsorted(ordered, keys2, side="right") - starts2
+    counts = counts1 * counts2
+    bonds = np.repeat(np.arange(len(counts)), counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.column_stack([
+     sorter[starts1[bonds] + within // counts2[bonds]],
+     sorter[starts2[bonds] + within % counts2[bonds]]
+    ]), bonds
+
+
+def group_columns(kinds, chain_ids, res_ids):
+    """Gives every atom in a model's columns the code of the residue, ligand
+    or water it belongs to - a polymer residue is identified by its chain and
+    ID, a ligand or water by its ID alone - with codes given out in the order
+    the groups are first seen.
+
+    :param list kinds: the kind of each atom's group, or ``None`` if they\
+    are all polymer.
+    :param list chain_ids: the chain ID of each atom.
+    :param list res_ids: the residue ID of each atom.
+    :returns: the numeric kind of each atom, the code of each atom, and the\
+    first atom of each group.
+    :rtype: ``tuple``"""
+
+    length = len(res_ids)
+    kinds = [HET_KINDS.get(k, 1) for k in kinds] if kinds is not None else (
+     [0] * length
+    )
+    groups, codes, firsts = {}, [], []
+    for index, (kind, chain_id, res_id) in enumerate(zip(
+     kinds, chain_ids, res_ids
+    )):
+        key = (kind, chain_id if kind == 0 else None, res_id)
+        code = groups.get(key)
+        if code is None:
+            code = groups[key] = len(firsts)
+            firsts.append(index)
+        codes.append(code)
+    return kinds, np.array(codes, dtype="i8").reshape(length), firsts
+
+
+def columns_to_models(column_sets, alt_loc="first"):
+    """Builds models from a series of ``dict`` s of columns, one per model,
+    each of which can be passed to :py:func:`.columns_to_model`.
+
+    If there is more than one model, and every model's columns are the same
+    as the first's apart from those that describe one model in particular -
+    coordinates, atom IDs and secondary structure - only the first model is
+    built, and they are returned as an :py:class:`.Ensemble` which builds the
+    others when they are needed. The columns are compared as they arrive, and
+    only the parts of matching models that differ are held on to. If any model
+    has different atoms, every model is built and they are returned as a list.
+
+    :param column_sets: the columns of each model.
+    :param str alt_loc: how to handle alternate locations.
+    :rtype: ``Ensemble`` or ``list``"""
+
+    first, frames, changes, models = None, [], [], []
+    for columns in column_sets:
+        if first is None:
+            first = columns
+        elif not frames or not columns_match(first, columns):
+            models += [columns_to_model(
+             **{**first, "coords": coords, **changed}, alt_loc=alt_loc
+            ) for coords, changed in zip(frames[1:], changes[1:])]
+            frames, changes = [], []
+            models.append(columns_to_model(**columns, alt_loc=alt_loc))
+            continue
+        frames.append(np.array(columns["coords"], dtype="f8").reshape(-1, 3))
+        changes.append(get_frame_changes(first, columns))
+        if len(frames) == 1:
+            models.append(columns_to_model(**columns, alt_loc=alt_loc))
+    if len(frames) < 2: return models
+    return Ensemble(models[0], {
+     key: value for key, value in first.items() if key != "coords"
+    }, np.stack(frames), changes, alt_loc=alt_loc)
+
+
+def columns_match(columns1, columns2):
+    """Checks whether two models' columns describe the same atoms - that is,
+    whether they are the same in everything but the columns which describe
+    one model in particular.
+
+    :param dict columns1: the first model's columns.
+    :param dict columns2: the second model's columns.
+    :rtype: ``bool``"""
+
+    if columns1.keys() != columns2.keys(): return False
+    for key, column in columns1.items():
+        if key in FRAME_COLUMNS: continue
+        other = columns2[key]
+        if isinstance(column, np.ndarray) or isinstance(other, np.ndarray):
+            if not np.array_equal(column, other): return False
+        elif column != other: return False
+    return True
+
+
+def get_frame_changes(columns1, columns2):
+    """Finds which of the columns that describe one model in particular,
+    other than the coordinates, are different in a second model. Atom IDs
+    are kept as a NumPy array.
+
+    :param dict columns1: the first model's columns.
+    :param dict columns2: the second model's columns.
+    :rtype: ``dict``"""
+
+    changes = {}
+    for key in FRAME_COLUMNS[1:]:
+        column, other = columns1.get(key), columns2.get(key)
+        if isinstance(column, np.ndarray) or isinstance(other, np.ndarray):
+            if np.array_equal(column, other): continue
+        elif column == other: continue
+        changes[key] = np.array(other, dtype="i8") if (
+         key == "atom_ids" and other is not None
+        ) else other
+    return changes
+
+
+def get_kept_rows(columns, alt_loc="first"):
+    """Works out which rows of a model's columns become atoms when the model
+    is built - all of them, except for alternate locations that the policy
+    leaves out.
+
+    :param dict columns: the model's columns.
+    :param str alt_loc: how to handle alternate locations.
+    :rtype: ``numpy.ndarray``"""
+
+    length = len(columns["res_ids"])
+    occupancies, alt_locs = columns.get("occupancies"), columns.get("alt_locs")
+    if occupancies is None or alt_locs is None: return np.arange(length)
+    _, codes, firsts = group_columns(
+     columns.get("kinds"), column_to_list(columns["chain_ids"]),
+     column_to_list(columns["res_ids"])
     )
+    return np.flatnonzero(get_alt_loc_mask(
+     codes, occupancies, column_to_list(alt_locs), len(firsts), policy=alt_loc
+    ))
 
 
+def column_to_list(column):
+    """Converts a NumPy array to a list of Python values, leaving anything
+    else unchanged.
+
+    :param column: the column to convert.
+    :rtype: ``list``"""
+
+    return column.tolist() if isinstance(column, np.ndarray) else column
+
+
+def make_selection(chains=None, atom_names=None, skip_waters=False,
+                   skip_ligands=False, models=None):
+    """Packs the options for selecting atoms at parse time into a ``dict``
+    that the model building functions of each file format can check atoms
+    against before reading them. If nothing is being selected, ``None`` is
+    returned.
+
+    :param chains: the IDs of the chains to keep - ligands and waters are\
+    kept if they are associated with one of them.
+    :param atom_names: the names of the atoms to keep.
+    :param bool skip_waters: if ``True``, waters will not be kept.
+    :param bool skip_ligands: if ``True``, ligands will not be kept.
+    :param models: the numbers of the models to keep, counting from 1.
+    :rtype: ``dict``"""
+
+    if chains is None and atom_names is None and models is None and not (
+     skip_waters or skip_ligands
+    ):
+        return None
+    return {
+     "chains": None if chains is None else set(chains),
+     "atom_names": None if atom_names is None else set(atom_names),
+     "skipped_kinds": {kind for kind, skip in (
+      ("water", skip_waters), ("non-polymer", skip_ligands)
+     ) if skip},
+     "models": None if models is None else set(models)
+    }
+
+
+def get_selection_mask(selection, chain_ids, names, kinds):
+    """Works out which atoms a selection keeps, from their chain IDs, names
+    and kinds ('polymer', 'non-polymer' or 'water').
+
+    :param dict selection: the selection made by :py:func:`.make_selection`.
+    :param list chain_ids: the chain ID of each atom.
+    :param list names: the name of each atom.
+    :param list kinds: the kind of each atom.
+    :rtype: ``list``"""
+
+    chains, skipped = selection["chains"], selection["skipped_kinds"]
+    atom_names = selection["atom_names"]
+    return [(chains is None or chain_id in chains) and kind not in skipped
+     and (atom_names is None or name in atom_names)
+     for chain_id, name, kind in zip(chain_ids, names, kinds)]
+
+
+def model_is_selected(selection, number):
+    """Checks whether a selection keeps the model with a given number.
+
+    :param dict selection: the selection, or ``None``.
+    :param int number: the model's number, counting from 1.
+    :rtype: ``bool``"""
+
+    return not selection or selection["models"] is None or (
+     number in selection["models"]
+    )
+
+
+def create_chains_from_residues(polymers, internal_ids, sequences, helices,
+                                strands):
+    """Creates :py:class:`.Chain` objects from lists of residues, linking
+    consecutive residues together and assigning secondary structure. Each
+    helix and strand is given as its first and last residue IDs, and will
+    contain all the residues between them.
+
+    :param dict polymers: chain IDs mapped to their residues, each paired with\
+    the index of its first atom.
+    :param list internal_ids: the internal ID of each atom.
+    :param dict sequences: chain IDs mapped to their sequences.
+    :param list helices: the first and last residue IDs of each helix.
+    :param list strands: the first and last residue IDs of each strand.
+    :rtype: ``list``"""
+
+    structures = {}
+    for segments, key in ((helices, "helices"), (strands, "strands")):
+        for first, last in segments:
+            chain_id = first.split(".")[0] if first else None
+            if chain_id in polymers:
+                structures.setdefault((chain_id, key), []).append((first, last))
+    chains = []
+    for chain_id, residues in polymers.items():
+        first = residues[0][0]
+        residues = [residue for _, residue in residues]
+        for res1, res2 in zip(residues[:-1], residues[1:]):
+            res1._next, res2._previous = res2, res1
+        chains.append(Chain(
+         *residues, id=chain_id, internal_id=internal_ids[first],
+         sequence=sequences.get(chain_id, ""), **{key: [
+          get_segment_residues(residues, *segment)
+          for segment in structures.get((chain_id, key), [])
+         ] for key in ("helices", "strands")}
+        ))
+    return chains
+
+
+def get_segment_residues(residues, first, last):
+    """Gets the residues from one residue ID to another in a list of residues.
+    If the first ID isn't there, no residues are returned, and if the last ID
+    isn't there, the residues continue to the end of the list.
+
+    :param list residues: the residues to search.
+    :param str first: the ID of the segment's first residue.
+    :param str last: the ID of the segment's last residue.
+    :rtype: ``list``"""
+
+    segment, in_segment = [], False
+    for residue in residues:
+        if residue._id == first: in_segment = True
+        if in_segment: segment.append(residue)
+        if residue._id == last: break
+    return segment
+
+
+def get_alt_loc_mask(codes, occupancies, alt_locs, group_count,
+                     policy="first"):
+    """Works out which atoms to keep when some have alternate locations, in
+    the same way that :py:func:`.create_het` does - in any group that has
+    atoms with partial occupancy, the atoms with the alternate location picked
+    by the policy are kept along with those that have full occupancy or no
+    alternate location.
+
+    The atom count and total occupancy of every alternate location in every
+    group are tallied together as a table, from which each group's choice is
+    read off.
+
+    :param numpy.ndarray codes: the group code of each atom.
+    :param list occupancies: the occupancy of each atom.
+    :param list alt_locs: the alternate location of each atom.
+    :param int group_count: the number of groups.
+    :param str policy: how to pick alternate locations.
+    :rtype: ``numpy.ndarray``"""
+
+    occupancies = np.array(occupancies, dtype="f8").reshape(len(codes))
+    lookup = {loc: i for i, loc in enumerate(sorted(set(filter(None, alt_locs))))}
+    if not lookup: return np.ones(len(codes), dtype=bool)
+    partial = np.bincount(
+     codes, weights=occupancies < 1, minlength=group_count
+    ) > 0
+    ranks = np.array(
+     [lookup.get(loc, -1) for loc in alt_locs], dtype="i8"
+    ).reshape(len(codes))
+    located = ranks != -1
+    cells = codes[located] * len(lookup) + ranks[located]
+    shape = (group_count, len(lookup))
+    present = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape) > 0
+    chosen = present.argmax(axis=1)
+    if policy == "occupancy":
+        totals = np.bincount(
+         cells, weights=occupancies[located], minlength=shape[0] * shape[1]
+        ).reshape(shape)
+        chosen = np.where(present, totals, -np.inf).argmax(axis=1)
+    elif policy in lookup:
+        chosen = np.where(present[:, lookup[policy]], lookup[policy], chosen)
+    chosen = np.where(partial, chosen, -2)
+    return (occupancies == 1) | ~located | (ranks == chosen[codes])
+
+
+def pick_alt_loc(totals, policy):
+    """Picks which alternate location to use for a group of atoms. The policy
+    can be:
+
+    - ``'first'`` - the first alternate location alphabetically.
+    - ``'occupancy'`` - the alternate location with the highest total \
+    occupancy, with ties going to the first alphabetically.
+    - ``'all'`` - as ``'first'``, but with the other positions stored on the \
+    atoms so that they can be switched to later.
+    - an alternate location ID such as ``'B'`` - that alternate location, or \
+    the first alphabetically if the group doesn't have it.
+
+    :param dict totals: the total occupancy of each alternate location.
+    :param str policy: how to pick the alternate location.
+    :rtype: ``str``"""
+
+    if policy in totals: return policy
+    if policy == "occupancy": return max(sorted(totals), key=totals.get)
+    return min(totals)
+
+
+def check_alt_loc_policy(policy):
+    """Checks that an alternate location policy is one that
+    :py:func:`.pick_alt_loc` understands.
+
+    :param str policy: the policy to check.
+    :raises ValueError: if the policy is not valid."""
+
+    if policy not in ALT_LOC_POLICIES and not (
+     isinstance(policy, str) and len(policy) == 1
+    ):
+        raise ValueError("Invalid alternate location policy: {}".format(policy))
+
+
+def match_alt_locs(keys, alt_locs, keep):
+    """Pairs each atom that is not being kept because of its alternate location
+    with the kept atom it is an alternative to - the one with the same key
+    (its name, and group if there is more than one). Alternatives with no such
+    atom, such as the atoms of a different residue modelled at the same
+    position, are left out.
+
+    :param list keys: the key of each atom.
+    :param list alt_locs: the alternate location of each atom.
+    :param list keep: whether each atom is being kept.
+    :returns: the index of each kept atom mapped to the indices of its\
+    alternatives.
+    :rtype: ``dict``"""
+
+    primaries = {key: index for index, (key, loc, kept) in enumerate(zip(
+     keys, alt_locs, keep
+    )) if loc and kept}
+    alternates = {}
+    for index, (key, loc, kept) in enumerate(zip(keys, alt_locs, keep)):
+        if loc and not kept and key in primaries:
+            alternates.setdefault(primaries[key], []).append(index)
+    return alternates
+
+
+def add_alt_locs(atoms, alternates, coords, occupancies, bvalues, alt_locs):
+    """Stores the alternate positions of atoms on them, as tuples of
+    coordinates, occupancy and B-value keyed by alternate location.
+
+    :param dict atoms: the index of each kept atom mapped to the atom.
+    :param dict alternates: the index of each kept atom mapped to the indices\
+    of its alternatives.
+    :param coords: the coordinates of every atom.
+    :param list occupancies: the occupancy of every atom.
+    :param list bvalues: the B-value of every atom.
+    :param list alt_locs: the alternate location of every atom."""
+
+    coords = np.array(coords, dtype="f8").reshape(len(alt_locs), 3)
+    occupancies, bvalues = column_to_list(occupancies), column_to_list(bvalues)
+    for index, others in alternates.items():
+        atoms[index]._alt_locs = {alt_locs[i]: (
+         *coords[i].tolist(), occupancies[i],
+         None if bvalues is None or bvalues[i] != bvalues[i] else bvalues[i]
+        ) for i in [index] + others}
+
+
+def create_atoms(coords, elements, atom_ids=None, names=None, charges=None,
+                 bvalues=None, anisotropy=None, occupancies=None):
+    """Creates :py:class:`.Atom` objects directly from columns of their
+    properties, without going through :py:meth:`.Atom.__init__`. Each atom's
+    location is a row of the coordinate array. Missing columns give the
+    default values, and ``nan`` B-values become ``None``.
+
+    :param numpy.ndarray coords: the atoms' coordinates, one row per atom.
+    :param list elements: the atoms' elements.
+    :param list atom_ids: the atoms' IDs.
+    :param list names: the atoms' names.
+    :param list charges: the atoms' charges.
+    :param list bvalues: the atoms' B-values.
+    :param list anisotropy: the atoms' anisotropy, six values each.
+    :param list occupancies: the atoms' occupancies.
+    :rtype: ``list``"""
+
+    length = len(coords)
+    atoms = []
+    for location, element, id, name, charge, bvalue, aniso, occupancy in zip(
+     coords, elements, atom_ids or [None] * length, names or [None] * length,
+     charges or [0] * length, bvalues or [None] * length,
+     anisotropy or [None] * length, occupancies or [1] * length
+    ):
+        atom = Atom.__new__(Atom)
+        atom._location, atom._element, atom._id = location, element, id
+        atom._name, atom._charge = name, charge
+        atom._bvalue = None if bvalue != bvalue else bvalue
+        atom._anisotropy = [0, 0, 0, 0, 0, 0] if aniso is None else aniso
+        atom._occupancy = occupancy
+        atom._het, atom._bonds = None, None
+        atom._alt_locs = None
+        atoms.append(atom)
+    return atoms
+
+
+HET_KINDS = {"polymer": 0, "non-polymer": 1, "water": 2}
+
+ALT_LOC_POLICIES = ("first", "occupancy", "all")
+
+FRAME_COLUMNS = ("coords", "atom_ids", "helices", "strands")
 
 PERIODIC_TABLE = {
  "H": 1.0079, "HE": 4.0026, "LI": 6.941, "BE": 9.0122, "B": 10.811,
@@ -0,0 +1,265 @@
+"""Contains functions for reading .dcd trajectory files, as written by CHARMM,
+NAMD and most other molecular dynamics programs, and for moving models
+through their frames.
+
+A .dcd file is a series of Fortran unformatted records, each of which is
+preceded and followed by its length as a 32 bit integer:
+
+- A header record of 84 bytes - the four bytes ``CORD``, then twenty 32 bit\
+  control values. The first is the number of frames, the second and third the\
+  first step and the number of steps between frames, the ninth the number of\
+  fixed atoms, the tenth the timestep (a 32 bit float), the eleventh and\
+  twelfth whether frames have unit cells and a fourth dimension, and the last\
+  the CHARMM version (zero for X-PLOR files).
+- A title record - a count, followed by that many 80 character lines.
+- An atom count record.
+- The frames, each of which is an optional unit cell record of six 64 bit\
+  floats, then one record each of the x, y and z coordinates of every atom as\
+  32 bit floats, then an optional fourth dimension record.
+
+The file can be of either byte order, which is worked out from the length of
+the header record. Frames are all the same size, so every coordinate in the
+file can be viewed as one strided NumPy array over a memory map of it, and
+reading a frame is a single copy out of that view."""
+
+import mmap
+import struct
+import builtins
+import numpy as np
+
+HEADER_SIZE = 84
+
+def open_dcd(path):
+    """Opens a .dcd trajectory file. Its frames are read from the file as they
+    are needed, rather than all at once.
+
+        >>> model = atomium.open('system.pdb').model
+        >>> with atomium.open_dcd('run.dcd') as trajectory:
+        ...     for frame in trajectory.iter_frames(model):
+        ...         print(frame, model.radius_of_gyration)
+
+    :param str path: the location of the .dcd file.
+    :raises ValueError: if the file is not a .dcd file it can read.
+    :rtype: ``Trajectory``"""
+
+    return Trajectory(path)
+
+
+def read_dcd_header(buffer):
+    """Reads the records at the start of a .dcd file which come before the
+    frames, and works out where the frames are.
+
+    :param buffer: the bytes of the file.
+    :raises ValueError: if the file is not a .dcd file it can read.
+    :rtype: ``dict``"""
+
+    for endian in "<>":
+        if struct.unpack(endian + "i", buffer[:4])[0] == HEADER_SIZE: break
+    else: raise ValueError("Not a .dcd file")
+    if bytes(buffer[4:8]) != b"CORD": raise ValueError("Not a .dcd file")
+    control = struct.unpack(endian + "9if10i", buffer[8:88])
+    if control[8]:
+        raise ValueError("Trajectories with fixed atoms are not supported")
+    position = HEADER_SIZE + 8
+    length, count = struct.unpack(endian + "2i", buffer[position:position + 8])
+    title = bytes(buffer[position + 8:position + 8 + count * 80]).decode(
+     errors="replace"
+    )
+    position += length + 8
+    atom_count = struct.unpack(endian + "i", buffer[position + 4:position + 8])[0]
+    position += 12
+    unit_cell, fourth = bool(control[19] and control[10]), bool(
+     control[19] and control[11]
+    )
+    record = 4 * atom_count + 8
+    frame_size = 56 * unit_cell + record * (3 + fourth)
+    return {
+     "endian": endian, "first_step": control[1], "interval": control[2],
+     "timestep": control[9], "unit_cell": unit_cell, "atom_count": atom_count,
+     "title": [line.strip() for line in (
+      title[i:i + 80] for i in range(0, len(title), 80)
+     )], "offset": position, "frame_size": frame_size,
+     "frames": (len(buffer) - position) // frame_size
+    }
+
+
+def make_frame_view(buffer, header):
+    """Creates a read-only NumPy array of shape ``(frames, atoms, 3)`` which
+    looks directly at the coordinates in a .dcd file, stepping over the record
+    lengths and unit cells between them.
+
+    :param buffer: the bytes of the file.
+    :param dict header: the file's header, from :py:func:`.read_dcd_header`.
+    :rtype: ``numpy.ndarray``"""
+
+    count = header["atom_count"]
+    if not header["frames"]: return np.zeros((0, count, 3), dtype="f4")
+    return np.ndarray(
+     (header["frames"], count, 3), dtype=header["endian"] + "f4",
+     buffer=buffer, strides=(header["frame_size"], 4, 4 * count + 8),
+     offset=header["offset"] + 56 * header["unit_cell"] + 4
+    )
+
+
+def bind_atoms(model, count):
+    """Points the location of every atom in a model at a row of a single
+    coordinate array, so that all of them can be moved at once by copying
+    into it. Atoms are matched to rows in order of their IDs.
+
+    :param Model model: the model whose atoms are to be bound.
+    :param int count: the number of atoms the model should have.
+    :raises ValueError: if the model has the wrong number of atoms.
+    :rtype: ``numpy.ndarray``"""
+
+    atoms = sorted(model.atoms(), key=lambda a: a._id)
+    if len(atoms) != count:
+        raise ValueError("Model has {} atoms but trajectory has {}".format(
+         len(atoms), count
+        ))
+    locations = np.array([atom._location for atom in atoms], dtype="f8")
+    locations = locations.reshape(count, 3)
+    for atom, location in zip(atoms, locations): atom._location = location
+    return locations
+
+
+
+class Trajectory:
+    """A .dcd trajectory, read from a memory map of the file. It can be
+    indexed, sliced and iterated over to get its frames as NumPy arrays of
+    shape ``(atoms, 3)`` (or ``(frames, atoms, 3)`` for a slice), each of
+    which is a copy of the coordinates in the file.
+
+    A :py:class:`.Model` with the same atoms can also be moved to a frame,
+    its atoms being matched to the trajectory's in order of their IDs. The
+    first time this is done the atoms' locations are all made rows of a single
+    array, so that moving to any frame after that is one copy into it. An
+    atom whose location is later replaced rather than changed in place (by
+    :py:meth:`.Atom.transform_atoms`, for example) no longer follows the
+    trajectory, until the model is moved with ``rebind=True``.
+
+    :param str path: the location of the .dcd file.
+    :raises ValueError: if the file is not a .dcd file it can read."""
+
+    def __init__(self, path):
+        with builtins.open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._header = read_dcd_header(self._mmap)
+        except:
+            self._mmap.close()
+            raise
+        self._frames = make_frame_view(self._mmap, self._header)
+        self._binding = None
+
+
+    def __repr__(self):
+        return "<Trajectory ({} frame{}, {} atom{})>".format(
+         len(self), "" if len(self) == 1 else "s",
+         self.atom_count, "" if self.atom_count == 1 else "s"
+        )
+
+
+    def __len__(self):
+        return self._header["frames"]
+
+
+    def __iter__(self):
+        for index in range(len(self)): yield self[index]
+
+
+    def __getitem__(self, index):
+        return np.array(self._frames[index], dtype="f8")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+
+    @property
+    def atom_count(self):
+        """The number of atoms in each frame.
+
+        :rtype: ``int``"""
+
+        return self._header["atom_count"]
+
+
+    @property
+    def title(self):
+        """The lines of the trajectory's title.
+
+        :rtype: ``list``"""
+
+        return self._header["title"]
+
+
+    @property
+    def first_step(self):
+        """The simulation step of the first frame.
+
+        :rtype: ``int``"""
+
+        return self._header["first_step"]
+
+
+    @property
+    def interval(self):
+        """The number of simulation steps between frames.
+
+        :rtype: ``int``"""
+
+        return self._header["interval"]
+
+
+    @property
+    def timestep(self):
+        """The length of a simulation step, in the units the program that
+        wrote the file uses (AKMA units of 48.88821 fs for CHARMM and NAMD).
+
+        :rtype: ``float``"""
+
+        return self._header["timestep"]
+
+
+    def apply(self, model, index, rebind=False):
+        """Moves a model's atoms to where they are in one of the trajectory's
+        frames. The model's cached arrays and distance grid are discarded, as
+        they no longer describe it.
+
+        :param Model model: the model to move.
+        :param int index: the frame to move it to.
+        :param bool rebind: if ``True``, the atoms' locations are made rows of\
+        a new array even if the model has been moved before.
+        :raises ValueError: if the model has the wrong number of atoms."""
+
+        frame = self._frames[index]
+        if rebind or self._binding is None or self._binding[0] is not model:
+            self._binding = (model, bind_atoms(model, self.atom_count))
+        np.copyto(self._binding[1], frame)
+        model._columns, model._internal_grid = None, None
+
+
+    def iter_frames(self, model, rebind=False):
+        """Moves a model through every frame of the trajectory in turn,
+        yielding the number of each frame once the model is there.
+
+        :param Model model: the model to move.
+        :param bool rebind: if ``True``, the atoms' locations are made rows of\
+        a new array before the first frame.
+        :raises ValueError: if the model has the wrong number of atoms.
+        :rtype: ``int``"""
+
+        for index in range(len(self)):
+            self.apply(model, index, rebind=rebind and index == 0)
+            yield index
+
+
+    def close(self):
+        """Closes the trajectory's file. Frames already read are unaffected."""
+
+        self._frames, self._binding = None, None
+        self._mmap.close()
@@ -1,14 +1,19 @@
 """Contains functions for dealing with the .cif file format."""
 
 from collections import deque
+import io
+import mmap
 import re
 from datetime import datetime
 import numpy as np
 import valerius
-from itertools import groupby
-from .data import CODES, Chain, Residue, Ligand
+from itertools import groupby, compress
+from .data import CODES, Chain, Residue, Ligand, Model
+from .data import get_selection_mask, model_is_selected, columns_to_models
+from .data import group_columns, match_bond_keys
+from .components import lookup_component, get_component_templates
 
-def mmcif_string_to_mmcif_dict(filestring):
+def mmcif_string_to_mmcif_dict(filestring, atom_site=True):
     """Takes a .cif filestring and turns into a ``dict`` which represents its
     table structure. Only lines which aren't empty and which don't begin with
     ``#`` are used.
@@ -17,10 +22,14 @@ def mmcif_string_to_mmcif_dict(filestring):
     then split into the blocks that will become table lists. At the end, quote
     marks are removed from any string which retains them.
 
-    :param str filestring: the .cif filestring to process.
+    :param str filestring: the .cif filestring (or bytes buffer) to process.
+    :param bool atom_site: if ``False``, the atom_site table will be skipped\
+    over as the lines are read.
     :rtype: ``dict``"""
 
-    lines = deque(filter(lambda l: l and l[0] != "#", filestring.split("\n")))
+    lines = iter_lines(filestring)
+    if not atom_site: lines = skip_atom_site(lines)
+    lines = deque(filter(lambda l: l and l[0] != "#", lines))
     lines = consolidate_strings(lines)
     blocks = mmcif_lines_to_mmcif_blocks(lines)
     mmcif_dict = {}
@@ -33,6 +42,91 @@ def mmcif_string_to_mmcif_dict(filestring):
     return mmcif_dict
 
 
+def skip_atom_site(lines):
+    """Passes on lines of a .cif file, leaving out those of the atom_site
+    table - including the ``loop_`` line that starts it.
+
+    :param lines: the lines to filter.
+    :rtype: ``str``"""
+
+    in_table, pending = False, None
+    for line in lines:
+        if line.startswith("_atom_site."):
+            in_table, pending = True, None
+            continue
+        if in_table:
+            if not is_table_end(line): continue
+            in_table = False
+        if pending is not None: yield pending
+        pending = None
+        if line.startswith("loop_"):
+            pending = line
+        else: yield line
+    if pending is not None: yield pending
+
+
+def iter_mmcif_dicts(filestring, mmcif_dict):
+    """Reads the atom_site table of a .cif filestring one model at a time,
+    yielding a copy of an .mmcif dictionary (one read without its atom_site
+    table) for each model, with that model's rows as its atom_site table. Only
+    one model's rows are held at once.
+
+    :param str filestring: the .cif filestring (or bytes buffer) to process.
+    :param dict mmcif_dict: the rest of the file's .mmcif dictionary.
+    :rtype: ``dict``"""
+
+    names, rows, values, in_table = [], [], [], False
+    for line in iter_lines(filestring):
+        if line.startswith("_atom_site."):
+            names.append(line.split(".")[1].rstrip())
+            in_table = True
+            continue
+        if not in_table or not line: continue
+        if is_table_end(line): break
+        values += split_values(line)
+        if len(values) < len(names): continue
+        row, values = dict(zip(names, values)), []
+        if rows and row["pdbx_PDB_model_num"] != rows[-1]["pdbx_PDB_model_num"]:
+            strip_quotes({"atom_site": rows})
+            yield {**mmcif_dict, "atom_site": rows}
+            rows = []
+        rows.append(row)
+    if rows:
+        strip_quotes({"atom_site": rows})
+        yield {**mmcif_dict, "atom_site": rows}
+
+
+def is_table_end(line):
+    """Checks whether a .cif line ends the body of a loop table.
+
+    :param str line: the line to check.
+    :rtype: ``bool``"""
+
+    return line.startswith(("#", "_", "loop_", "data_"))
+
+
+def iter_lines(filestring):
+    """A generator which yields the lines of a filestring, without their line
+    endings. The filestring can be a ``str``, a bytes-like buffer such as a
+    ``bytes`` object or a memory-mapped file, or a binary stream such as a
+    decompressing file object - in which case each line is decoded as it is
+    reached, so that the whole file is never converted to one big string or
+    list of lines. Windows (CRLF) line endings are removed as well.
+
+    :param filestring: the file contents to split.
+    :rtype: ``str``"""
+
+    if isinstance(filestring, str):
+        for line in filestring.split("\n"): yield line.rstrip("\r")
+        return
+    if isinstance(filestring, mmap.mmap):
+        filestring.seek(0)
+    elif not hasattr(filestring, "readline"):
+        filestring = io.BytesIO(filestring)
+    for line in iter(filestring.readline, b""):
+        yield line.rstrip(b"\r\n").decode(errors="replace")
+
+
 def consolidate_strings(lines):
     """Generally, .cif files have a one file line to one table row
     correspondence. Sometimes however, a string cell is given a line of its own,
@@ -184,11 +278,12 @@ def strip_quotes(mmcif_dict):
                     row[k] = row[k].replace("\x1a", '"').replace("\x1b", "'")
 
 
-def mmcif_dict_to_data_dict(mmcif_dict):
+def mmcif_dict_to_data_dict(mmcif_dict, models=True):
     """Converts an .mmcif dictionary into an atomium data dictionary, with the
     same standard layout that the other file formats get converted into.
 
     :param dict mmcif_dict: the .mmcif dictionary.
+    :param bool models: if ``False``, the models list will be left empty.
     :rtype: ``dict``"""
 
     data_dict = {
@@ -205,10 +300,84 @@ def mmcif_dict_to_data_dict(mmcif_dict):
     update_experiment_dict(mmcif_dict, data_dict)
     update_quality_dict(mmcif_dict, data_dict)
     update_geometry_dict(mmcif_dict, data_dict)
-    update_models_list(mmcif_dict, data_dict)
+    if models: update_models_list(mmcif_dict, data_dict)
     return data_dict
 
 
+def mmcif_dict_to_models(mmcif_dict, alt_loc="first", selection=None):
+    """Creates :py:class:`.Model` objects directly from an .mmcif dictionary,
+    without building the intermediate model dictionaries - the atoms of each
+    model are read into columns (see :py:func:`.iter_mmcif_columns`) and
+    passed to :py:func:`.columns_to_models`, so that models with the same
+    atoms share them as an :py:class:`.Ensemble`.
+
+    :param dict mmcif_dict: the .mmcif dictionary to read.
+    :param str alt_loc: how to handle alternate locations.
+    :param dict selection: the atoms to keep - see\
+    :py:func:`.make_selection`.
+    :rtype: ``list`` or ``Ensemble``"""
+
+    return columns_to_models(
+     iter_mmcif_columns(mmcif_dict, selection), alt_loc=alt_loc
+    )
+
+
+def iter_mmcif_columns(mmcif_dict, selection=None):
+    """Reads the atoms of each model in an .mmcif dictionary into the columns
+    that :py:meth:`.Model.from_arrays` takes, one model at a time.
+
+    If a selection is given, atom_site rows that it rejects are dropped
+    before any of their values are read.
+
+    :param dict mmcif_dict: the .mmcif dictionary to read.
+    :param dict selection: the atoms to keep - see\
+    :py:func:`.make_selection`.
+    :rtype: ``dict``"""
+
+    types = {e["id"]: e["type"] for e in mmcif_dict.get("entity", {})}
+    names = {e["id"]: e["name"] for e in mmcif_dict.get("chem_comp", {})
+     if e["mon_nstd_flag"] != "y"}
+    entities = {
+     m["id"]: m["entity_id"] for m in mmcif_dict.get("struct_asym", [])
+    }
+    sequences = make_sequences(mmcif_dict)
+    secondary_structure = make_secondary_structure(mmcif_dict)
+    aniso = make_aniso(mmcif_dict)
+    connections = make_connections(mmcif_dict)
+    templates = make_bond_templates(mmcif_dict)
+    for number, (_, atoms) in enumerate(groupby(
+     mmcif_dict["atom_site"], key=lambda a: a["pdbx_PDB_model_num"]
+    ), start=1):
+        if not model_is_selected(selection, number): continue
+        atoms = list(atoms)
+        if selection:
+            atoms = list(compress(atoms, get_selection_mask(selection, [
+             a["auth_asym_id"] for a in atoms
+            ], [a.get("label_atom_id") for a in atoms], [
+             types[entities[a["label_asym_id"]]] for a in atoms
+            ])))
+        columns = atom_site_to_columns(atoms, aniso, names)
+        kinds = [types[entities[i]] for i in columns["internal_ids"]]
+        internal_ids = {}
+        for kind, chain_id, internal_id in zip(
+         kinds, columns["chain_ids"], columns["internal_ids"]
+        ):
+            if kind == "polymer": internal_ids.setdefault(chain_id, internal_id)
+        model_templates = {**get_component_templates(
+         set(columns["res_names"]) - set(templates)
+        ), **templates}
+        if connections or model_templates:
+            columns["bonds"] = get_bonds(
+             columns, kinds, connections, model_templates
+            )
+        yield dict(
+         **columns, **secondary_structure, kinds=kinds, sequences={
+          chain_id: sequences.get(entities.get(internal_id, ""), "")
+          for chain_id, internal_id in internal_ids.items()
+         }
+        )
+
+
 def update_description_dict(mmcif_dict, data_dict):
     """Takes a data dictionary and updates its description sub-dictionary with
     information from a .mmcif dictionary.
@@ -471,6 +640,113 @@ def make_secondary_structure(mmcif_dict):
     return {"helices": helices, "strands": strands}
 
 
+def make_connections(mmcif_dict):
+    """Reads the covalent bonds and metal coordination in the struct_conn
+    table of an .mmcif dictionary, as the residue ID and atom name of each
+    partner and the bond's order. Hydrogen bonds are left out, as are bonds to
+    atoms in another copy of the asymmetric unit.
+
+    :param dict mmcif_dict: the .mmcif dictionary to read.
+    :rtype: ``list``"""
+
+    connections = []
+    for conn in mmcif_dict.get("struct_conn", []):
+        if conn["conn_type_id"] == "hydrog": continue
+        if conn.get("ptnr1_symmetry") != conn.get("ptnr2_symmetry"): continue
+        connections.append((*[(make_residue_id({
+         "auth_asym_id": conn[f"ptnr{n}_auth_asym_id"],
+         "auth_seq_id": conn[f"ptnr{n}_auth_seq_id"],
+         "pdbx_PDB_ins_code": conn.get(f"pdbx_ptnr{n}_PDB_ins_code", "?")
+        }), conn[f"ptnr{n}_label_atom_id"]) for n in (1, 2)], BOND_ORDERS.get(
+         conn.get("pdbx_value_order", "?").lower(), 1
+        )))
+    return connections
+
+
+def make_bond_templates(mmcif_dict):
+    """Reads the bonds within each kind of residue or ligand from the
+    chem_comp_bond table of an .mmcif dictionary, as the names of the atoms of
+    each bond and its order.
+
+    :param dict mmcif_dict: the .mmcif dictionary to read.
+    :rtype: ``dict``"""
+
+    templates = {}
+    for bond in mmcif_dict.get("chem_comp_bond", []):
+        templates.setdefault(bond["comp_id"], []).append((
+         bond["atom_id_1"], bond["atom_id_2"],
+         BOND_ORDERS.get(bond.get("value_order", "?").lower(), 1)
+        ))
+    return templates
+
+
+def get_bonds(columns, kinds, connections, templates):
+    """Works out which rows of a model's columns are bonded, from the bonds
+    between residues given by :py:func:`.make_connections` and the bonds
+    within them given by :py:func:`.make_bond_templates`. Every row is given
+    a key from its residue and atom name, and each kind of residue's bonds
+    are turned into keys for every residue of that kind at once, so that the
+    bonded rows can all be looked up together.
+
+    :param dict columns: the model's columns.
+    :param list kinds: the kind of each row's residue.
+    :param list connections: the bonds between residues.
+    :param dict templates: the bonds within each kind of residue.
+    :rtype: ``numpy.ndarray``"""
+
+    _, codes, firsts = group_columns(
+     kinds, columns["chain_ids"], columns["res_ids"]
+    )
+    names, name_codes = np.unique(
+     np.array(columns["names"], dtype="U"), return_inverse=True
+    )
+    keys1, keys2, orders = [], [], []
+    if connections:
+        groups = {columns["res_ids"][f]: c for c, f in enumerate(firsts)}
+        partners1, partners2, order = zip(*connections)
+        for (res_ids, atom_names), keys in (
+         (zip(*partners1), keys1), (zip(*partners2), keys2)
+        ):
+            keys.append(get_atom_keys(names, np.array(
+             [groups.get(res_id, -1) for res_id in res_ids], dtype="i8"
+            ), atom_names))
+        orders.append(np.array(order, dtype="i8"))
+    res_names = np.array([columns["res_names"][f] for f in firsts], dtype="U")
+    for name, bonds in templates.items():
+        groups = np.flatnonzero(res_names == name)
+        if not len(groups): continue
+        atoms1, atoms2, order = zip(*bonds)
+        for atom_names, keys in ((atoms1, keys1), (atoms2, keys2)):
+            keys.append(get_atom_keys(
+             names, groups[:, None], np.array(atom_names)[None, :]
+            ).reshape(-1))
+        orders.append(np.tile(np.array(order, dtype="i8"), len(groups)))
+    if not orders: return np.zeros((0, 3), dtype="i8")
+    pairs, bonds = match_bond_keys(
+     codes * len(names) + name_codes.reshape(-1), np.concatenate(keys1),
+     np.concatenate(keys2)
+    )
+    return np.column_stack([pairs, np.concatenate(orders)[bonds]])
+
+
+def get_atom_keys(names, groups, atom_names):
+    """Makes the keys that :py:func:`.get_bonds` looks atoms up by - the code
+    of the atom's residue, times the number of distinct atom names in the
+    model, plus the position of the atom's name among them. Atoms whose
+    residue or name isn't in the model get -1, which matches nothing.
+
+    :param numpy.ndarray names: the model's distinct atom names, sorted.
+    :param numpy.ndarray groups: the codes of the atoms' residues, or -1.
+    :param atom_names: the atoms' names.
+    :rtype: ``numpy.ndarray``"""
+
+    atom_names = np.array(atom_names, dtype="U")
+    positions = np.searchsorted(names, atom_names)
+    positions = np.minimum(positions, len(names) - 1)
+    found = (names[positions] == atom_names) & (groups >= 0)
+    return np.where(found, groups * len(names) + positions, -1)
+
+
 def add_atom_to_polymer(atom, aniso, model, names):
     """Takes an MMCIF atom dictionary, converts it, and adds it to a polymer
     dictionary.
@@ -530,6 +806,38 @@ def add_atom_to_non_polymer(atom, aniso, model, mol_type, names):
         }
 
 
+def atom_site_to_columns(atoms, aniso, names):
+    """Reads the properties of some .mmcif atom dictionaries into columns of
+    per-atom values, ready for :py:meth:`.Model.from_arrays`. The values are
+    interpreted in the same way as :py:func:`.atom_dict_to_atom_dict` does.
+
+    :param list atoms: the .mmcif atom dictionaries to read.
+    :param dict aniso: lookup dictionary for anisotropy information.
+    :param dict names: the lookup dictionary for full name information.
+    :rtype: ``dict``"""
+
+    atom_ids = [int(a["id"]) for a in atoms]
+    res_names = [a["auth_comp_id"] for a in atoms]
+    return {
+     "coords": [(a["Cartn_x"], a["Cartn_y"], a["Cartn_z"]) for a in atoms],
+     "elements": [a["type_symbol"] for a in atoms],
+     "names": [a.get("label_atom_id") for a in atoms],
+     "res_ids": [make_residue_id(a) for a in atoms],
+     "chain_ids": [a["auth_asym_id"] for a in atoms],
+     "internal_ids": [a["label_asym_id"] for a in atoms],
+     "atom_ids": atom_ids, "res_names": res_names,
+     "full_names": [names.get(name) for name in res_names],
+     "charges": [0.0 if a.get("pdbx_formal_charge", "?") == "?" else
+      float(a["pdbx_formal_charge"]) for a in atoms],
+     "bvalues": [None if a.get("B_iso_or_equiv") is None else
+      float(a["B_iso_or_equiv"]) for a in atoms],
+     "occupancies": [float(a.get("occupancy", 1)) for a in atoms],
+     "alt_locs": [None if a.get("label_alt_id") == "." else
+      a.get("label_alt_id") for a in atoms],
+     "anisotropy": [aniso.get(id) for id in atom_ids] if aniso else None
+    }
+
+
 def make_residue_id(d):
     """Generates a residue ID for an atom.
 
@@ -581,7 +889,8 @@ def make_sequences(mmcif_dict):
     :rtype: ``dict``"""
 
     return {e["id"]: "".join([
-     CODES.get(res["mon_id"], "X") for res in
+     CODES.get(res["mon_id"]) or lookup_component(res["mon_id"], "code")
+      or "X" for res in
       mmcif_dict.get("entity_poly_seq", []) if res["entity_id"] == e["id"]
     ]) for e in mmcif_dict.get("entity", []) if e["type"] == "polymer"}
 
@@ -641,31 +950,107 @@ def structure_to_mmcif_string(structure):
     :param AtomStructure structure: the structure to convert.
     :rtype: ``str``"""
 
+    return "\n".join(structure_to_mmcif_lines(structure))
+
+
+def structure_to_mmcif_lines(structure):
+    """A generator which converts a :py:class:`.AtomStructure` to .cif lines,
+    yielding them one at a time (without line endings) so that they can be
+    written out without the whole filestring ever being built.
+
+    :param AtomStructure structure: the structure to convert.
+    :rtype: ``str``"""
+
+    yield from models_to_mmcif_lines([structure])
+
+
+def models_to_mmcif_lines(models):
+    """A generator which converts a series of models to .cif lines, yielding
+    them one at a time. Each model's atoms go in the atom_site table with
+    their model number.
+
+    The entity and structure tables need to know every molecule present, so the
+    first model's atoms are looked at once up front, and then again as their
+    lines are made. These tables describe the first model.
+
+    Any model after the first can be given as an array of coordinates instead
+    of a structure - one row for each of the first model's atoms, in order of
+    their IDs. The first model's lines are then written again with just their
+    coordinates, atom IDs and model number changed, so that they are only made
+    once. The atom IDs carry on from the highest ID of the previous model.
+
+    :param models: the structures and coordinate arrays to convert.
+    :raises ValueError: if an array is not the same size as the first model.
+    :rtype: ``str``"""
+
+    template, aniso, step = None, [], 0
+    for number, model in enumerate(models, start=1):
+        if template is None or hasattr(model, "atoms"):
+            atoms = sorted(model.atoms(), key=lambda a: a.id)
+            lines = [atom_to_atom_line(atom, number) for atom in atoms]
+            aniso += [(atom.id, atom.anisotropy) for atom in atoms
+             if atom.anisotropy != [0, 0, 0, 0, 0, 0]]
+        if template is None:
+            yield from structure_to_table_lines(atoms)
+            template = [line.split(" ") for line in lines]
+            template_aniso, step = list(aniso), max([a.id for a in atoms] or [0])
+        elif not hasattr(model, "atoms"):
+            offset = step * (number - 1)
+            lines = move_atom_lines(template, model, offset, number)
+            aniso += [(id + offset, values) for id, values in template_aniso]
+        yield from lines
+    if aniso:
+        yield from ["#", "loop_"] + ["_atom_site_anisotrop." + f for f in [
+         "id", "U[1][1]", "U[2][2]", "U[3][3]", "U[1][2]", "U[1][3]", "U[2][3]",
+        ]]
+        for id, values in aniso:
+            yield "{} {} {} {} {} {} {}".format(id, *values)
+
+
+def structure_to_table_lines(atoms):
+    """Makes the .cif lines that come before the atoms themselves - the
+    entity and structure tables for the molecules the atoms are in, and the
+    atom_site table's header.
+
+    :param list atoms: the atoms to describe.
+    :rtype: ``list``"""
+
     lines = ["data_atomium"]
     chains, ligands, waters = set(), set(), set()
-    atom_lines = ["#", "loop_"] + ["_atom_site." + field for field in [
+    for atom in atoms:
+        get_structure_from_atom(atom, chains, ligands, waters)
+    entities = create_entities(chains, ligands, waters)
+    update_lines_with_entities(lines, entities)
+    update_lines_with_structures(lines, chains, ligands, waters, entities)
+    return lines + ["#", "loop_"] + ["_atom_site." + field for field in [
      "group_PDB", "id", "type_symbol", "label_atom_id", "label_alt_id",
      "label_comp_id", "label_asym_id", "label_entity_id", "label_seq_id",
      "pdbx_PDB_ins_code", "Cartn_x", "Cartn_y", "Cartn_z", "occupancy",
      "B_iso_or_equiv", "pdbx_formal_charge", "auth_seq_id",
      "auth_comp_id", "auth_asym_id", "auth_atom_id", "pdbx_PDB_model_num"
     ]]
-    aniso_lines = ["#", "loop_"] + ["_atom_site_anisotrop." + f for f in [
-     "id", "U[1][1]", "U[2][2]", "U[3][3]", "U[1][2]", "U[1][3]", "U[2][3]",
-    ]]
-    for atom in sorted(structure.atoms(), key=lambda a: a.id):
-        get_structure_from_atom(atom, chains, ligands, waters)
-        atom_lines.append(atom_to_atom_line(atom))
-        if atom.anisotropy != [0, 0, 0, 0, 0, 0]:
-            aniso_lines.append(
-             "{} {} {} {} {} {} {}".format(atom.id, *atom.anisotropy)
-            )
-    entities = create_entities(chains, ligands, waters)
-    update_lines_with_entities(lines, entities)
-    update_lines_with_structures(lines, chains, ligands, waters, entities)
-    lines += atom_lines
-    if len(aniso_lines) > 9: lines += aniso_lines
-    return "\n".join(lines)
+
+
+def move_atom_lines(template, coordinates, offset, number):
+    """Takes the atom_site lines of a model, split into their values, and
+    makes them again with new coordinates, atom IDs and model number.
+
+    :param list template: the values of each line.
+    :param coordinates: the new coordinates, one row per line.
+    :param int offset: the amount to add to each atom ID.
+    :param int number: the new model number.
+    :raises ValueError: if there are the wrong number of coordinates.
+    :rtype: ``list``"""
+
+    coordinates = np.asarray(coordinates, dtype="f8")
+    if coordinates.shape != (len(template), 3):
+        raise ValueError("Expected coordinates of shape ({}, 3), not {}".format(
+         len(template), coordinates.shape
+        ))
+    return ["ATOM {} {} {:.3f} {:.3f} {:.3f} {} {}".format(
+     int(values[1]) + offset, " ".join(values[2:10]), *location,
+     " ".join(values[13:-1]), number
+    ) for values, location in zip(template, coordinates.tolist())]
 
 
 def get_structure_from_atom(atom, chains, ligands, waters):
@@ -685,23 +1070,24 @@ def get_structure_from_atom(atom, chains, ligands, waters):
             ligands.add(atom.het)
 
 
-def atom_to_atom_line(atom):
+def atom_to_atom_line(atom, model=1):
     """Takes an atomium atom and turns it into a .cif ATOM record.
 
     :param Atom atom: the atom to read.
+    :param int model: the number of the model the atom is in.
     :rtype: ``str``"""
 
     name = get_atom_name(atom)
     res_num, res_insert = split_residue_id(atom)
-    return "ATOM {} {} {} . {} {} . {} {} {} {} {} 1 {} {} {} {} {} {} 1".format(
+    return "ATOM {} {} {} . {} {} . {} {} {} {} {} {} {} {} {} {} {} {} {}".format(
      atom.id, atom.element, name, atom.het._name if atom.het else "?",
      atom.het._internal_id if atom.het and isinstance(
       atom.het, Ligand
      ) else atom.chain._internal_id if atom.chain else ".",
      res_num, res_insert, atom.location[0], atom.location[1], atom.location[2],
-     atom.bvalue, atom.charge,
+     atom.occupancy, atom.bvalue, atom.charge,
      res_num, atom.het._name if atom.het else "?",
-     atom.chain.id if atom.chain else ".", name
+     atom.chain.id if atom.chain else ".", name, model
     )
 
 
@@ -729,40 +1115,52 @@ def split_residue_id(atom):
 
 
 def create_entities(chains, ligands, waters):
-    """Creates a list of entities from chains, ligands and waters.
+    """Creates a registry of entities from chains, ligands and waters. This is
+    a ``dict`` which maps entity keys (see :py:func:`.get_entity_key`) to the
+    first structure found for that entity, in entity ID order - so that any
+    structure's entity can be found with a single lookup.
 
     :param set chains: the chains.
     :param set ligands: the ligands.
     :param set waters: the waters.
-    :rtype: ``list``"""
+    :rtype: ``dict``"""
 
-    entities = []
+    entities = {}
     for chain in sorted(chains, key=lambda c: c.id):
-        for e in entities:
-            if isinstance(e, Chain) and e.sequence == chain.sequence: break
-        else: entities.append(chain)
+        entities.setdefault(get_entity_key(chain), chain)
     for ligand in sorted(ligands, key=lambda l: l.chain.id):
-        for e in entities:
-            if isinstance(e, Ligand) and e._name == ligand._name: break
-        else: entities.append(ligand)
-    if len(waters): entities.append(list(waters)[0])
+        entities.setdefault(get_entity_key(ligand), ligand)
+    for water in waters:
+        entities.setdefault(get_entity_key(water), water)
+        break
     return entities
 
 
+def get_entity_key(structure):
+    """Gets the key which identifies the entity a chain, ligand or water
+    belongs to - polymers are keyed by sequence and other molecules by name.
+
+    :param Molecule structure: the structure to get the key for.
+    :rtype: ``tuple``"""
+
+    if isinstance(structure, Chain): return ("polymer", structure.sequence)
+    if structure.is_water: return ("water",)
+    return ("non-polymer", structure._name)
+
+
 def update_lines_with_entities(lines, entities):
     """Updates a list of .cif lines with relevant information about entities.
 
     :param list lines: the list of lines to update.
-    :param list entities: the entities to pack."""
+    :param dict entities: the entities to pack."""
 
     lines += ["#", "loop_", "_entity.id", "_entity.type"]
-    for i, entity in enumerate(entities, start=1):
-        lines.append("{} {}".format(i, "polymer" if isinstance(entity, Chain)
-         else "water" if entity.is_water else "non-polymer"))
-    if any(isinstance(entity, Chain) for entity in entities):
+    for i, key in enumerate(entities, start=1):
+        lines.append("{} {}".format(i, key[0]))
+    if any(key[0] == "polymer" for key in entities):
         lines += ["#", "loop_", "_entity_poly_seq.entity_id",
          "_entity_poly_seq.num", "_entity_poly_seq.mon_id"]
-        for ei, entity in enumerate(entities, start=1):
+        for ei, entity in enumerate(entities.values(), start=1):
             if isinstance(entity, Chain):
                 for ci, code in enumerate(
                  valerius.from_string(entity.sequence).codes, start=1
@@ -777,25 +1175,25 @@ def update_lines_with_structures(lines, chains, ligands, waters, entities):
     :param set chains: the chains.
     :param set ligands: the ligands.
     :param set waters: the waters.
-    :param list entities: the entities to pack."""
+    :param dict entities: the entities to pack."""
 
     lines += ["#", "loop_", "_struct_asym.id", "_struct_asym.entity_id"]
-    struct_num = 1
+    entity_ids = {key: i for i, key in enumerate(entities, start=1)}
     for chain in sorted(chains, key=lambda c: c._internal_id):
-        for i, entity in enumerate(entities, start=1):
-            if isinstance(entity, Chain) and entity.sequence == chain.sequence:
-                lines.append("{} {}".format(chain._internal_id, i))
-                break
+        lines.append("{} {}".format(
+         chain._internal_id, entity_ids[get_entity_key(chain)]
+        ))
     for ligand in sorted(ligands, key=lambda l: l._internal_id):
-        for i, entity in enumerate(entities, start=1):
-            if isinstance(entity, Ligand) and entity._name == ligand._name:
-                lines.append("{} {}".format(ligand._internal_id, i))
-                break
-    water_chains = []
+        lines.append("{} {}".format(
+         ligand._internal_id, entity_ids[get_entity_key(ligand)]
+        ))
+    water_chains = set()
     for water in sorted(waters, key=lambda w: w._internal_id):
         if water.chain not in water_chains:
-            for i, entity in enumerate(entities, start=1):
-                if isinstance(entity, Ligand) and entity.is_water:
-                    lines.append("{} {}".format(water._internal_id, i))
-                    water_chains.append(water.chain)
-                    break
+            lines.append("{} {}".format(
+             water._internal_id, entity_ids[get_entity_key(water)]
+            ))
+            water_chains.add(water.chain)
+
+
+BOND_ORDERS = {"sing": 1, "doub": 2, "trip": 3, "quad": 4}
@@ -1,20 +1,30 @@
 """Contains functions for dealing with the .mmtf file format."""
 
 import msgpack
+import mmap
 import struct
-from collections import deque
+import numpy as np
+from collections import deque, Counter
 from datetime import datetime
 from .mmcif import get_structure_from_atom, create_entities, split_residue_id
-from .structures import Chain, Ligand
+from .mmcif import get_entity_key
+from .data import CODES, Model, model_is_selected, columns_to_models
 
 def mmtf_bytes_to_mmtf_dict(bytestring):
     """Takes the raw bytestring of a .mmtf file and turns it into a normal,
     fully decoded JSON dictionary.
 
+    The bytestring can be any bytes-like buffer, including a memory-mapped
+    file, which msgpack will read from directly. It can also be a binary
+    stream, such as a decompressing file object.
+
     :patam bytes bytestring: the .mmtf filestring.
     :rtype: ``dict``"""
 
-    raw = msgpack.unpackb(bytestring)
+    if isinstance(bytestring, (bytes, bytearray, memoryview, mmap.mmap)):
+        raw = msgpack.unpackb(bytestring)
+    else:
+        raw = msgpack.unpack(bytestring)
     return decode_dict(raw)
 
 
@@ -135,11 +145,97 @@ def recursive_decode(integers, bits=16):
     return new
 
 
-def mmtf_dict_to_data_dict(mmtf_dict):
+def encode_binary_field(values, codec, param=0):
+    """Takes a list of values and encodes them into a binary .mmtf field using
+    one of the codecs given in the .mmtf specification - the reverse of
+    :py:func:`.parse_binary_field`. The encoding is done with NumPy arrays.
+
+    The codecs supported are 2 (int8), 4 (int32), 5 (fixed length strings), 6
+    (run-length encoded characters), 8 (delta and run-length encoded integers),
+    9 (integer packed run-length encoded floats) and 10 (integer packed, delta
+    and recursively encoded floats).
+
+    :param list values: the values to encode.
+    :param int codec: the codec to use.
+    :param int param: the codec parameter - a divisor or string length.
+    :raises ValueError: if the codec is not supported.
+    :rtype: ``bytes``"""
+
+    header = struct.pack(">iii", codec, len(values), param)
+    if codec == 2:
+        body = np.asarray(values, dtype=">i1").tobytes()
+    elif codec == 4:
+        body = np.asarray(values, dtype=">i4").tobytes()
+    elif codec == 5:
+        body = b"".join(v.encode()[:param].ljust(param, b"\x00") for v in values)
+    elif codec == 6:
+        integers = [ord(v) if v else 0 for v in values]
+        body = run_length_encode(integers).astype(">i4").tobytes()
+    elif codec == 8:
+        body = run_length_encode(
+         delta_encode(values)
+        ).astype(">i4").tobytes()
+    elif codec == 9:
+        integers = np.round(np.asarray(values, dtype=float) * param)
+        body = run_length_encode(integers.astype(int)).astype(">i4").tobytes()
+    elif codec == 10:
+        integers = np.round(np.asarray(values, dtype=float) * param)
+        body = recursive_encode(
+         delta_encode(integers.astype(int))
+        ).astype(">i2").tobytes()
+    else: raise ValueError(".mmtf error: {} is invalid codec".format(codec))
+    return header + body
+
+
+def run_length_encode(integers):
+    """Compresses a sequence of integers into value, count pairs - the reverse
+    of :py:func:`.run_length_decode`.
+
+    :param list integers: the integers to encode.
+    :rtype: ``numpy.ndarray``"""
+
+    integers = np.asarray(integers, dtype=int)
+    if not len(integers): return integers
+    starts = np.flatnonzero(np.concatenate(
+     ([True], integers[1:] != integers[:-1])
+    ))
+    counts = np.diff(np.append(starts, len(integers)))
+    return np.column_stack((integers[starts], counts)).ravel()
+
+
+def delta_encode(integers):
+    """Turns a sequence of integers into the differences between successive
+    values - the reverse of :py:func:`.delta_decode`.
+
+    :param list integers: the integers to encode.
+    :rtype: ``numpy.ndarray``"""
+
+    return np.diff(np.asarray(integers, dtype=int), prepend=0)
+
+
+def recursive_encode(integers, bits=16):
+    """Splits a sequence of integers so that each one fits in a smaller integer
+    type, by representing large values as runs of the maximum (or minimum)
+    value followed by a remainder - the reverse of
+    :py:func:`.recursive_decode`.
+
+    :param list integers: the integers to encode.
+    :rtype: ``numpy.ndarray``"""
+
+    integers = np.asarray(integers, dtype=int)
+    limits = np.where(integers >= 0, 2 ** (bits - 1) - 1, -2 ** (bits - 1))
+    counts = integers // limits
+    encoded = np.repeat(limits, counts + 1)
+    encoded[np.cumsum(counts + 1) - 1] = integers - counts * limits
+    return encoded
+
+
+def mmtf_dict_to_data_dict(mmtf_dict, models=True):
     """Converts an .mmtf dictionary into an atomium data dictionary, with the
     same standard layout that the other file formats get converted into.
 
     :param dict mmtf_dict: the .mmtf dictionary.
+    :param bool models: if ``False``, the models list will be left empty.
     :rtype: ``dict``"""
 
     data_dict = {
@@ -180,10 +276,253 @@ def mmtf_dict_to_data_dict(mmtf_dict):
       "vector": t["matrix"][3:-4:4]} for t in a.get("transformList", [])
      ]
     } for a in mmtf_dict.get("bioAssemblyList", [])]
-    update_models_list(mmtf_dict, data_dict)
+    if models: update_models_list(mmtf_dict, data_dict)
     return data_dict
 
 
+def mmtf_dict_to_models(mmtf_dict, alt_loc="first", selection=None):
+    """Creates :py:class:`.Model` objects directly from an .mmtf dictionary,
+    without building the intermediate model dictionaries - the atoms of each
+    model are read into columns (see :py:func:`.iter_mmtf_columns`) and
+    passed to :py:func:`.columns_to_models`, so that models with the same
+    atoms share them as an :py:class:`.Ensemble`.
+
+    :param dict mmtf_dict: the .mmtf dictionary to read.
+    :param str alt_loc: how to handle alternate locations.
+    :param dict selection: the atoms to keep - see\
+    :py:func:`.make_selection`.
+    :rtype: ``list`` or ``Ensemble``"""
+
+    return columns_to_models(
+     iter_mmtf_columns(mmtf_dict, selection), alt_loc=alt_loc
+    )
+
+
+def iter_mmtf_models(mmtf_dict, alt_loc="first", selection=None):
+    """Creates :py:class:`.Model` objects directly from an .mmtf dictionary,
+    one at a time - see :py:func:`.iter_mmtf_columns`.
+
+    :param dict mmtf_dict: the .mmtf dictionary to read.
+    :param str alt_loc: how to handle alternate locations.
+    :param dict selection: the atoms to keep - see\
+    :py:func:`.make_selection`.
+    :rtype: ``Model``"""
+
+    for columns in iter_mmtf_columns(mmtf_dict, selection):
+        yield Model.from_arrays(**columns, alt_loc=alt_loc)
+
+
+def iter_mmtf_columns(mmtf_dict, selection=None):
+    """Reads the atoms of each model in an .mmtf dictionary into the columns
+    that :py:meth:`.Model.from_arrays` takes, one model at a time.
+
+    The decoded arrays are walked with cursors - one each for chains, groups
+    and atoms - so that every model, chain and group is read from its offsets
+    without slicing anything off the front of a list, and each group's atom
+    names, elements and charges come straight from its entry in the group
+    list, so the whole load is linear in the number of atoms.
+
+    Microheterogeneity is stored as several groups in a chain with the same
+    ID. Only the last of these is read, as the others would otherwise be
+    merged with it into one residue.
+
+    If a selection is given, models, chains and groups that it rejects are
+    skipped over by moving the cursors past them, and atom names are checked
+    once per group type.
+
+    :param dict mmtf_dict: the .mmtf dictionary to read.
+    :param dict selection: the atoms to keep - see\
+    :py:func:`.make_selection`.
+    :rtype: ``dict``"""
+
+    templates = [(
+     group["groupName"], group["atomNameList"],
+     [element.upper() for element in group["elementList"]],
+     group["formalChargeList"]
+    ) for group in mmtf_dict["groupList"]]
+    atom_names = selection and selection["atom_names"]
+    positions = [[i for i, name in enumerate(template[1])
+     if atom_names is None or name in atom_names] for template in templates]
+    sizes = [len(template[1]) for template in templates]
+    entities = get_chain_entities(mmtf_dict)
+    group_types, group_ids = mmtf_dict["groupTypeList"], mmtf_dict["groupIdList"]
+    inserts = mmtf_dict["insCodeList"]
+    sec_struct = mmtf_dict.get("secStructList") or [-1] * len(group_ids)
+    atom_columns = [np.array(mmtf_dict[field]) for field in (
+     "xCoordList", "yCoordList", "zCoordList", "atomIdList", "bFactorList",
+     "occupancyList"
+    )]
+    bonds = get_bonds(mmtf_dict, sizes)
+    chain_cursor, group_cursor, atom_cursor = 0, 0, 0
+    for number, chain_count in enumerate(mmtf_dict["chainsPerModel"], start=1):
+        keep_model = model_is_selected(selection, number)
+        model_start = atom_cursor
+        groups, indices, sequences, helices, strands = [], [], {}, [], []
+        for chain_index in range(chain_cursor, chain_cursor + chain_count):
+            chain_id = mmtf_dict["chainNameList"][chain_index]
+            entity = entities.get(chain_index, {})
+            kind = entity.get("type", "non-polymer")
+            end = group_cursor + mmtf_dict["groupsPerChain"][chain_index]
+            if not keep_model or (selection and (
+             kind in selection["skipped_kinds"] or (selection["chains"]
+              is not None and chain_id not in selection["chains"])
+            )):
+                atom_cursor += sum(sizes[t] for t in group_types[group_cursor:end])
+                group_cursor = end
+                continue
+            internal_id = mmtf_dict["chainIdList"][chain_index]
+            full_name = None if kind == "polymer" else entity.get("description")
+            res_ids = ["{}.{}{}".format(chain_id, group_ids[g], inserts[g])
+             for g in range(group_cursor, end)]
+            last_groups = {res_id: g for g, res_id in enumerate(res_ids)}
+            for g, (res_id, type_) in enumerate(
+             zip(res_ids, group_types[group_cursor:end])
+            ):
+                if last_groups[res_id] == g:
+                    groups.append(
+                     (res_id, chain_id, internal_id, kind, full_name, type_)
+                    )
+                    indices += [atom_cursor + i for i in positions[type_]]
+                atom_cursor += sizes[type_]
+            if kind == "polymer":
+                sequences[chain_id] = entity.get("sequence", "")
+                segments = get_secondary_structure(
+                 res_ids, sec_struct[group_cursor:end]
+                )
+                helices += segments["helices"]
+                strands += segments["strands"]
+            group_cursor = end
+        chain_cursor += chain_count
+        if not keep_model: continue
+        columns = {key: [value for group in groups
+         for value in [group[index]] * len(positions[group[5]])]
+         for index, key in enumerate([
+          "res_ids", "chain_ids", "internal_ids", "kinds", "full_names"
+         ])}
+        columns["res_names"] = [templates[group[5]][0] for group in groups
+         for _ in positions[group[5]]]
+        for index, key in enumerate(["names", "elements", "charges"], start=1):
+            columns[key] = [templates[group[5]][index][i] for group in groups
+             for i in positions[group[5]]]
+        indices = np.array(indices, dtype="i8")
+        columns["coords"] = np.column_stack([
+         column[indices] for column in atom_columns[:3]
+        ])
+        for key, column in zip(
+         ("atom_ids", "bvalues", "occupancies"), atom_columns[3:]
+        ):
+            columns[key] = column[indices].tolist()
+        alt_locs = mmtf_dict["altLocList"]
+        columns["alt_locs"] = [alt_locs[i] or None for i in indices.tolist()]
+        if bonds is not None:
+            columns["bonds"] = get_model_bonds(
+             bonds, indices, model_start, atom_cursor
+            )
+        yield dict(
+         **columns, sequences=sequences, helices=helices, strands=strands
+        )
+
+
+def get_bonds(mmtf_dict, sizes):
+    """Gathers every bond in an .mmtf dictionary, as an array with the
+    positions in the file of the two atoms of each bond and its order, sorted
+    by the lower position. The bonds within groups are stored once per group
+    type, as positions within the group, so the bonds of every group of a
+    type are made at once by adding the positions of their first atoms. If the
+    file has no bonds, ``None`` is returned.
+
+    :param dict mmtf_dict: the .mmtf dictionary to read.
+    :param list sizes: the number of atoms in each group type.
+    :rtype: ``numpy.ndarray``"""
+
+    group_types = np.array(mmtf_dict["groupTypeList"], dtype="i8")
+    sizes = np.array(sizes, dtype="i8")[group_types]
+    starts = np.cumsum(sizes) - sizes
+    order = np.argsort(group_types, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(
+     np.bincount(group_types, minlength=len(mmtf_dict["groupList"]))
+    )])
+    bonds = [get_bond_list(mmtf_dict)]
+    for type_, group in enumerate(mmtf_dict["groupList"]):
+        template = get_bond_list(group)
+        if not len(template) or bounds[type_] == bounds[type_ + 1]: continue
+        offsets = starts[order[bounds[type_]:bounds[type_ + 1]]]
+        template = np.tile(template, (len(offsets), 1))
+        template[:, :2] += np.repeat(offsets, len(template) // len(offsets))[:, None]
+        bonds.append(template)
+    bonds = np.concatenate(bonds)
+    if not len(bonds): return None
+    bonds[:, :2].sort(axis=1)
+    return bonds[np.argsort(bonds[:, 0], kind="stable")]
+
+
+def get_bond_list(d):
+    """Reads the bond atom list and bond order list of an .mmtf dictionary or
+    group into an array with the two atoms of each bond and its order. Bonds
+    with no order are taken to be single bonds.
+
+    :param dict d: the dictionary or group to read.
+    :rtype: ``numpy.ndarray``"""
+
+    pairs = np.array(d.get("bondAtomList") or [], dtype="i8").reshape(-1, 2)
+    orders = d.get("bondOrderList")
+    orders = np.ones(len(pairs), dtype="i8") if orders is None or (
+     len(orders) != len(pairs)
+    ) else np.array(orders, dtype="i8")
+    return np.column_stack([pairs, orders])
+
+
+def get_model_bonds(bonds, indices, start, end):
+    """Picks out the bonds of one model from the bonds of an .mmtf file, and
+    works out which rows of the model's columns they join. Bonds to atoms
+    which weren't read into the columns are left out.
+
+    :param numpy.ndarray bonds: the file's bonds, from :py:func:`.get_bonds`.
+    :param numpy.ndarray indices: the position in the file of each row.
+    :param int start: the position of the model's first atom.
+    :param int end: the position after the model's last atom.
+    :rtype: ``numpy.ndarray``"""
+
+    bonds = bonds[np.searchsorted(bonds[:, 0], start):np.searchsorted(
+     bonds[:, 0], end
+    )]
+    if not len(indices): return np.zeros((0, 3), dtype="i8")
+    rows = np.minimum(np.searchsorted(indices, bonds[:, :2]), len(indices) - 1)
+    kept = (indices[rows] == bonds[:, :2]).all(axis=1)
+    return np.column_stack([rows[kept], bonds[kept, 2]])
+
+
+def get_chain_entities(mmtf_dict):
+    """Maps the index of every chain in an .mmtf dictionary to the entity it
+    belongs to.
+
+    :param dict mmtf_dict: the .mmtf dictionary to read.
+    :rtype: ``dict``"""
+
+    return {index: entity for entity in reversed(mmtf_dict["entityList"])
+     for index in entity["chainIndexList"]}
+
+
+def get_secondary_structure(res_ids, codes):
+    """Finds the helices and strands in a chain from the secondary structure
+    code of each of its residues. Each unbroken run of helix or strand codes
+    becomes one segment, given as its first and last residue IDs.
+
+    :param list res_ids: the IDs of the chain's residues.
+    :param list codes: the secondary structure code of each residue.
+    :rtype: ``dict``"""
+
+    segments, current = {"helices": [], "strands": []}, None
+    for res_id, code in zip(res_ids, codes):
+        kind = SECONDARY_STRUCTURE[code] if 0 <= code < 8 else None
+        if kind and kind == current:
+            segments[kind][-1][1] = res_id
+        elif kind:
+            segments[kind].append([res_id, res_id])
+        current = kind
+    return segments
+
+
 def update_models_list(mmtf_dict, data_dict):
     """Takes a data dictionary and updates its models list with
     information from a .mmtf dictionary.
@@ -191,14 +530,14 @@ def update_models_list(mmtf_dict, data_dict):
     :param dict mmtf_dict: the .mmtf dictionary to read.
     :param dict data_dict: the data dictionary to update."""
 
-    atoms = get_atoms_list(mmtf_dict)
+    atoms = deque(get_atoms_list(mmtf_dict))
     group_definitions = get_group_definitions_list(mmtf_dict)
     groups = get_groups_list(mmtf_dict, group_definitions)
-    chains = get_chains_list(mmtf_dict, groups)
+    chains = deque(get_chains_list(mmtf_dict, groups))
     for model_num in range(mmtf_dict["numModels"]):
         model = {"polymer": {}, "non-polymer": {}, "water": {}}
         for chain_num in range(mmtf_dict["chainsPerModel"][model_num]):
-            chain = chains[chain_num]
+            chain = chains.popleft()
             add_chain_to_model(chain, model, atoms)
         data_dict["models"].append(model)
 
@@ -248,11 +587,9 @@ def get_groups_list(mmtf_dict, group_definitions):
     :param dict mmtf_dict: the .mmtf dictionary to read.
     :rtype: ``list``"""
 
-    sec_struct = [
-     "helices", None, "helices", "strands", "helices", "strands", None, None
-    ]
     return [{
-     "number": id, "insert": insert, "secondary_structure": sec_struct[ss],
+     "number": id, "insert": insert,
+     "secondary_structure": SECONDARY_STRUCTURE[ss] if ss >= 0 else None,
      **group_definitions[type_]
     } for id, insert, ss, type_, in zip(
      mmtf_dict["groupIdList"], mmtf_dict["insCodeList"],
@@ -268,17 +605,19 @@ def get_chains_list(mmtf_dict, groups):
     :param dict mmtf_dict: the .mmtf dictionary to read.
     :rtype: ``list``"""
 
-    chains = []
+    chains, cursor, entities = [], 0, get_chain_entities(mmtf_dict)
     for i_id, id, group_num in zip(mmtf_dict["chainIdList"],
      mmtf_dict["chainNameList"], mmtf_dict["groupsPerChain"]):
-        chain = {"id": id, "internal_id": i_id, "groups": groups[:group_num]}
-        del groups[:group_num]
-        for entity in mmtf_dict["entityList"]:
-            if len(chains) in entity["chainIndexList"]:
-                chain["type"] = entity["type"]
-                chain["sequence"] = entity.get("sequence", "")
-                chain["full_name"] = entity.get("description", None)
-                break
+        chain = {
+         "id": id, "internal_id": i_id,
+         "groups": groups[cursor:cursor + group_num]
+        }
+        cursor += group_num
+        entity = entities.get(len(chains))
+        if entity:
+            chain["type"] = entity["type"]
+            chain["sequence"] = entity.get("sequence", "")
+            chain["full_name"] = entity.get("description", None)
         chains.append(chain)
     return chains
 
@@ -289,7 +628,7 @@ def add_chain_to_model(chain, model, atoms):
 
     :param dict chain: the 'chain' to add.
     :param dict model: the model to add it to.
-    :param list atoms: the atoms list to work through."""
+    :param deque atoms: the atoms to work through, from the left."""
 
     if chain["type"] == "polymer":
         polymer = {
@@ -311,13 +650,12 @@ def add_het_to_dict(group, chain, atoms, d, number=None):
 
     :param dict group: the group template the het should be based on.
     :param dict chain: the chain (in the real sense) the het is associated with.
-    :param list atoms: the atoms list to work through.
+    :param deque atoms: the atoms to work through, from the left.
     :param dict d: the dictionary to add to.
     :param int number: if given, the residue number to use."""
 
     het_id = f"{chain['id']}.{group['number']}{group['insert']}"
-    het_atoms = atoms[:len(group["atoms"])]
-    del atoms[:len(het_atoms)]
+    het_atoms = [atoms.popleft() for _ in group["atoms"]]
     het_atoms = {a["id"]: {
      "anisotropy": [0] * 6, **a, **g_a
     } for a, g_a in zip(het_atoms, group["atoms"])}
@@ -344,14 +682,13 @@ def add_ss_to_chain(chain):
     in_ss = {"helices": False, "strands": False}
     for res_id, res in chain["residues"].items():
         ss = res["secondary_structure"]
+        for key in in_ss:
+            if key != ss: in_ss[key] = False
         if ss:
             if not in_ss[ss]:
                 chain[ss].append([])
             in_ss[ss] = True
             chain[ss][-1].append(res_id)
-        else:
-            if in_ss["helices"]: in_ss["helices"] = False
-            if in_ss["strands"]: in_ss["strands"] = False
         del res["secondary_structure"]
 
 
@@ -384,27 +721,144 @@ def mmtf_to_data_transfer(mmtf_dict, data_dict, d_cat, d_key, m_key,
 def structure_to_mmtf_string(structure):
     """Converts a :py:class:`.AtomStructure` to a .mmtf filestring.
 
-    No compression is currently performed.
+    :param AtomStructure structure: the structure to convert.
+    :rtype: ``bytes``"""
+
+    return b"".join(structure_to_mmtf_chunks(structure))
+
+
+def structure_to_mmtf_chunks(structure):
+    """A generator which converts a :py:class:`.AtomStructure` to .mmtf bytes,
+    yielding the packed map one field at a time so that they can be written out
+    without the whole filestring ever being built.
 
     :param AtomStructure structure: the structure to convert.
     :rtype: ``bytes``"""
 
-    chains, ligands, waters, properties, entities = get_structures(structure)
+    yield from models_to_mmtf_chunks([structure])
+
+
+def models_to_mmtf_chunks(models):
+    """A generator which converts a series of models to .mmtf bytes, yielding
+    the packed map one field at a time.
+
+    The per-atom and per-group lists are compressed with the binary codecs the
+    .mmtf specification recommends for them. Each of these is one field
+    covering every model, so the models' lists are gathered before anything is
+    packed - but group definitions are shared between models, and chains are
+    added to the entities of the first model.
+
+    Any model after the first can be given as an array of coordinates instead
+    of a structure - one row for each of the first model's atoms, in order of
+    their IDs. The first model's lists are then used again with just the
+    coordinates and atom IDs changed, so that they are only made once. The atom
+    IDs carry on from the highest ID of the previous model.
+
+    :param models: the structures and coordinate arrays to convert.
+    :raises ValueError: if an array is not the same size as the first model.
+    :rtype: ``bytes``"""
+
+    lists = {key: [] for key in (
+     "chainIdList", "chainNameList", "groupsPerChain", "groupIdList",
+     "groupTypeList", "insCodeList", "coords", "altLocList", "bFactorList",
+     "atomIdList", "occupancyList", "chainsPerModel"
+    )}
+    template, entity_list, groups, lookup = None, {}, [], {}
+    for number, model in enumerate(models):
+        if template is None or hasattr(model, "atoms"):
+            model_lists = get_model_lists(model, groups, lookup)
+            if template is None:
+                template = model_lists
+                step = max(template["atomIdList"] or [0])
+        else:
+            model_lists = {**template, "coords": check_coordinates(
+             model, len(template["atomIdList"])
+            ), "atomIdList": [id + step * number for id in template[
+             "atomIdList"
+            ]]}
+        for key, entity in model_lists["entities"].items():
+            entity_list.setdefault(key, {**entity, "chainIndexList": []})
+            entity_list[key]["chainIndexList"] += [
+             index + len(lists["chainIdList"])
+             for index in entity["chainIndexList"]
+            ]
+        lists["chainsPerModel"].append(len(model_lists["chainIdList"]))
+        for key, values in lists.items():
+            if key != "chainsPerModel": values += model_lists[key]
+    x, y, z = zip(*lists["coords"]) if lists["coords"] else ([], [], [])
+    d = {
+     "mmtfVersion": "1.0.0", "mmtfProducer": "atomium",
+     "numBonds": 0, "numAtoms": len(lists["atomIdList"]),
+     "numGroups": len(lists["groupTypeList"]),
+     "numModels": len(lists["chainsPerModel"]),
+     "numChains": len(lists["chainIdList"]),
+     "chainsPerModel": lists["chainsPerModel"],
+     "xCoordList": encode_binary_field(x, 10, 1000),
+     "yCoordList": encode_binary_field(y, 10, 1000),
+     "zCoordList": encode_binary_field(z, 10, 1000),
+     "altLocList": encode_binary_field(lists["altLocList"], 6),
+     "bFactorList": encode_binary_field(lists["bFactorList"], 10, 100),
+     "atomIdList": encode_binary_field(lists["atomIdList"], 8),
+     "occupancyList": encode_binary_field(lists["occupancyList"], 9, 100),
+     "entityList": list(entity_list.values()),
+     "chainIdList": encode_binary_field(lists["chainIdList"], 5, 4),
+     "chainNameList": encode_binary_field(lists["chainNameList"], 5, 4),
+     "insCodeList": encode_binary_field(lists["insCodeList"], 6),
+     "groupsPerChain": lists["groupsPerChain"], "groupList": groups,
+     "groupIdList": encode_binary_field(lists["groupIdList"], 8),
+     "groupTypeList": encode_binary_field(lists["groupTypeList"], 4)
+    }
+    packer = msgpack.Packer(use_bin_type=True)
+    yield packer.pack_map_header(len(d))
+    for key, value in d.items():
+        yield packer.pack(key)
+        yield packer.pack(value)
+
+
+def get_model_lists(model, groups, lookup):
+    """Makes the .mmtf lists that describe one model - its chains, groups and
+    atoms, and its entities (keyed by entity key, with chain indices counted
+    from the model's first chain).
+
+    :param AtomStructure model: the structure to describe.
+    :param list groups: the group definitions so far, to be added to.
+    :param dict lookup: the mapping of group keys to group indices.
+    :rtype: ``dict``"""
+
+    chains, ligands, waters, properties, entities = get_structures(model)
     entity_list = get_entity_list(entities, chains, ligands, waters)
     chain_ids, chain_names = get_chain_ids_and_names(chains, ligands, waters)
-    groups_per_chain = get_groups_per_chain(chains, ligands, waters)
-    group_types, group_ids, groups, ins = get_groups(chains, ligands, waters)
-    x, y, z, alt, bfactor, ids, occupancy = zip(*properties)
-    chain_count = len(chains) + len(ligands) + len(set(l.chain for l in waters))
-    d = {
-     "numModels": 1, "numChains": chain_count, "chainsPerModel": [chain_count],
-     "xCoordList": x, "yCoordList": y, "zCoordList": z, "altLocList": alt,
-     "bFactorList": bfactor, "atomIdList": ids, "occupancyList": occupancy,
-     "entityList": entity_list, "chainIdList": chain_ids, "insCodeList": ins,
-     "chainNameList": chain_names, "groupsPerChain": groups_per_chain,
-     "groupList": groups, "groupIdList": group_ids, "groupTypeList": group_types
+    group_types, group_ids, _, ins = get_groups(
+     chains, ligands, waters, groups, lookup
+    )
+    x, y, z, alt, bfactor, ids, occupancy = map(list, zip(*properties)) if (
+     properties
+    ) else ([], [], [], [], [], [], [])
+    return {
+     "entities": dict(zip(entities, entity_list)), "chainIdList": chain_ids,
+     "chainNameList": chain_names,
+     "groupsPerChain": get_groups_per_chain(chains, ligands, waters),
+     "groupIdList": group_ids, "groupTypeList": group_types,
+     "insCodeList": ins, "coords": list(zip(x, y, z)), "altLocList": alt,
+     "bFactorList": bfactor, "atomIdList": ids, "occupancyList": occupancy
     }
-    return msgpack.packb(d)
+
+
+def check_coordinates(coordinates, count):
+    """Turns an array of coordinates into a list of rows, checking that there
+    is one row for each of some number of atoms.
+
+    :param coordinates: the coordinates to check.
+    :param int count: the number of atoms.
+    :raises ValueError: if there are the wrong number of coordinates.
+    :rtype: ``list``"""
+
+    coordinates = np.asarray(coordinates, dtype="f8")
+    if coordinates.shape != (count, 3):
+        raise ValueError("Expected coordinates of shape ({}, 3), not {}".format(
+         count, coordinates.shape
+        ))
+    return coordinates.tolist()
 
 
 def get_structures(structure):
@@ -419,7 +873,7 @@ def get_structures(structure):
     for atom in sorted(structure.atoms(), key=lambda a: a.id):
         get_structure_from_atom(atom, chains, ligands, waters)
         atom_properties.append(list(atom.location) + [
-         "", atom.bvalue, atom.id, 1
+         "", atom.bvalue or 0, atom.id, atom.occupancy
         ])
     chains = sorted(chains, key=lambda c: c._internal_id)
     ligands = sorted(ligands, key=lambda l: l._internal_id)
@@ -429,30 +883,29 @@ def get_structures(structure):
 
 
 def get_entity_list(entities, chains, ligands, waters):
-    """Takes a list of entity objects, as well as the objects they represent,
-    and turns them into a list of .mmtf dictionaries.
+    """Takes an entity registry, as well as the objects they represent, and
+    turns them into a list of .mmtf dictionaries. Each chain's entity is found
+    by its entity key, so the chains only need to be looked at once.
 
-    :param list entities: the entities to pack.
+    :param dict entities: the entities to pack.
     :param list chains: the chains to pack.
     :param list ligands: the ligands to pack.
     :param list waters: the waters to pack.
     :rtype: ``list``"""
 
+    indices = {key: [] for key in entities}
+    for i, molecule in enumerate(chains + ligands):
+        indices[get_entity_key(molecule)].append(i)
+    if waters:
+        water_chains = set(w.chain for w in waters)
+        indices[get_entity_key(waters[0])] += [
+         i + len(chains) + len(ligands) for i in range(len(water_chains))
+        ]
     entity_list = []
-    for e in entities:
-        if isinstance(e, Chain):
-            entity_list.append({"type": "polymer", "chainIndexList": [
-             i for i, c in enumerate(chains) if c.sequence == e.sequence
-            ], "sequence": e.sequence})
-        elif isinstance(e, Ligand) and not e.is_water:
-            entity_list.append({"type": "non-polymer", "chainIndexList": [
-             i + len(chains) for i, l in enumerate(ligands) if l._name == e._name
-            ]})
-        else:
-            water_chains = set(w.chain for w in waters)
-            entity_list.append({"type": "water", "chainIndexList": [
-             i + len(chains) + len(ligands) for i in range(len(water_chains))
-            ]})
+    for key, e in entities.items():
+        entity = {"type": key[0], "chainIndexList": indices[key]}
+        if key[0] == "polymer": entity["sequence"] = e.sequence
+        entity_list.append(entity)
     return entity_list
 
 
@@ -472,8 +925,10 @@ def get_chain_ids_and_names(chains, ligands, waters):
     for ligand in ligands:
         chain_ids.append(ligand._internal_id)
         chain_names.append(ligand.chain.id)
+    seen = set(chain_ids)
     for water in waters:
-        if water._internal_id not in chain_ids:
+        if water._internal_id not in seen:
+            seen.add(water._internal_id)
             chain_ids.append(water._internal_id)
             chain_names.append(water.chain.id)
     return (chain_ids, chain_names)
@@ -493,53 +948,88 @@ def get_groups_per_chain(chains, ligands, waters):
         groups_per_chain.append(len(chain.residues()))
     for ligand in ligands:
         groups_per_chain.append(1)
-    water_chains = sorted(set(w._internal_id for w in waters))
-    for wc in water_chains:
-        groups_per_chain.append(len([w for w in waters if w._internal_id == wc]))
+    water_counts = Counter(w._internal_id for w in waters)
+    for wc in sorted(water_counts):
+        groups_per_chain.append(water_counts[wc])
     return groups_per_chain
 
 
-def get_groups(chains, ligands, waters):
+def get_groups(chains, ligands, waters, groups=None, lookup=None):
     """Creates the relevant lists of group information from chains, ligands and
     waters.
 
     :param list chains: the chains to pack.
     :param list ligands: the ligands to pack.
     :param list waters: the waters to pack.
+    :param list groups: if given, group definitions already made, which will\
+    be added to.
+    :param dict lookup: the mapping of those groups' keys to their indices.
     :rtype: ``tuple``"""
 
-    group_types, group_ids, groups, inserts = [], [], [], []
+    group_types, group_ids, inserts = [], [], []
+    groups = [] if groups is None else groups
+    lookup = {} if lookup is None else lookup
     for chain in chains:
         for res in chain.residues():
-            add_het_to_groups(res, group_types, group_ids, groups, inserts)
+            add_het_to_groups(
+             res, group_types, group_ids, groups, inserts, lookup
+            )
     for ligand in ligands + waters:
-        add_het_to_groups(ligand, group_types, group_ids, groups, inserts)
+        add_het_to_groups(
+         ligand, group_types, group_ids, groups, inserts, lookup
+        )
     return (group_types, group_ids, groups, inserts)
 
 
-def add_het_to_groups(het, group_type_list, group_id_list, group_list, ins_list):
+def add_het_to_groups(het, group_type_list, group_id_list, group_list, ins_list,
+                      lookup=None):
     """Updates group lists with information from a single :py:class:`.Het`.
 
+    Groups which have already been seen are found using a lookup dictionary of
+    group keys to their index in the group list, so that each het only needs a
+    single hash lookup rather than a comparison with every group so far.
+
     :param Het het: the Het to pack.
     :param list group_type_list: the list of group types.
     :param list group_id_list: the list of group IDs.
     :param list group_list: the list of groups.
     :param list ins_list: the list of insertion codes.
+    :param dict lookup: the mapping of group keys to group indices.
     :rtype: ``tuple``"""
 
     atoms = sorted(het.atoms(), key=lambda a: a.id)
     group = {
      "groupName": het._name, "atomNameList": [a._name for a in atoms],
      "elementList": [a.element for a in atoms],
-     "formalChargeList": [a.charge for a in atoms]
+     "formalChargeList": [a.charge for a in atoms],
+     "bondAtomList": [], "bondOrderList": [],
+     "singleLetterCode": CODES.get(het._name, "?"), "chemCompType": ""
     }
-    for i, g in enumerate(group_list):
-        if g == group:
-            group_type_list.append(i)
-            break
-    else:
+    if lookup is None:
+        lookup = {get_group_key(g): i for i, g in enumerate(group_list)}
+    key = get_group_key(group)
+    if key not in lookup:
+        lookup[key] = len(group_list)
         group_list.append(group)
-        group_type_list.append(len(group_list) - 1)
+    group_type_list.append(lookup[key])
     id_, insert = split_residue_id(atoms[0])
-    group_id_list.append(id_)
+    group_id_list.append(int(id_))
     ins_list.append(insert if insert != "?" else "")
+
+
+def get_group_key(group):
+    """Creates a hashable key for a .mmtf group dictionary, which two groups
+    will share only if they are identical.
+
+    :param dict group: the group to make a key for.
+    :rtype: ``tuple``"""
+
+    return (group["groupName"], group["chemCompType"], tuple(
+     tuple(group[key]) for key in ("atomNameList", "elementList",
+      "formalChargeList", "bondAtomList", "bondOrderList")
+    ))
+
+
+SECONDARY_STRUCTURE = [
+ "helices", None, "helices", "strands", "helices", "strands", None, None
+]
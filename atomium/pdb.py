@@ -2,12 +2,16 @@
 
 from datetime import datetime
 import re
-from itertools import groupby, chain
+from itertools import groupby, chain, compress
 import valerius
+import numpy as np
 from math import ceil
-from .data import CODES
-from .structures import Residue, Ligand
-from .mmcif import add_secondary_structure_to_polymers
+from .data import CODES, get_selection_mask, model_is_selected
+from .data import columns_to_models, match_bond_keys
+from .structures import Residue, Ligand, Model
+from .mmcif import add_secondary_structure_to_polymers, iter_lines
+from .mmcif import get_bonds
+from .components import lookup_component, get_component_templates
 
 def pdb_string_to_pdb_dict(filestring):
     """Takes a .pdb filestring and turns into a ``dict`` which represents its
@@ -20,32 +24,65 @@ def pdb_string_to_pdb_dict(filestring):
     REMARK numbers as keys, and the structure records themselves which are just
     arranged into lists - one for each model.
 
-    :param str filestring: the .pdb filestring to process.
+    :param str filestring: the .pdb filestring (or bytes buffer) to process.
     :rtype: ``dict``"""
 
     pdb_dict = {}
-    lines = list(filter(lambda l: bool(l.strip()), filestring.split("\n")))
-    lines = [[line[:6].rstrip(), line.rstrip()] for line in lines]
-    model_recs = ("ATOM", "HETATM", "ANISOU", "MODEL", "TER", "ENDMDL")
-    model = []
-    in_model = False
-    for head, line in lines:
-        if head == "REMARK":
-            if "REMARK" not in pdb_dict: pdb_dict["REMARK"] = {}
-            number = line.lstrip().split()[1]
-            update_dict(pdb_dict["REMARK"], number, line)
-        elif head in model_recs:
+    lines = filter(lambda l: bool(l.strip()), iter_lines(filestring))
+    for line in lines:
+        head, line = line[:6].rstrip(), line.rstrip()
+        if head in MODEL_RECORDS:
             if "MODEL" not in pdb_dict: pdb_dict["MODEL"] = [[]]
             if head == "ENDMDL":
                 pdb_dict["MODEL"].append([])
             elif head != "MODEL":
                 pdb_dict["MODEL"][-1].append(line)
         else:
-            update_dict(pdb_dict, head, line)
+            add_record(pdb_dict, head, line)
     if "MODEL" in pdb_dict and not pdb_dict["MODEL"][-1]: pdb_dict["MODEL"].pop()
     return pdb_dict
 
 
+def iter_pdb_dicts(filestring):
+    """Reads a .pdb filestring one model at a time. The records before the
+    models are read into a ``dict`` in the same way as
+    :py:func:`.pdb_string_to_pdb_dict` does, and then as each model is
+    finished, a copy of that ``dict`` is yielded with that model's records as
+    its only model. Records after the models are not included.
+
+    :param str filestring: the .pdb filestring (or bytes buffer) to process.
+    :rtype: ``dict``"""
+
+    pdb_dict, model = {}, []
+    for line in filter(lambda l: bool(l.strip()), iter_lines(filestring)):
+        head, line = line[:6].rstrip(), line.rstrip()
+        if head in MODEL_RECORDS:
+            if head == "ENDMDL":
+                if model: yield {**pdb_dict, "MODEL": [model]}
+                model = []
+            elif head != "MODEL":
+                model.append(line)
+        else:
+            add_record(pdb_dict, head, line)
+    if model: yield {**pdb_dict, "MODEL": [model]}
+
+
+def add_record(pdb_dict, head, line):
+    """Adds a record that isn't part of a model to a .pdb dictionary. REMARK
+    records go into a sub-dictionary by their number.
+
+    :param dict pdb_dict: the dictionary to update.
+    :param str head: the record name.
+    :param str line: the record itself."""
+
+    if head == "REMARK":
+        if "REMARK" not in pdb_dict: pdb_dict["REMARK"] = {}
+        number = line.lstrip().split()[1]
+        update_dict(pdb_dict["REMARK"], number, line)
+    else:
+        update_dict(pdb_dict, head, line)
+
+
 def update_dict(d, key, value):
     """Takes a dictionary where the values are lists, and adds a value to one of
     the lists at the specific key. If the list doesn't exist, it creates it
@@ -62,11 +99,12 @@ def update_dict(d, key, value):
     except: d[key] = [value]
 
 
-def pdb_dict_to_data_dict(pdb_dict):
+def pdb_dict_to_data_dict(pdb_dict, models=True):
     """Converts an .pdb dictionary into an atomium data dictionary, with the
     same standard layout that the other file formats get converted into.
 
     :param dict pdb_dict: the .pdb dictionary.
+    :param bool models: if ``False``, the models list will be left empty.
     :rtype: ``dict``"""
 
     data_dict = {
@@ -83,10 +121,72 @@ def pdb_dict_to_data_dict(pdb_dict):
     update_experiment_dict(pdb_dict, data_dict)
     update_quality_dict(pdb_dict, data_dict)
     update_geometry_dict(pdb_dict, data_dict)
-    update_models_list(pdb_dict, data_dict)
+    if models: update_models_list(pdb_dict, data_dict)
     return data_dict
 
 
+def pdb_dict_to_models(pdb_dict, alt_loc="first", selection=None):
+    """Creates :py:class:`.Model` objects directly from a .pdb dictionary,
+    without building the intermediate model dictionaries - the atoms of each
+    model are read into columns (see :py:func:`.iter_pdb_columns`) and passed
+    to :py:func:`.columns_to_models`, so that models with the same atoms
+    share them as an :py:class:`.Ensemble`.
+
+    :param dict pdb_dict: the .pdb dictionary to read.
+    :param str alt_loc: how to handle alternate locations.
+    :param dict selection: the atoms to keep - see\
+    :py:func:`.make_selection`.
+    :rtype: ``list`` or ``Ensemble``"""
+
+    return columns_to_models(
+     iter_pdb_columns(pdb_dict, selection), alt_loc=alt_loc
+    )
+
+
+def iter_pdb_columns(pdb_dict, selection=None):
+    """Reads the atoms of each model in a .pdb dictionary into the columns
+    that :py:meth:`.Model.from_arrays` takes, one model at a time.
+
+    If a selection is given, records that it rejects are dropped before any
+    of their values are read.
+
+    :param dict pdb_dict: the .pdb dictionary to read.
+    :param dict selection: the atoms to keep - see\
+    :py:func:`.make_selection`.
+    :rtype: ``dict``"""
+
+    sequences = make_sequences(pdb_dict)
+    secondary_structure = make_secondary_structure(pdb_dict)
+    full_names = get_full_names(pdb_dict)
+    connections = make_connections(pdb_dict)
+    for number, model_lines in enumerate(pdb_dict["MODEL"], start=1):
+        if not model_is_selected(selection, number): continue
+        aniso = make_aniso(model_lines)
+        last_ter = get_last_ter_line(model_lines)
+        lines = [line for line in model_lines if line[:6] in ["ATOM  ", "HETATM"]]
+        polymer_count = len([line for line in model_lines[:last_ter]
+         if line[:6] in ["ATOM  ", "HETATM"]])
+        kinds = ["polymer"] * polymer_count + [
+         "water" if line[17:20].strip() in ["HOH", "DOD"] else "non-polymer"
+         for line in lines[polymer_count:]
+        ]
+        if selection:
+            mask = get_selection_mask(
+             selection, [line[21] for line in lines],
+             [line[12:16].strip() or None for line in lines], kinds
+            )
+            lines, kinds = list(compress(lines, mask)), list(compress(kinds, mask))
+        columns = atom_lines_to_columns(lines, aniso, full_names)
+        columns["kinds"] = kinds
+        bonds = []
+        templates = get_component_templates(set(columns["res_names"]))
+        if templates: bonds.append(get_bonds(columns, kinds, [], templates))
+        if connections is not None:
+            bonds.append(connections_to_bonds(connections, columns["atom_ids"]))
+        if bonds: columns["bonds"] = np.concatenate(bonds)
+        yield dict(**columns, **secondary_structure, sequences=sequences)
+
+
 def update_description_dict(pdb_dict, data_dict):
     """Creates the description component of a standard atomium data dictionary
     from a .pdb dictionary.
@@ -382,7 +482,8 @@ def make_sequences(pdb_dict):
             if chain not in seq:
                 seq[chain] = []
             seq[chain] += residues
-    return {k: "".join([CODES.get(r, "X") for r in v]) for k, v in seq.items()}
+    return {k: "".join([CODES.get(r) or lookup_component(r, "code") or "X"
+     for r in v]) for k, v in seq.items()}
 
 
 def make_secondary_structure(pdb_dict):
@@ -406,6 +507,49 @@ def make_secondary_structure(pdb_dict):
     return {"helices": helices, "strands": strands}
 
 
+def make_connections(pdb_dict):
+    """Reads the bonds in the CONECT records of a .pdb dictionary, as an array
+    with the IDs of the two atoms of each bond and its order. Many programs
+    write a double or triple bond by listing the same atom two or three times
+    in another atom's records, so the number of times one atom lists another
+    is taken as the order. If there are no CONECT records, ``None`` is
+    returned.
+
+    :param dict pdb_dict: the .pdb dictionary to read.
+    :rtype: ``numpy.ndarray``"""
+
+    if "CONECT" not in pdb_dict: return None
+    pairs = [(int(line[6:11]), int(line[start:start + 5]))
+     for line in pdb_dict["CONECT"] if line[6:11].strip().isdigit()
+      for start in range(11, 31, 5) if line[start:start + 5].strip().isdigit()]
+    if not pairs: return np.zeros((0, 3), dtype="i8")
+    listed, counts = np.unique(
+     np.array(pairs, dtype="i8"), axis=0, return_counts=True
+    )
+    bonds, inverse = np.unique(
+     np.sort(listed, axis=1), axis=0, return_inverse=True
+    )
+    orders = np.zeros(len(bonds), dtype="i8")
+    np.maximum.at(orders, inverse.reshape(-1), counts)
+    return np.column_stack([bonds, orders])
+
+
+def connections_to_bonds(connections, atom_ids):
+    """Works out which rows of a model's columns the bonds from a .pdb file's
+    CONECT records join, from the atom ID of each row. Bonds to atoms which
+    aren't in the model are left out.
+
+    :param numpy.ndarray connections: the bonds from\
+    :py:func:`.make_connections`.
+    :param list atom_ids: the ID of each row.
+    :rtype: ``numpy.ndarray``"""
+
+    pairs, bonds = match_bond_keys(
+     np.array(atom_ids, dtype="i8"), connections[:, 0], connections[:, 1]
+    )
+    return np.column_stack([pairs, connections[bonds, 2]])
+
+
 def get_full_names(pdb_dict):
     """Creates a mapping of het names to full English names.
 
@@ -511,6 +655,50 @@ def add_atom_to_non_polymer(line, model, res_id, aniso_dict, full_names):
         }
 
 
+def atom_lines_to_columns(lines, aniso_dict, full_names):
+    """Reads the properties of some ATOM or HETATM records into columns of
+    per-atom values, ready for :py:meth:`.Model.from_arrays`. The values are
+    interpreted in the same way as :py:func:`.atom_line_to_dict` does.
+
+    :param list lines: the records to read.
+    :param dict aniso_dict: the anisotropy dictionary to use.
+    :param dict full_names: the lookup dictionary for full name information.
+    :rtype: ``dict``"""
+
+    atom_ids = [int(line[6:11]) for line in lines]
+    res_names = [line[17:20].strip() for line in lines]
+    return {
+     "coords": [(line[30:38], line[38:46], line[46:54]) for line in lines],
+     "elements": [line[76:78].strip() or None for line in lines],
+     "names": [line[12:16].strip() or None for line in lines],
+     "res_ids": [id_from_line(line) for line in lines],
+     "chain_ids": [line[21] for line in lines],
+     "atom_ids": atom_ids, "res_names": res_names,
+     "full_names": [full_names.get(name) for name in res_names],
+     "charges": [charge_from_line(line) for line in lines],
+     "bvalues": [float(line[60:66]) if line[60:66].strip() else None
+      for line in lines],
+     "occupancies": [float(line[54:60]) if line[54:60].strip() else 1
+      for line in lines],
+     "alt_locs": [line[16].strip() or None for line in lines],
+     "anisotropy": [aniso_dict.get(id) for id in atom_ids]
+      if aniso_dict else None
+    }
+
+
+def charge_from_line(line):
+    """Gets the charge of an ATOM or HETATM record, which may have its sign
+    before or after the number.
+
+    :param str line: the record to read.
+    :rtype: ``int``"""
+
+    if not line[78:80].strip(): return 0
+    try:
+        return int(line[78:80].strip())
+    except: return int(line[78:80][::-1].strip())
+
+
 def atom_line_to_dict(line, aniso_dict):
     """Converts an ATOM or HETATM record to an atom dictionary.
 
@@ -530,10 +718,7 @@ def atom_line_to_dict(line, aniso_dict):
     if line[54:60].strip(): a["occupancy"] = float(line[54:60].strip())
     if line[60:66].strip(): a["bvalue"] = float(line[60:66].strip())
     a["element"] = line[76:78].strip() or None
-    if line[78:80].strip():
-        try:
-            a["charge"] = int(line[78:80].strip())
-        except: a["charge"] = int(line[78:80][::-1].strip())
+    a["charge"] = charge_from_line(line)
     return a
 
 
@@ -555,17 +740,90 @@ def structure_to_pdb_string(structure):
     :param AtomStructure structure: the structure to convert.
     :rtype: ``str``"""
 
+    return "\n".join(structure_to_pdb_lines(structure))
+
+
+def structure_to_pdb_lines(structure):
+    """A generator which converts a :py:class:`.AtomStructure` to .pdb records,
+    yielding them one line at a time (without line endings) so that they can be
+    written out without the whole filestring ever being built.
+
+    :param AtomStructure structure: the structure to convert.
+    :rtype: ``str``"""
+
     lines = []
     pack_sequences(structure, lines)
+    yield from lines
+    yield from structure_to_atom_lines(structure)
+
+
+def models_to_pdb_lines(models):
+    """A generator which converts a series of models to .pdb records, each
+    model's records between MODEL and ENDMDL records, yielding them one line
+    at a time so that they can be written out as they are made.
+
+    Any model after the first can be given as an array of coordinates instead
+    of a structure - one row for each of the first model's atoms, in order of
+    their IDs. The first model's records are then written again with just
+    their coordinates changed, so that they are only made once.
+
+    :param models: the structures and coordinate arrays to convert.
+    :raises ValueError: if an array is not the same size as the first model.
+    :rtype: ``str``"""
+
+    template = None
+    for number, model in enumerate(models, start=1):
+        if template is None:
+            lines = []
+            pack_sequences(model, lines)
+            yield from lines
+            lines = template = list(structure_to_atom_lines(model))
+        elif hasattr(model, "atoms"):
+            lines = structure_to_atom_lines(model)
+        else:
+            lines = move_atom_lines(template, model)
+        yield "MODEL     {:>4}".format(number)
+        yield from lines
+        yield "ENDMDL"
+
+
+def structure_to_atom_lines(structure):
+    """A generator which yields the ATOM, HETATM, ANISOU and TER records of a
+    structure, with its atoms in order of their IDs.
+
+    :param AtomStructure structure: the structure to convert.
+    :rtype: ``str``"""
+
     atoms = sorted(structure.atoms(), key=lambda a: a.id)
     for i, atom in enumerate(atoms):
+        lines = []
         atom_to_atom_line(atom, lines)
         if isinstance(atom.het, Residue) and (
          atom is atoms[-1] or atoms[i + 1].chain is not atom.chain or
           isinstance(atoms[i + 1].het, Ligand)):
             last = lines[-1]
             lines.append(f"TER   {last[6:11]}      {last[17:20]} {last[21]}{last[22:26]}{last[26]}")
-    return "\n".join(lines)
+        yield from lines
+
+
+def move_atom_lines(lines, coordinates):
+    """Takes the records of a structure's atoms and gives them new
+    coordinates, one row per ATOM or HETATM record.
+
+    :param list lines: the records to change.
+    :param coordinates: the new coordinates.
+    :raises ValueError: if there are the wrong number of coordinates.
+    :rtype: ``list``"""
+
+    coordinates = np.asarray(coordinates, dtype="f8")
+    count = sum(line[:6] in ("ATOM  ", "HETATM") for line in lines)
+    if coordinates.shape != (count, 3):
+        raise ValueError("Expected coordinates of shape ({}, 3), not {}".format(
+         count, coordinates.shape
+        ))
+    rows = iter(coordinates.tolist())
+    return [line[:30] + "{:8.3f}{:8.3f}{:8.3f}".format(*next(rows)) + line[54:]
+     if line[:6] in ("ATOM  ", "HETATM") else line for line in lines]
 
 
 def pack_sequences(structure, lines):
@@ -595,7 +853,7 @@ def atom_to_atom_line(a, lines):
     :param list lines: the string lines to update."""
 
     line = "{:6}{:5} {:4} {:3} {:1}{:4}{:1}   "
-    line += "{:>8}{:>8}{:>8}  1.00{:6}          {:>2}{:2}"
+    line += "{:>8}{:>8}{:>8}{:6.2f}{:6}          {:>2}{:2}"
     id_, residue_name, chain_id, residue_id, insert_code = "", "", "", "", ""
     if a.het:
         id_, residue_name = a.het.id, a.het._name
@@ -604,13 +862,13 @@ def atom_to_atom_line(a, lines):
         insert_code = id_[-1] if id_ and id_[-1].isalpha() else ""
     atom_name = a._name or ""
     atom_name = " " + atom_name if len(atom_name) < 4 else atom_name
-    occupancy = "  1.00"
     line = line.format(
      "HETATM" if isinstance(a.het, Ligand) else "ATOM",
      a.id, atom_name, residue_name, chain_id, residue_id, insert_code,
      "{:.3f}".format(a.location[0]) if a.location[0] is not None else "",
      "{:.3f}".format(a.location[1]) if a.location[1] is not None else "",
      "{:.3f}".format(a.location[2]) if a.location[2] is not None else "",
+     a.occupancy,
      a.bvalue if a.bvalue is not None else "", a.element or "",
      str(int(a.charge))[::-1] if a.charge else "",
     )
@@ -646,3 +904,6 @@ def atom_to_anisou_line(a, name, res_name, chain_id, res_id, insert):
      str(int(a.charge))[::-1] if a.charge else "",
     )
     return line
+
+
+MODEL_RECORDS = ("ATOM", "HETATM", "ANISOU", "MODEL", "TER", "ENDMDL")
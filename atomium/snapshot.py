@@ -0,0 +1,412 @@
+"""Contains functions for saving models as compact binary snapshots, and for
+loading them again.
+
+A snapshot file is laid out as follows:
+
+- The eight bytes ``ATOMSNAP``.
+- The format version and the length of the header, as little-endian unsigned\
+  32 and 64 bit integers.
+- A JSON header, describing where each array is in the file and holding the\
+  small, irregular things such as chain sequences and the file's metadata.
+- The arrays themselves - one per column of atom, het and chain properties -\
+  each starting on a 64 byte boundary so that they can be memory-mapped and\
+  used in place.
+
+Columns of strings are stored as categories - an array of the distinct
+UTF-8 encoded values, and an array of integer codes pointing to them, with -1
+standing for ``None``."""
+
+import gc
+import json
+import mmap
+import struct
+import builtins
+import numpy as np
+from datetime import date, datetime
+
+MAGIC = b"ATOMSNAP"
+VERSION = 1
+ALIGNMENT = 64
+
+def model_to_snapshot(model, path):
+    """Saves a :py:class:`.Model` to a binary snapshot file. If the model came
+    from a :py:class:`.File`, that file's metadata is saved too.
+
+    :param Model model: the model to save.
+    :param str path: the location to save to."""
+
+    arrays, header = model_to_arrays(model)
+    if model._file is not None:
+        header["file"] = {
+         k[1:]: v for k, v in vars(model._file).items() if k != "_models"
+        }
+    save_arrays(arrays, header, path)
+
+
+def model_to_arrays(model):
+    """Flattens a :py:class:`.Model` into columnar arrays. Hets are ordered
+    chain by chain (each chain's residues in order), then ligands, then waters,
+    and the atoms of each het are contiguous and in ID order, so that the
+    hierarchy is described by offset arrays alone. Bonds are stored as the
+    positions of their two atoms in this order, and their orders, and the
+    alternate locations of atoms as one row per alternate location.
+
+    :param Model model: the model to flatten.
+    :rtype: ``tuple``"""
+
+    chains = list(model._chains.structures)
+    chain_indices = {chain: i for i, chain in enumerate(chains)}
+    hets, kinds, chain_offsets = [], [], [0]
+    for chain in chains:
+        hets += chain._residues.structures
+        chain_offsets.append(len(hets))
+    kinds += [0] * len(hets)
+    for ligands, kind in ((model._ligands, 1), (model._waters, 2)):
+        ligands = ligands.structures
+        hets += ligands
+        kinds += [kind] * len(ligands)
+    het_indices = {het: i for i, het in enumerate(hets)}
+    atoms, het_offsets = [], [0]
+    for het in hets:
+        atoms += sorted(het._atoms.structures, key=lambda a: a._id)
+        het_offsets.append(len(atoms))
+    integer_charges = all(isinstance(a._charge, int) for a in atoms)
+    arrays = {
+     "coords": np.array(
+      [a._location for a in atoms], dtype="f8"
+     ).reshape(len(atoms), 3),
+     "atom_ids": np.array([a._id for a in atoms], dtype="i8"),
+     "charges": np.array(
+      [a._charge for a in atoms], dtype="i2" if integer_charges else "f8"
+     ),
+     "bvalues": np.array([
+      np.nan if a._bvalue is None else a._bvalue for a in atoms
+     ], dtype="f8"),
+     "occupancies": np.array([a._occupancy for a in atoms], dtype="f8"),
+     "het_offsets": np.array(het_offsets, dtype="i8"),
+     "het_kinds": np.array(kinds, dtype="i1"),
+     "het_chains": np.array([chain_indices.get(
+      getattr(het, "_chain", None), -1
+     ) for het in hets], dtype="i4"),
+     "het_next": np.array([het_indices.get(
+      getattr(het, "_next", None), -1
+     ) for het in hets], dtype="i8"),
+     "chain_offsets": np.array(chain_offsets, dtype="i8")
+    }
+    if any(any(a._anisotropy) for a in atoms):
+        arrays["anisotropy"] = np.array(
+         [a._anisotropy for a in atoms], dtype="f8"
+        ).reshape(len(atoms), 6)
+    if any(a._bonds is not None for a in atoms):
+        add_bonds(arrays, model.bonds, atoms)
+    if any(a._alt_locs for a in atoms): add_alt_locs(arrays, atoms)
+    add_strings(arrays, "elements", [a._element for a in atoms])
+    add_strings(arrays, "names", [a._name for a in atoms])
+    add_strings(arrays, "het_ids", [het._id for het in hets])
+    add_strings(arrays, "het_names", [het._name for het in hets])
+    add_strings(arrays, "het_full_names", [het._full_name for het in hets])
+    add_strings(arrays, "het_internal_ids", [
+     getattr(het, "_internal_id", None) for het in hets
+    ])
+    add_strings(arrays, "chain_ids", [c._id for c in chains])
+    add_strings(arrays, "chain_names", [c._name for c in chains])
+    add_strings(arrays, "chain_internal_ids", [c._internal_id for c in chains])
+    header = {
+     "sequences": [c._sequence for c in chains],
+     "helices": [[[het_indices[r] for r in h] for h in c._helices]
+      for c in chains],
+     "strands": [[[het_indices[r] for r in s] for s in c._strands]
+      for c in chains]
+    }
+    return arrays, header
+
+
+def add_bonds(arrays, table, atoms):
+    """Adds the bonds between some atoms to a dictionary of arrays, as the
+    positions of the two atoms of each bond (``bond_atoms``) and the bonds'
+    orders (``bond_orders``). Bonds to atoms not in the list are left out.
+
+    :param dict arrays: the arrays to update.
+    :param BondTable table: the table holding the bonds.
+    :param list atoms: the atoms, in the order they are stored in."""
+
+    positions = {atom: i for i, atom in enumerate(atoms)}
+    positions = np.array(
+     [positions.get(atom, -1) for atom in table.atoms], dtype="i8"
+    )[table.pairs.reshape(-1, 2)]
+    kept = (positions >= 0).all(axis=1)
+    arrays["bond_atoms"] = positions[kept]
+    arrays["bond_orders"] = table.orders[kept].astype("i1")
+
+
+def add_alt_locs(arrays, atoms):
+    """Adds the alternate locations of some atoms to a dictionary of arrays,
+    with one row for each alternate location of each atom - the atom's
+    position (``alt_loc_atoms``), the alternate location's ID
+    (``alt_loc_ids``), and its coordinates, occupancy and B-value, with
+    ``None`` stored as NaN.
+
+    :param dict arrays: the arrays to update.
+    :param list atoms: the atoms, in the order they are stored in."""
+
+    rows = [(i, alt_loc, values) for i, atom in enumerate(atoms)
+     for alt_loc, values in (atom._alt_locs or {}).items()]
+    values = np.array([[
+     np.nan if v is None else v for v in row[2]
+    ] for row in rows], dtype="f8").reshape(len(rows), 5)
+    arrays["alt_loc_atoms"] = np.array([row[0] for row in rows], dtype="i8")
+    arrays["alt_loc_coords"] = values[:, :3]
+    arrays["alt_loc_occupancies"] = values[:, 3]
+    arrays["alt_loc_bvalues"] = values[:, 4]
+    add_strings(arrays, "alt_loc_ids", [row[1] for row in rows])
+
+
+def get_alt_locs(arrays, atoms):
+    """Restores the alternate locations stored by :py:func:`.add_alt_locs` to
+    the atoms they belong to.
+
+    :param dict arrays: the snapshot's arrays.
+    :param list atoms: the atoms, in the order they are stored in."""
+
+    coords = arrays["alt_loc_coords"].tolist()
+    occupancies = arrays["alt_loc_occupancies"].tolist()
+    bvalues = arrays["alt_loc_bvalues"].tolist()
+    for i, (index, alt_loc) in enumerate(zip(
+     arrays["alt_loc_atoms"].tolist(), get_strings(arrays, "alt_loc_ids")
+    )):
+        atom = atoms[index]
+        if atom._alt_locs is None: atom._alt_locs = {}
+        atom._alt_locs[alt_loc] = (*coords[i], *[
+         None if v != v else v for v in (occupancies[i], bvalues[i])
+        ])
+
+
+def add_strings(arrays, name, values):
+    """Adds a column of strings to a dictionary of arrays, as an array of its
+    distinct values (``name_values``) and an array of codes pointing to them
+    (``name``), where -1 means ``None``.
+
+    :param dict arrays: the arrays to update.
+    :param str name: the name of the column.
+    :param list values: the strings to add."""
+
+    lookup = {}
+    codes = [-1 if v is None else lookup.setdefault(v, len(lookup))
+     for v in values]
+    arrays[name] = np.array(codes, dtype="i4")
+    arrays[name + "_values"] = np.array(
+     [v.encode() for v in lookup], dtype="S"
+    ).reshape(len(lookup))
+
+
+def get_strings(arrays, name):
+    """Gets a column of strings from a dictionary of arrays as a list.
+
+    :param dict arrays: the arrays to read.
+    :param str name: the name of the column.
+    :rtype: ``list``"""
+
+    values = [v.decode() for v in arrays[name + "_values"].tolist()] + [None]
+    return [values[code] for code in arrays[name].tolist()]
+
+
+def save_arrays(arrays, header, path, magic=MAGIC, version=VERSION):
+    """Writes a dictionary of arrays and a JSON header to a snapshot file, with
+    each array aligned so that it can be memory-mapped in place. Other kinds
+    of file with the same layout can be written by giving a different magic
+    number.
+
+    :param dict arrays: the arrays to save.
+    :param dict header: the other information to save.
+    :param str path: the location to save to.
+    :param bytes magic: the eight bytes the file starts with.
+    :param int version: the version of the format."""
+
+    header = dict(header, arrays={})
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {
+         "dtype": array.dtype.str, "shape": array.shape, "offset": offset
+        }
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header_bytes = json.dumps(header, default=encode_json).encode()
+    start = len(magic) + 12 + len(header_bytes)
+    start += -start % ALIGNMENT
+    with builtins.open(path, "wb") as f:
+        f.write(magic + struct.pack("<IQ", version, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            position = start + header["arrays"][name]["offset"]
+            f.write(b"\x00" * (position - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.write(b"\x00" * (start + offset - f.tell()))
+
+
+def read_snapshot(path):
+    """Reads a snapshot file's header, and memory-maps its arrays. Nothing is
+    read into memory until it is used, so this is near-instant for files of
+    any size - use this if you only need the columns and not a
+    :py:class:`.Model`.
+
+    :param str path: the location of the snapshot file.
+    :raises ValueError: if the file is not a snapshot, or has an unsupported\
+    version.
+    :rtype: ``tuple``"""
+
+    return read_arrays(path)
+
+
+def read_arrays(path, magic=MAGIC, version=VERSION, kind="snapshot"):
+    """Reads the header of any file written by :py:func:`.save_arrays`, and
+    memory-maps its arrays.
+
+    :param str path: the location of the file.
+    :param bytes magic: the eight bytes the file should start with.
+    :param int version: the latest version of the format that can be read.
+    :param str kind: what the file is called in error messages.
+    :raises ValueError: if the file has the wrong magic number, or an\
+    unsupported version.
+    :rtype: ``tuple``"""
+
+    with builtins.open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(magic)] != magic:
+        raise ValueError("{} is not an atomium {}".format(path, kind))
+    file_version, length = struct.unpack_from("<IQ", buffer, len(magic))
+    if file_version > version:
+        raise ValueError("Unsupported {} version: {}".format(kind, file_version))
+    start = len(magic) + 12
+    header = json.loads(
+     buffer[start:start + length].decode(), object_hook=decode_json
+    )
+    start += length
+    start += -start % ALIGNMENT
+    arrays = {}
+    for name, d in header.pop("arrays").items():
+        shape = tuple(d["shape"])
+        arrays[name] = np.frombuffer(
+         buffer, dtype=d["dtype"], count=int(np.prod(shape)),
+         offset=start + d["offset"]
+        ).reshape(shape)
+    return header, arrays
+
+
+def load_snapshot(path):
+    """Loads a :py:class:`.Model` from a snapshot file made with
+    :py:meth:`.Model.to_snapshot`. If the model was part of a
+    :py:class:`.File` when it was saved, it will be part of an equivalent one
+    now.
+
+    Garbage collection is paused while the model's objects are created, as
+    the collector would otherwise repeatedly scan the hundreds of thousands of
+    new objects a large model can have.
+
+    :param str path: the location of the snapshot file.
+    :raises ValueError: if the file is not a snapshot, or has an unsupported\
+    version.
+    :rtype: ``Model``"""
+
+    from .data import File
+    header, arrays = read_snapshot(path)
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        model = arrays_to_model(arrays, header)
+    finally:
+        if collecting: gc.enable()
+    if "file" in header:
+        f = File(header["file"]["filetype"])
+        for key, value in header["file"].items():
+            setattr(f, "_" + key, value)
+        f._models = [model]
+        model._file = f
+    return model
+
+
+def arrays_to_model(arrays, header):
+    """Builds a :py:class:`.Model` from the columnar arrays of a snapshot,
+    slicing its atoms into hets and its hets into chains using the offset
+    arrays.
+
+    :param dict arrays: the snapshot's arrays.
+    :param dict header: the snapshot's header.
+    :rtype: ``Model``"""
+
+    from .structures import Model, Chain, Ligand, Residue
+    from .data import create_atoms
+    from .bonds import BondTable
+    atoms = create_atoms(
+     np.array(arrays["coords"]), get_strings(arrays, "elements"),
+     arrays["atom_ids"].tolist(), get_strings(arrays, "names"),
+     arrays["charges"].tolist(), arrays["bvalues"].tolist(),
+     arrays["anisotropy"].tolist() if "anisotropy" in arrays else None,
+     arrays["occupancies"].tolist() if "occupancies" in arrays else None
+    )
+    het_offsets = arrays["het_offsets"].tolist()
+    kinds, chain_indices = arrays["het_kinds"], arrays["het_chains"].tolist()
+    ids, names = get_strings(arrays, "het_ids"), get_strings(arrays, "het_names")
+    full_names = get_strings(arrays, "het_full_names")
+    internal_ids = get_strings(arrays, "het_internal_ids")
+    hets = []
+    for i, kind in enumerate(kinds.tolist()):
+        het_atoms = atoms[het_offsets[i]:het_offsets[i + 1]]
+        if kind:
+            hets.append(Ligand(
+             *het_atoms, id=ids[i], name=names[i], full_name=full_names[i],
+             internal_id=internal_ids[i], water=(kind == 2)
+            ))
+        else:
+            hets.append(Residue(
+             *het_atoms, id=ids[i], name=names[i], full_name=full_names[i]
+            ))
+    for het, next_index in zip(hets, arrays["het_next"].tolist()):
+        if next_index != -1:
+            het._next, hets[next_index]._previous = hets[next_index], het
+    chain_offsets = arrays["chain_offsets"].tolist()
+    chain_ids = get_strings(arrays, "chain_ids")
+    chain_names = get_strings(arrays, "chain_names")
+    chain_internal_ids = get_strings(arrays, "chain_internal_ids")
+    chains = [Chain(
+     *hets[chain_offsets[i]:chain_offsets[i + 1]],
+     id=chain_ids[i], name=chain_names[i], internal_id=chain_internal_ids[i],
+     sequence=header["sequences"][i],
+     helices=[[hets[r] for r in h] for h in header["helices"][i]],
+     strands=[[hets[r] for r in s] for s in header["strands"][i]]
+    ) for i in range(len(chain_ids))]
+    for het, chain_index in zip(hets, chain_indices):
+        if chain_index != -1 and isinstance(het, Ligand):
+            het._chain = chains[chain_index]
+    model = Model(*(chains + hets[chain_offsets[-1]:]))
+    if "alt_loc_atoms" in arrays: get_alt_locs(arrays, atoms)
+    if "bond_atoms" in arrays:
+        model._bonds = BondTable.from_arrays(
+         atoms, arrays["bond_atoms"], arrays["bond_orders"]
+        )
+    return model
+
+
+def encode_json(obj):
+    """Encodes the objects in a snapshot header that JSON can't represent
+    natively - dates, and NumPy arrays and numbers.
+
+    :param obj: the object to encode.
+    :rtype: ``dict``"""
+
+    if isinstance(obj, datetime): return {"__datetime__": obj.isoformat()}
+    if isinstance(obj, date): return {"__date__": obj.isoformat()}
+    if isinstance(obj, np.ndarray): return {"__array__": obj.tolist()}
+    if isinstance(obj, np.generic): return obj.item()
+    raise TypeError("Cannot save {} in a snapshot".format(repr(obj)))
+
+
+def decode_json(d):
+    """Restores the dates and arrays encoded by :py:func:`.encode_json` when a
+    snapshot header is read.
+
+    :param dict d: a JSON object.
+    :rtype: ``dict``"""
+
+    if "__datetime__" in d: return datetime.fromisoformat(d["__datetime__"])
+    if "__date__" in d: return date.fromisoformat(d["__date__"])
+    if "__array__" in d: return np.array(d["__array__"])
+    return d
@@ -6,6 +6,8 @@ import math
 import warnings
 from collections import Counter, OrderedDict, defaultdict
 from .base import StructureClass, query, StructureSet
+from .bonds import BondTable, find_bonds
+from .components import lookup_component
 
 class AtomStructure:
     """A structure made of atoms. This contains various useful methods that rely
@@ -55,6 +57,8 @@ class AtomStructure:
     @name.setter
     def name(self, name):
         self._name = name
+        model = getattr(self, "model", None)
+        if model: model._columns = None
 
 
     @property
@@ -209,28 +213,53 @@ class AtomStructure:
 
     def save(self, path):
         """Saves the structure to file. The file extension given in the filename
-        will be used to determine which file format to save in.
+        will be used to determine which file format to save in. If the filename
+        ends in .gz (such as 'structure.cif.gz') the file will be gzip
+        compressed.
+
+        The file is written a line at a time as it is generated, rather than
+        being built in memory first.
 
         If the structure you are saving has any duplicate IDs, a warning will be
         issued, as the file saved will likely be nonsensical.
 
-        :param str path: the filename and location to save to."""
+        :param str path: the filename and location to save to.
+        :raises ValueError: if the file extension is not supported."""
 
-        from .utilities import save
+        from .utilities import open_for_writing
         self.check_ids()
-        ext = path.split(".")[-1]
-        if ext == "cif":
-            from .mmcif import structure_to_mmcif_string
-            string = structure_to_mmcif_string(self)
-        elif ext == "mmtf":
-            from .mmtf import structure_to_mmtf_string
-            string = structure_to_mmtf_string(self)
-        elif ext == "pdb":
-            from .pdb import structure_to_pdb_string
-            string = structure_to_pdb_string(self)
-        else:
+        parts = path.split(".")
+        ext = parts[-2] if parts[-1] == "gz" and len(parts) > 2 else parts[-1]
+        if ext not in ("cif", "mmtf", "pdb"):
             raise ValueError("Unsupported file extension: " + ext)
-        save(string, path)
+        with open_for_writing(path, binary=(ext == "mmtf")) as f:
+            self.write(f, ext)
+
+
+    def write(self, f, filetype):
+        """Writes the structure to any file-like object (an open file, a gzip
+        stream, a socket wrapper etc.) in the given file format, one line (or
+        for .mmtf one packed field) at a time.
+
+        The file object must be open in text mode for 'cif' and 'pdb', and in
+        binary mode for 'mmtf'.
+
+        :param f: the file-like object to write to.
+        :param str filetype: 'cif', 'mmtf' or 'pdb'.
+        :raises ValueError: if the file type is not supported."""
+
+        from .utilities import write_lines
+        if filetype == "cif":
+            from .mmcif import structure_to_mmcif_lines
+            write_lines(structure_to_mmcif_lines(self), f)
+        elif filetype == "mmtf":
+            from .mmtf import structure_to_mmtf_chunks
+            for chunk in structure_to_mmtf_chunks(self): f.write(chunk)
+        elif filetype == "pdb":
+            from .pdb import structure_to_pdb_lines
+            write_lines(structure_to_pdb_lines(self), f)
+        else:
+            raise ValueError("Unsupported file extension: " + filetype)
 
 
     def atoms_in_sphere(self, location, radius, *args, **kwargs):
@@ -386,6 +415,19 @@ class AtomStructure:
             atom.trim(places)
 
 
+    def use_alt_loc(self, alt_loc):
+        """Moves every atom in the structure that has the given alternate
+        location to it, switching the structure to that conformer. This needs
+        the structure to have been parsed with the ``'all'`` alternate location
+        policy.
+
+        :param str alt_loc: the alternate location ID to use.
+        :returns: the number of atoms moved.
+        :rtype: ``int``"""
+
+        return sum(atom.use_alt_loc(alt_loc) for atom in self.atoms())
+
+
 
 class Molecule(AtomStructure):
     """A molecule is a top-level constituent of a :py:class:`.Model` - a chain,
@@ -441,12 +483,16 @@ class Het(AtomStructure):
     def full_name(self):
         """Returns the residue's full name, based on its three letter name - or
         just the three letter name if it doesn't match anything. Or you can just
-        supply a full name when you instantiate the Het.
+        supply a full name when you instantiate the Het. Names atomium doesn't
+        know are looked up in the component store given to
+        :py:func:`.use_components`, if there is one.
 
         :rtype: ``str``"""
 
         if self._full_name: return self._full_name
-        return self.__data.FULL_NAMES.get(self._name, self._name)
+        return self.__data.FULL_NAMES.get(self._name) or lookup_component(
+         self._name, "name"
+        ) or self._name
     
 
     @full_name.setter
@@ -497,6 +543,56 @@ class Model(AtomStructure, metaclass=StructureClass):
         self._waters = StructureSet(*self._waters)
         self._file = file
         self._internal_grid = None
+        self._columns = None
+        self._bonds = None
+
+
+    @classmethod
+    def from_arrays(cls, coords, elements, names, res_ids, chain_ids, **kwargs):
+        """Creates a model from columns of atom properties - lists or NumPy
+        arrays with one value per atom - in time proportional to the number of
+        atoms. Atoms are grouped into residues and ligands by their residue
+        IDs, and residues into chains by their chain IDs, with everything kept
+        in the order it first appears.
+
+            >>> model = Model.from_arrays(
+            ...  [[0, 0, 0], [1.5, 0, 0], [9, 9, 9]], ["N", "C", "O"],
+            ...  ["N", "CA", "O"], ["A.1", "A.1", "A.100"], ["A", "A", "A"],
+            ...  res_names=["GLY", "GLY", "HOH"],
+            ...  kinds=["polymer", "polymer", "water"]
+            ... )
+            >>> model
+            <Model (1 chain, 0 ligands)>
+
+        As well as the required columns, the following per-atom columns can
+        be given as keyword arguments: ``atom_ids`` (by default atoms are
+        numbered from 1), ``res_names``, ``full_names``, ``kinds`` ('polymer',
+        'non-polymer' or 'water' - by default everything is polymer),
+        ``internal_ids`` (by default the chain IDs), ``charges``, ``bvalues``,
+        ``occupancies``, ``alt_locs`` and ``anisotropy``. When occupancies and
+        alternate locations are both given, only one location is kept for
+        each atom, as when parsing files, chosen according to the ``alt_loc``
+        policy keyword. A ligand or water is associated with
+        the chain whose ID it has in ``chain_ids``.
+
+        ``sequences`` can be a ``dict`` of chain IDs to sequences, and
+        ``helices`` and ``strands`` lists of the first and last residue IDs
+        of each helix and strand. ``bonds`` can be an array with a row for
+        each bond, giving the positions in the columns of its two atoms and
+        its order.
+
+        :param coords: the atoms' coordinates, as rows of x, y and z.
+        :param elements: the atoms' elements.
+        :param names: the atoms' names.
+        :param res_ids: the IDs of the residue or ligand each atom is in.
+        :param chain_ids: the IDs of the chain each atom is in or associated\
+        with.
+        :rtype: ``Model``"""
+
+        from .data import columns_to_model
+        return columns_to_model(
+         coords, elements, names, res_ids, chain_ids, **kwargs
+        )
 
 
     def __repr__(self):
@@ -581,6 +677,7 @@ class Model(AtomStructure, metaclass=StructureClass):
         """Removes all water ligands from the model."""
 
         self._waters = StructureSet()
+        self._columns = None
     
 
     def optimise_distances(self):
@@ -597,6 +694,109 @@ class Model(AtomStructure, metaclass=StructureClass):
             self._internal_grid[x][y][z].add(atom)
 
 
+    def perceive_bonds(self, tolerance=0.45):
+        """Works out which of the model's atoms are bonded from the distances
+        between them, for structures whose files don't say. Two atoms are
+        bonded if they are closer together than the sum of their covalent
+        radii plus a tolerance, and are not less than 0.4 Å apart. Atoms with
+        the same name in the same residue or ligand are alternate locations
+        of one atom, and are never bonded to each other - atoms that aren't
+        in a residue or ligand are never treated this way. Any bonds the model
+        already has are kept, along with their orders, and new bonds are
+        single bonds.
+
+        Atoms are only compared with those in neighbouring cells of a grid,
+        so this takes time proportional to the number of atoms.
+
+        :param float tolerance: how much longer than the sum of two atoms'\
+        radii a bond between them can be."""
+
+        from .data import COVALENT_RADII
+        atoms = list(self.atoms())
+        elements, inverse = np.unique(
+         [atom._element or "" for atom in atoms], return_inverse=True
+        )
+        radii = np.array([COVALENT_RADII.get(element.upper(), 0)
+         for element in elements], dtype="f8")[inverse.reshape(-1)]
+        coordinates = np.array(
+         [atom._location for atom in atoms], dtype="f8"
+        ).reshape(-1, 3)
+        keys = {}
+        groups = np.array([keys.setdefault(atom if atom._het is None else (
+         atom._het, atom._name
+        ), len(keys)) for atom in atoms], dtype="i8")
+        pairs = find_bonds(coordinates, radii, tolerance, groups)
+        table = self.bonds
+        if table._atoms:
+            table.extend(atoms, pairs)
+        else:
+            self._bonds = BondTable.from_arrays(atoms, pairs)
+
+
+    def to_snapshot(self, path):
+        """Saves the model to a compact binary snapshot file, which can be
+        loaded again with ``atomium.load_snapshot`` far faster than any
+        structure file can be parsed. The atoms' properties are stored as
+        columnar arrays which can be memory-mapped, along with the offsets
+        which describe the model's hierarchy, and the metadata of the file the
+        model came from.
+
+        :param str path: the location to save to."""
+
+        from .snapshot import model_to_snapshot
+        model_to_snapshot(self, path)
+
+
+    def to_arrays(self, residues=False):
+        """Returns the properties of the model's atoms as a ``dict`` of NumPy
+        arrays, one per property, so that they can be analysed without going
+        through each :py:class:`.Atom` in turn. Atoms are grouped by residue,
+        and each has a ``residue_index`` pointing to its row in the residue
+        arrays, which you can get instead by passing ``residues=True``. These
+        cover ligands and waters as well as residues, and give the range of
+        atom rows each one occupies.
+
+        The arrays are built once and kept until the model is changed, so they
+        are read-only.
+
+        :param bool residues: if ``True``, the residue arrays are returned.
+        :rtype: ``dict``"""
+
+        if self._columns is None:
+            from .tables import model_to_columns
+            self._columns = model_to_columns(self)
+        return dict(self._columns[1 if residues else 0])
+
+
+    def to_dataframe(self, residues=False):
+        """Returns the arrays from :py:meth:`.to_arrays` as a pandas
+        ``DataFrame``. pandas must be installed to use this.
+
+        :param bool residues: if ``True``, the residues' table is returned.
+        :raises ImportError: if pandas is not installed.
+        :rtype: ``DataFrame``"""
+
+        from .tables import columns_to_dataframe
+        return columns_to_dataframe(self.to_arrays(residues))
+
+
+    @property
+    def bonds(self):
+        """The :py:class:`.BondTable` holding the bonds of the model's atoms.
+        If its atoms were bonded before being put in the model, and so are
+        spread over several tables, these are merged into one. The table is
+        only created when first needed.
+
+        :rtype: ``BondTable``"""
+
+        tables = {a._bonds for a in self.atoms() if a._bonds is not None}
+        if self._bonds is not None: tables.add(self._bonds)
+        if not tables: tables.add(BondTable())
+        self._bonds = max(tables, key=lambda t: len(t._atoms))
+        for table in tables - {self._bonds}: self._bonds.merge(table)
+        return self._bonds
+
+
     #TODO copy
 
 
@@ -880,11 +1080,15 @@ class Residue(Het, metaclass=StructureClass):
     @property
     def code(self):
         """Returns the single letter code, based on its three letter name - or
-        just 'X' if it doesn't match anything.
+        just 'X' if it doesn't match anything. Modified residues get the code of
+        their parent residue if they are in the component store given to
+        :py:func:`.use_components`.
 
         :rtype: ``str``"""
 
-        return self.__data.CODES.get(self._name, "X")
+        return self.__data.CODES.get(self._name) or lookup_component(
+         self._name, "code"
+        ) or "X"
 
 
     @property
@@ -956,21 +1160,27 @@ class Atom:
     :param str name: The atom's name.
     :param number charge: The charge of the atom.
     :param number bvalue: The B-value of the atom (its uncertainty).
-    :param list anisotropy: The directional uncertainty of the atom."""
+    :param list anisotropy: The directional uncertainty of the atom.
+    :param number occupancy: The fraction of the time the atom is present at\
+    this location."""
 
     from atomium import data as __data
 
     __slots__ = [
      "_element", "_location", "_id", "_name", "_charge",
-     "_bvalue", "_anisotropy", "_het", "_bonded_atoms",
+     "_bvalue", "_anisotropy", "_occupancy", "_het", "_bonds",
+     "_alt_locs"
     ]
 
-    def __init__(self, element, x, y, z, id, name, charge, bvalue, anisotropy):
+    def __init__(self, element, x, y, z, id, name, charge, bvalue, anisotropy,
+                 occupancy=1):
         self._location = np.array([x, y, z])
         self._element = element
         self._id, self._name, self._charge = id, name, charge
         self._bvalue, self._anisotropy = bvalue, anisotropy
-        self._het, self._bonded_atoms = None, set()
+        self._occupancy = occupancy
+        self._het, self._bonds = None, None
+        self._alt_locs = None
 
 
     def __repr__(self):
@@ -984,7 +1194,7 @@ class Atom:
     def __eq__(self, other):
         if not isinstance(other, Atom): return False
         for attr in self.__slots__:
-            if attr not in ("_id", "_het", "_bonded_atoms", "_location"):
+            if attr not in ("_id", "_het", "_bonds", "_location"):
                 if getattr(self, attr) != getattr(other, attr): return False
             if list(self._location) != list(other._location): return False
         return True
@@ -1003,6 +1213,7 @@ class Atom:
 
         for atom in atoms:
             atom._location += np.array(vector)
+            atom._clear_columns()
 
 
     @staticmethod
@@ -1016,6 +1227,7 @@ class Atom:
         output = np.dot(np.array(matrix), np.array(locations).transpose())
         for atom, location in zip(atoms, output.transpose()):
             atom._location = location
+            atom._clear_columns()
 
 
     @staticmethod
@@ -1085,6 +1297,7 @@ class Atom:
     @name.setter
     def name(self, name):
         self._name = name
+        self._clear_columns()
 
 
     @property
@@ -1099,6 +1312,7 @@ class Atom:
     @charge.setter
     def charge(self, charge):
         self._charge = charge
+        self._clear_columns()
 
 
     @property
@@ -1114,6 +1328,7 @@ class Atom:
     @bvalue.setter
     def bvalue(self, bvalue):
         self._bvalue = bvalue
+        self._clear_columns()
 
 
     @property
@@ -1126,13 +1341,70 @@ class Atom:
         return self._anisotropy
 
 
+    @property
+    def occupancy(self):
+        """The atom's occupancy - the fraction of the time it is present at
+        this location, when it has alternate locations.
+
+        :rtype: ``float``"""
+
+        return self._occupancy
+
+
+    @occupancy.setter
+    def occupancy(self, occupancy):
+        self._occupancy = occupancy
+        self._clear_columns()
+
+
+    @property
+    def alt_locs(self):
+        """The atom's alternate positions, if it was parsed with the ``'all'``
+        alternate location policy. Each alternate location ID is mapped to an
+        ``(x, y, z, occupancy, bvalue)`` tuple, including the one the atom is
+        currently at.
+
+        :rtype: ``dict``"""
+
+        return dict(self._alt_locs or {})
+
+
+    def use_alt_loc(self, alt_loc):
+        """Moves the atom to one of its alternate positions, taking on that
+        position's occupancy and B-value. If the atom has no such alternate
+        location, nothing happens.
+
+        :param str alt_loc: the alternate location ID to use.
+        :returns: ``True`` if the atom was moved.
+        :rtype: ``bool``"""
+
+        if alt_loc not in (self._alt_locs or {}): return False
+        *location, self._occupancy, self._bvalue = self._alt_locs[alt_loc]
+        self._location = np.array(location)
+        self._clear_columns()
+        return True
+
+
     @property
     def bonded_atoms(self):
-        """Returns the atoms this atom is bonded to.
+        """Returns the atoms this atom is bonded to, as read from the
+        :py:class:`.BondTable` its bonds are stored in.
 
         :rtype: ``set```"""
 
-        return self._bonded_atoms
+        if self._bonds is None: return set()
+        return self._bonds.bonded_atoms(self)
+
+
+    def bond_order(self, other):
+        """Returns the order of the bond between this atom and another, or
+        ``None`` if they are not bonded.
+
+        :param Atom other: the other atom.
+        :rtype: ``int``"""
+
+        if self._bonds is None: return None
+        return self._bonds.order(self, other)
 
 
     @property
@@ -1224,10 +1496,12 @@ class Atom:
 
         :rtype: ``Atom``"""
 
-        return Atom(
+        atom = Atom(
          self._element, *self._location, id or self._id, self._name,
-         self._charge, self._bvalue, self._anisotropy
+         self._charge, self._bvalue, self._anisotropy, self._occupancy
         )
+        if self._alt_locs: atom._alt_locs = dict(self._alt_locs)
+        return atom
     
 
     @property
@@ -1379,6 +1653,7 @@ class Atom:
         :param number z: The atom's new z coordinate."""
 
         self._location[0], self._location[1], self._location[2] = x, y, z
+        self._clear_columns()
 
 
     def trim(self, places):
@@ -1390,12 +1665,30 @@ class Atom:
 
         if places is not None:
             self._location = np.round(self._location, places)
+            self._clear_columns()
 
 
-    def bond(self, other):
-        """Bonds the atom to some other atom.
+    def _clear_columns(self):
+        """Discards any arrays its model has cached from
+        :py:meth:`.Model.to_arrays`, as they no longer describe the atom."""
 
-        :param Atom other: the other atom to bond to."""
-        
-        self._bonded_atoms.add(other)
-        other._bonded_atoms.add(self)
+        model = self._het.model if self._het else None
+        if model: model._columns = None
+
+
+    def bond(self, other, order=1):
+        """Bonds the atom to some other atom. The bond is stored in the
+        :py:class:`.BondTable` of either atom or, if neither has been bonded
+        before, that of the atom's model.
+
+        :param Atom other: the other atom to bond to.
+        :param int order: the bond order."""
+
+        table = self._bonds if self._bonds is not None else other._bonds
+        if table is None:
+            model = self._het.model if self._het else None
+            table = model._bonds if model else None
+            if table is None:
+                table = BondTable()
+                if model: model._bonds = table
+        table.add(self, other, order)
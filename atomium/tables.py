@@ -0,0 +1,223 @@
+"""Contains functions for flattening structures into tables of atoms, and for
+saving those tables in columnar formats for analysis.
+
+Tables are saved as Parquet or Arrow IPC files if pyarrow is installed, and as
+NumPy .npz files otherwise."""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError: pyarrow = None
+try:
+    import pandas
+except ImportError: pandas = None
+
+COLUMNS = [
+ "model", "chain", "residue_id", "residue_name", "atom_id", "atom_name",
+ "element", "x", "y", "z", "bvalue", "occupancy", "charge"
+]
+
+ARROW_EXTENSIONS = ("parquet", "arrow", "feather")
+
+STRUCTURE_EXTENSIONS = ("cif", "mmtf", "pdb", "ent")
+
+def structure_to_table(structure):
+    """Flattens a structure into a table of its atoms - a ``dict`` mapping
+    column names to NumPy arrays of equal length, with one row per atom. If a
+    :py:class:`.File` is given, the atoms of all its models are included, and
+    the model column says which model (counting from 1) each atom is in.
+    Otherwise every atom is given model 1.
+
+    Atoms are ordered by model, then ID. Atoms with no residue or chain have
+    empty strings in those columns, and missing B-values are ``nan``.
+
+    :param structure: the :py:class:`.File` or structure to flatten.
+    :rtype: ``dict``"""
+
+    models = getattr(structure, "models", None) or [structure]
+    rows = []
+    for number, model in enumerate(models, start=1):
+        for atom in sorted(model.atoms(), key=lambda a: a._id):
+            het = atom._het
+            chain = getattr(het, "_chain", None) if het else None
+            rows.append((
+             number, chain._id if chain else "", het._id if het else "",
+             het._name if het else "", atom._id, atom._name or "",
+             atom._element or "", *atom._location,
+             np.nan if atom._bvalue is None else atom._bvalue,
+             atom._occupancy, atom._charge
+            ))
+    columns = list(zip(*rows)) if rows else [[] for _ in COLUMNS]
+    dtypes = ["i4", "U", "U", "U", "i8", "U", "U"] + ["f8"] * 6
+    return {name: np.array(column, dtype=dtype) for name, column, dtype in zip(
+     COLUMNS, columns, dtypes
+    )}
+
+
+def model_to_columns(model):
+    """Builds per-atom and per-residue columns for a :py:class:`.Model` in a
+    single pass over its structure. Atoms are grouped by the residue, ligand
+    or water they belong to (chains first, then ligands, then waters), and
+    ordered by ID within each group, so that the atoms of the residue in row
+    ``i`` of the residue columns are rows ``atom_start[i]`` to
+    ``atom_start[i] + atom_count[i]`` of the atom columns. The residue columns
+    include ligands and waters, distinguished by their ``kind``, and their
+    ``x``, ``y`` and ``z`` columns give the centre of their atoms.
+
+    :param Model model: the model to build columns for.
+    :rtype: ``tuple``"""
+
+    hets = []
+    for chain in model._chains.structures:
+        hets += [(chain, "residue", r) for r in chain._residues.structures]
+    for kind, ligands in (("ligand", model._ligands), ("water", model._waters)):
+        hets += [(lig._chain, kind, lig) for lig in ligands.structures]
+    atom_rows, het_rows = [], []
+    for index, (chain, kind, het) in enumerate(hets):
+        atoms = sorted(het._atoms.structures, key=lambda a: a._id)
+        het_rows.append((
+         het._id, het._name, chain._id if chain else "", kind,
+         len(atom_rows), len(atoms)
+        ))
+        atom_rows += [(
+         atom._id, atom._name or "", atom._element or "", *atom._location,
+         np.nan if atom._bvalue is None else atom._bvalue,
+         atom._occupancy, atom._charge, index
+        ) for atom in atoms]
+    atoms = make_columns(atom_rows, [
+     ("atom_id", "i8"), ("atom_name", "U"), ("element", "U"), ("x", "f8"),
+     ("y", "f8"), ("z", "f8"), ("bvalue", "f8"), ("occupancy", "f8"),
+     ("charge", "f8"), ("residue_index", "i8")
+    ])
+    residues = make_columns(het_rows, [
+     ("residue_id", "U"), ("residue_name", "U"), ("chain", "U"),
+     ("kind", "U"), ("atom_start", "i8"), ("atom_count", "i8")
+    ])
+    index = atoms["residue_index"]
+    atoms["residue_id"] = residues["residue_id"][index]
+    atoms["residue_name"] = residues["residue_name"][index]
+    atoms["chain"] = residues["chain"][index]
+    for axis in "xyz":
+        totals = np.bincount(index, atoms[axis], minlength=len(het_rows))
+        with np.errstate(invalid="ignore"):
+            residues[axis] = totals / residues["atom_count"]
+    for column in list(atoms.values()) + list(residues.values()):
+        column.flags.writeable = False
+    return atoms, residues
+
+
+def make_columns(rows, columns):
+    """Turns a list of row tuples into a ``dict`` of NumPy arrays.
+
+    :param list rows: the rows of values.
+    :param list columns: the ``(name, dtype)`` pairs of each column.
+    :rtype: ``dict``"""
+
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    return {name: np.array(column, dtype=dtype)
+     for (name, dtype), column in zip(columns, values)}
+
+
+def columns_to_dataframe(columns):
+    """Turns a ``dict`` of columns into a pandas ``DataFrame``.
+
+    :param dict columns: the columns to use.
+    :raises ImportError: if pandas is not installed.
+    :rtype: ``DataFrame``"""
+
+    if pandas is None:
+        raise ImportError("pandas is needed to create DataFrames")
+    return pandas.DataFrame(columns)
+
+
+def save_table(table, path):
+    """Saves an atom table to file. The format is determined by the file
+    extension - '.parquet', '.arrow' (Arrow IPC, also '.feather') or '.npz'.
+
+    If an Arrow format is asked for but pyarrow isn't installed, the table will
+    be saved as .npz instead, with the extension changed accordingly.
+
+    :param dict table: the table to save.
+    :param str path: the location to save to.
+    :raises ValueError: if the file extension is not supported.
+    :returns: the location actually saved to.
+    :rtype: ``str``"""
+
+    ext = path.split(".")[-1]
+    if ext not in ARROW_EXTENSIONS + ("npz",):
+        raise ValueError("Unsupported table extension: " + ext)
+    if ext in ARROW_EXTENSIONS and pyarrow:
+        arrow_table = pyarrow.table(table)
+        if ext == "parquet":
+            pyarrow.parquet.write_table(arrow_table, path)
+        else:
+            pyarrow.feather.write_feather(arrow_table, path)
+        return path
+    if ext != "npz": path = path[:-len(ext)] + "npz"
+    np.savez_compressed(path, **table)
+    return path
+
+
+def load_table(path):
+    """Loads an atom table saved with :py:func:`.save_table`.
+
+    :param str path: the location of the table file.
+    :raises ImportError: if the table is in an Arrow format and pyarrow is\
+    not installed.
+    :rtype: ``dict``"""
+
+    if path.endswith(".npz"):
+        with np.load(path) as f:
+            return {name: f[name] for name in f.files}
+    if pyarrow is None:
+        raise ImportError("pyarrow is needed to load Parquet and Arrow tables")
+    if path.endswith(".parquet"):
+        arrow_table = pyarrow.parquet.read_table(path)
+    else:
+        arrow_table = pyarrow.feather.read_table(path)
+    return {name: arrow_table.column(name).to_numpy()
+     for name in arrow_table.column_names}
+
+
+def convert_file(path, output):
+    """Opens a structure file and saves its atom table.
+
+    :param str path: the location of the structure file.
+    :param str output: the location to save the table to.
+    :returns: the location actually saved to.
+    :rtype: ``str``"""
+
+    from .utilities import open
+    return save_table(structure_to_table(open(path)), output)
+
+
+def convert_directory(directory, output, ext="parquet", processes=None):
+    """Converts every structure file in a directory (.cif, .mmtf, .pdb or .ent,
+    compressed or not) into an atom table, using a pool of processes so that
+    several files are parsed at once. Each table is named after the file it
+    came from, so that '1lol.cif.gz' becomes '1lol.cif.parquet'.
+
+        >>> convert_directory('/data/pdb', '/data/tables', processes=8)
+
+    :param str directory: the directory of structure files.
+    :param str output: the directory to save tables in.
+    :param str ext: the table format - 'parquet', 'arrow' or 'npz'.
+    :param int processes: the number of processes to use (by default, the\
+    number of CPUs).
+    :returns: the locations of the saved tables.
+    :rtype: ``list``"""
+
+    paths, outputs = [], []
+    for name in sorted(os.listdir(directory)):
+        parts = name.split(".")
+        if parts[-1] in ("gz", "bz2", "xz", "zst"): parts = parts[:-1]
+        if len(parts) > 1 and parts[-1] in STRUCTURE_EXTENSIONS:
+            paths.append(os.path.join(directory, name))
+            outputs.append(os.path.join(output, ".".join(parts + [ext])))
+    os.makedirs(output, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(convert_file, paths, outputs))
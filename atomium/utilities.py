@@ -1,13 +1,57 @@
 """Contains various file handling helper functions."""
 
-import builtins
+import os
+import io
+import json
 import gzip
+import mmap
+import hashlib
+import asyncio
+import builtins
 import paramiko
-from requests import get
+try:
+    import bz2
+except ImportError: bz2 = None
+try:
+    import lzma
+except ImportError: lzma = None
+try:
+    import zstandard
+except ImportError: zstandard = None
+import requests
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from .mmcif import mmcif_string_to_mmcif_dict, mmcif_dict_to_data_dict
+from .mmcif import mmcif_dict_to_models, iter_mmcif_dicts
+from .mmcif import models_to_mmcif_lines
 from .mmtf import mmtf_bytes_to_mmtf_dict, mmtf_dict_to_data_dict
+from .mmtf import mmtf_dict_to_models, iter_mmtf_models
+from .mmtf import models_to_mmtf_chunks
 from .pdb import pdb_string_to_pdb_dict, pdb_dict_to_data_dict
-from .data import data_dict_to_file
+from .pdb import pdb_dict_to_models, iter_pdb_dicts, models_to_pdb_lines
+from .data import data_dict_to_file, make_selection, model_is_selected
+from .data import check_alt_loc_policy
+
+SNIFF_SIZE = 4096
+
+COMPRESSION_ENDINGS = (".gz", ".bz2", ".xz", ".zst")
+
+FETCH_SETTINGS = {
+ "timeout": 30, "retries": 3, "backoff": 0.5, "pool_size": 10,
+ "retry_statuses": (429, 500, 502, 503, 504),
+ "cache": None, "cache_size": None, "mirror": None, "offline": False
+}
+
+MODEL_FUNCTIONS = {
+ mmcif_dict_to_data_dict: mmcif_dict_to_models,
+ mmtf_dict_to_data_dict: mmtf_dict_to_models,
+ pdb_dict_to_data_dict: pdb_dict_to_models
+}
+
+_session = None
 
 def open(path, *args, **kwargs):
     """Opens a file at a given path, works out what filetype it is, and parses
@@ -20,22 +64,157 @@ def open(path, *args, **kwargs):
     This will parse file.pdb as a .pdb file, but only go as far as converting it
     to an atomium data dictionary.
 
+    Compressed files (gzip, and bz2, xz or zstd where Python has support for
+    them) are recognised by their contents rather than their extension, and
+    are decompressed as they are parsed - once, in a single pass. Uncompressed
+    files are memory-mapped rather than read, and the parsers work through the
+    mapping directly, so the file is never copied into one large string.
+
     :param str path: the location of the file.
     :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
     :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :param str alt_loc: which alternate locations to use - 'first' (the\
+    default), 'occupancy' (the highest occupancy), an ID such as 'B', or\
+    'all' (as 'first', but keeping the others on the atoms).
+    :param chains: if given, only these chains will be loaded.
+    :param atom_names: if given, only atoms with these names will be loaded.
+    :param bool skip_waters: if ``True``, waters will not be loaded.
+    :param bool skip_ligands: if ``True``, ligands will not be loaded.
+    :param models: if given, only these models will be loaded.
     :rtype: ``File``"""
 
-    if str(path)[-3:] == '.gz':
+    with read_file(path) as filestring:
+        return parse_string(filestring, path, *args, **kwargs)
+
+
+@contextmanager
+def read_file(path):
+    """Opens a file for parsing, giving either a decompressing stream (if it
+    is compressed) or a memory map of it (or its contents, if it is empty).
+    The memory map is closed when the context exits - the parsers copy what
+    they read out of it, so nothing they make refers to it afterwards.
+
+    :param str path: the location of the file."""
+
+    with builtins.open(path, "rb") as f:
+        stream = get_decompressed_stream(f)
+        if stream:
+            with stream:
+                yield stream
+                return
         try:
-            with gzip.open(path) as f: filestring = f.read()
-        except:
-            with gzip.open(path, "rt") as f: filestring = f.read()
-    else:
+            filestring = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield f.read()
+            return
         try:
-            with builtins.open(path) as f: filestring = f.read()
-        except:
-            with builtins.open(path, "rb") as f: filestring = f.read()
-    return parse_string(filestring, path, *args, **kwargs)
+            yield filestring
+        finally: filestring.close()
+
+
+def iter_models(path, alt_loc="first", chains=None, atom_names=None,
+                skip_waters=False, skip_ligands=False, models=None):
+    """Opens a file and yields its models one at a time, reading the file as
+    it goes, so that only one model is ever held in memory. This is useful
+    for very large ensembles, such as those from NMR.
+
+        >>> for model in atomium.iter_models('/path/to/file.pdb'):
+        ...     print(model.radius_of_gyration)
+
+    Each model's :py:meth:`.Model.file` is a :py:class:`.File` with the
+    file's metadata, but which doesn't hold the models.
+
+    A model that is no longer used is freed by Python's garbage collector
+    (its atoms and residues refer to each other), so memory use rises and falls
+    a little as models are read, but doesn't grow with the number of models.
+
+    .pdb files are read in a single pass. .cif files are read twice - once for
+    everything but the atom_site table, and once for the atoms themselves -
+    so that tables after the atoms (such as anisotropy) can still be used.
+    .mmtf files have to be decoded all at once, but their models are still
+    built one at a time.
+
+    :param str path: the location of the file.
+    :param str alt_loc: which alternate locations to use.
+    :param chains: if given, only these chains will be loaded.
+    :param atom_names: if given, only atoms with these names will be loaded.
+    :param bool skip_waters: if ``True``, waters will not be loaded.
+    :param bool skip_ligands: if ``True``, ligands will not be loaded.
+    :param models: if given, only these models (counting from 1) will be\
+    loaded.
+    :raises ValueError: if the alternate location policy is not valid.
+    :rtype: ``Model``"""
+
+    check_alt_loc_policy(alt_loc)
+    selection = make_selection(
+     chains, atom_names, skip_waters, skip_ligands, models
+    )
+    with read_file(path) as filestring:
+        file_func, data_func = get_parse_functions(filestring, path)
+        if data_func is pdb_dict_to_data_dict:
+            yield from iter_file_models(
+             iter_pdb_dicts(filestring), data_func, alt_loc, selection
+            )
+            return
+        if data_func is mmtf_dict_to_data_dict:
+            parsed = file_func(filestring)
+        else:
+            parsed = mmcif_string_to_mmcif_dict(filestring, atom_site=False)
+    if data_func is mmtf_dict_to_data_dict:
+        f = data_dict_to_file(
+         data_func(parsed, models=False), "mmtf", models=[]
+        )
+        for model in iter_mmtf_models(parsed, alt_loc, selection):
+            model._file = f
+            yield model
+        return
+    with read_file(path) as filestring:
+        yield from iter_file_models(
+         iter_mmcif_dicts(filestring, parsed), data_func, alt_loc, selection
+        )
+
+
+def iter_file_models(dicts, data_func, alt_loc, selection):
+    """Builds one model from each of a series of file dictionaries, each of
+    which has just one model's atoms. The models all get the same
+    :py:class:`.File`, made from the metadata of the first dictionary.
+
+    :param dicts: the file dictionaries.
+    :param function data_func: the function that makes data dictionaries.
+    :param str alt_loc: which alternate locations to use.
+    :param dict selection: the atoms to keep, or ``None``.
+    :rtype: ``Model``"""
+
+    f, model_func = None, MODEL_FUNCTIONS[data_func]
+    filetype = data_func.__name__.split("_")[0].replace("mmc", "c")
+    model_selection = selection and {**selection, "models": None}
+    for number, d in enumerate(dicts, start=1):
+        if f is None:
+            f = data_dict_to_file(data_func(d, models=False), filetype, models=[])
+        if not model_is_selected(selection, number): continue
+        for model in model_func(d, alt_loc=alt_loc, selection=model_selection):
+            model._file = f
+            yield model
+
+
+def get_decompressed_stream(f):
+    """Looks at the first few bytes of a binary file object, and if they are
+    the signature of a compression format, returns a file object which
+    decompresses it as it is read. If the file isn't compressed, or is
+    compressed in a format Python has no module for, ``None`` is returned.
+
+    :param f: a binary file object which supports ``peek``.
+    :rtype: ``io.BufferedIOBase``"""
+
+    head = f.peek(6)[:6]
+    if head.startswith(b"\x1f\x8b"):
+        return gzip.GzipFile(fileobj=f)
+    if bz2 and head.startswith(b"BZh"):
+        return bz2.BZ2File(f)
+    if lzma and head.startswith(b"\xfd7zXZ\x00"):
+        return lzma.LZMAFile(f)
+    if zstandard and head.startswith(b"\x28\xb5\x2f\xfd"):
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f))
 
 
 def fetch(code, *args, **kwargs):
@@ -53,29 +232,314 @@ def fetch(code, *args, **kwargs):
     This will get the .mmtf version of structure 1LOL, but only go as far as
     converting it to an atomium file dictionary.
 
+    Requests go through a shared session, so connections to the same server
+    are kept alive and reused, and failed requests are retried - see
+    :py:func:`.configure_fetching`.
+
+    If a local mirror of the PDB has been configured, PDB codes are read from
+    there instead. If a cache directory has been configured, downloaded files
+    are kept there and are only downloaded again if the server says they have
+    changed. In offline mode, only the mirror and the cache are used.
+
     :param str code: the file to fetch.
     :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
     :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :param str alt_loc: which alternate locations to use.
     :raises ValueError: if no file is found.
     :rtype: ``File``"""
 
+    if not code.startswith("http") and "." not in code: code += ".cif"
+    mirror_path = get_mirror_path(code)
+    if mirror_path and os.path.exists(mirror_path):
+        return open(mirror_path, *args, **kwargs)
+    body = get_body(get_url(code))
+    return parse_bytes(body, code, *args, **kwargs)
+
+
+def fetch_many(codes, *args, concurrency=8, **kwargs):
+    """Fetches several files at once, using a pool of threads which share one
+    connection pool. Each file is parsed by the thread that downloaded it as
+    soon as its body arrives, so parsing overlaps with the other downloads.
+
+        >>> atomium.fetch_many(['1lol', '5xme.mmtf'], concurrency=4)
+
+    The files are returned in the same order as the codes given. Any other
+    arguments are passed to :py:func:`.fetch` for each code.
+
+    :param list codes: the files to fetch.
+    :param int concurrency: the number of downloads to run at once.
+    :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
+    :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :raises ValueError: if any file is not found.
+    :rtype: ``list``"""
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(
+         lambda code: fetch(code, *args, **kwargs), codes
+        ))
+
+
+def get_url(code):
+    """Takes a PDB code, optionally with a file extension, and returns the URL
+    that file can be downloaded from. URLs are returned unchanged.
+
+    :param str code: the code to look up.
+    :rtype: ``str``"""
+
     if code.startswith("http"):
-        url = code
+        return code
     elif code.endswith(".mmtf"):
-        url = "https://mmtf.rcsb.org/v1.0/full/{}".format(code[:-5].lower())
+        return "https://mmtf.rcsb.org/v1.0/full/{}".format(code[:-5].lower())
     else:
         if "." not in code: code += ".cif"
-        url = "https://files.rcsb.org/view/" + code.lower()
-    response = get(url, stream=True)
+        return "https://files.rcsb.org/view/" + code.lower()
+
+
+def get_mirror_path(code):
+    """Takes a PDB code with a file extension and returns where that file would
+    be in the configured local mirror, using the directory layout of the
+    wwPDB archive - ``divided/mmCIF/lo/1lol.cif.gz`` for example. If there is
+    no mirror, or the code is a URL or a file type the archive doesn't hold,
+    ``None`` is returned.
+
+    :param str code: the code to look up.
+    :rtype: ``str``"""
+
+    mirror = FETCH_SETTINGS["mirror"]
+    if not mirror or code.startswith("http"): return None
+    code, ext = code.lower().rsplit(".", 1)
+    if ext == "cif":
+        return os.path.join(
+         mirror, "divided", "mmCIF", code[1:3], code + ".cif.gz"
+        )
+    if ext == "pdb":
+        return os.path.join(
+         mirror, "divided", "pdb", code[1:3], "pdb" + code + ".ent.gz"
+        )
+
+
+def get_body(url):
+    """Gets the contents of the file at a URL.
+
+    If there is a cache, a copy of the file there is used if the server says it
+    hasn't changed (by its ETag or modification date), and new downloads are
+    added to it. In offline mode the cache is the only place looked at.
+
+    :param str url: the URL to download.
+    :raises ValueError: if the file can't be obtained.
+    :rtype: ``bytes``"""
+
+    entry = get_cache_entry(url) if FETCH_SETTINGS["cache"] else None
+    if FETCH_SETTINGS["offline"]:
+        if entry: return read_from_cache(url)
+        raise ValueError("{} is not cached and fetching is offline".format(url))
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    response = get(url, headers=headers)
+    if response.status_code == 304 and entry:
+        return read_from_cache(url)
     if response.status_code == 200:
-        text = response.content if code.endswith(".mmtf") else response.text
-        return parse_string(text, code, *args, **kwargs)
+        if FETCH_SETTINGS["cache"]: add_to_cache(url, response)
+        return response.content
     raise ValueError("Could not find anything at {}".format(url))
 
 
+def parse_bytes(body, path, *args, **kwargs):
+    """Parses the contents of a file held in memory, decompressing it as it
+    goes if it is compressed.
+
+    :param bytes body: the file contents.
+    :param str path: the filename of the file of origin.
+    :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
+    :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :rtype: ``File``"""
+
+    stream = get_decompressed_stream(io.BufferedReader(io.BytesIO(body)))
+    if stream:
+        with stream: return parse_string(stream, path, *args, **kwargs)
+    return parse_string(body, path, *args, **kwargs)
+
+
+def parse_stream(f, path, *args, **kwargs):
+    """Parses the contents of a binary file object as it is read, decompressing
+    it as it goes if it is compressed.
+
+    :param f: a binary file object which supports ``peek``.
+    :param str path: the filename of the file of origin.
+    :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
+    :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :rtype: ``File``"""
+
+    stream = get_decompressed_stream(f)
+    if stream:
+        with stream: return parse_string(stream, path, *args, **kwargs)
+    return parse_string(f, path, *args, **kwargs)
+
+
+def get_cache_paths(url):
+    """Returns the locations in the cache of the compressed body of a URL, and
+    of the JSON file of metadata about it.
+
+    :param str url: the URL being cached.
+    :rtype: ``tuple``"""
+
+    key = hashlib.sha1(url.encode()).hexdigest()
+    path = os.path.join(FETCH_SETTINGS["cache"], key)
+    return path + ".gz", path + ".json"
+
+
+def get_cache_entry(url):
+    """Returns the metadata stored about a cached URL - its ``etag`` and
+    ``last_modified`` headers - or ``None`` if it isn't in the cache.
+
+    :param str url: the URL to look up.
+    :rtype: ``dict``"""
+
+    body_path, meta_path = get_cache_paths(url)
+    try:
+        with builtins.open(meta_path) as f: entry = json.load(f)
+    except (OSError, ValueError): return None
+    return entry if os.path.exists(body_path) else None
+
+
+def read_from_cache(url):
+    """Reads the compressed body of a cached URL, and marks it as recently
+    used by updating its modification time.
+
+    :param str url: the URL to look up.
+    :rtype: ``bytes``"""
+
+    body_path, meta_path = get_cache_paths(url)
+    with builtins.open(body_path, "rb") as f: body = f.read()
+    try:
+        os.utime(body_path)
+    except OSError: pass
+    return body
+
+
+def add_to_cache(url, response):
+    """Stores a downloaded body in the cache, gzip compressed unless it already
+    is, along with the headers needed to revalidate it later. Files are written
+    under temporary names and then moved into place, so that a partly written
+    file is never read. Least recently used files are then evicted if the cache
+    has grown beyond its maximum size.
+
+    :param str url: the URL that was downloaded.
+    :param requests.Response response: the response to store."""
+
+    os.makedirs(FETCH_SETTINGS["cache"], exist_ok=True)
+    body_path, meta_path = get_cache_paths(url)
+    body = response.content
+    if not body.startswith(b"\x1f\x8b"): body = gzip.compress(body)
+    entry = {
+     "url": url, "etag": response.headers.get("ETag"),
+     "last_modified": response.headers.get("Last-Modified")
+    }
+    suffix = ".{}.tmp".format(os.getpid())
+    with builtins.open(body_path + suffix, "wb") as f: f.write(body)
+    with builtins.open(meta_path + suffix, "w") as f: json.dump(entry, f)
+    os.replace(body_path + suffix, body_path)
+    os.replace(meta_path + suffix, meta_path)
+    evict_from_cache()
+
+
+def evict_from_cache():
+    """Deletes the least recently used files from the cache until its total
+    size is no more than the configured maximum size in bytes."""
+
+    if FETCH_SETTINGS["cache_size"] is None: return
+    files = []
+    for entry in os.scandir(FETCH_SETTINGS["cache"]):
+        if entry.name.endswith(".gz"):
+            try:
+                stat = entry.stat()
+            except OSError: continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(f[1] for f in files)
+    for mtime, size, path in sorted(files):
+        if total <= FETCH_SETTINGS["cache_size"]: break
+        for remove_path in (path, path[:-3] + ".json"):
+            try:
+                os.remove(remove_path)
+            except OSError: pass
+        total -= size
+
+
+def get(url, **kwargs):
+    """Sends a GET request to a URL using the shared session, with the
+    configured timeout unless another is given.
+
+    :param str url: the URL to request.
+    :rtype: ``requests.Response``"""
+
+    kwargs.setdefault("timeout", FETCH_SETTINGS["timeout"])
+    return get_session().get(url, **kwargs)
+
+
+def get_session():
+    """Returns the session used for fetching, creating it the first time it is
+    needed. The session keeps a pool of connections to each server it talks to,
+    and retries requests that fail to connect or which get a temporary error
+    status, backing off between attempts.
+
+    :rtype: ``requests.Session``"""
+
+    global _session
+    if _session is None:
+        retry = Retry(
+         total=FETCH_SETTINGS["retries"],
+         backoff_factor=FETCH_SETTINGS["backoff"],
+         status_forcelist=FETCH_SETTINGS["retry_statuses"],
+         raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+         pool_connections=FETCH_SETTINGS["pool_size"],
+         pool_maxsize=FETCH_SETTINGS["pool_size"], max_retries=retry
+        )
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def configure_fetching(**settings):
+    """Changes the settings used when fetching files over HTTP.
+
+        >>> atomium.configure_fetching(timeout=10, retries=5)
+
+    The available settings are ``timeout`` (in seconds), ``retries`` (the
+    number of times to retry a failed request), ``backoff`` (the factor by
+    which the wait between retries grows), ``pool_size`` (the number of
+    connections kept open to each server) and ``retry_statuses`` (the HTTP
+    statuses that will be retried).
+
+    Downloads can be cached by setting ``cache`` to a directory, and
+    ``cache_size`` to the most bytes it should hold. ``mirror`` can be set to
+    the location of a local copy of the PDB archive (the directory containing
+    ``divided``), and ``offline`` to ``True`` to only use the mirror and cache.
+
+        >>> atomium.configure_fetching(mirror='/nfs/pdb', offline=True)
+
+    :raises ValueError: if an unknown setting is given."""
+
+    global _session
+    for key in settings:
+        if key not in FETCH_SETTINGS:
+            raise ValueError("Unknown fetch setting: {}".format(key))
+    FETCH_SETTINGS.update(settings)
+    if _session is not None: _session.close()
+    _session = None
+
+
 def fetch_over_ssh(hostname, username, path, *args, password=None, **kwargs):
     """Fetches a file from a remote location via SSH.
 
+    This opens a new connection for the one file - to fetch several files from
+    the same machine, use an :py:class:`.SSHFetcher`.
+
     :param str hostname: the remote location.
     :param str username: the username to use.
     :param str path: the file location on the remote machine.
@@ -84,24 +548,207 @@ def fetch_over_ssh(hostname, username, path, *args, password=None, **kwargs):
     :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
     :rtype: ``File``"""
 
-    client = paramiko.SSHClient()
-    try:
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        if not password:
-            client.load_system_host_keys()
-            client.connect(hostname=hostname, username=username)
-        else:
-            client.connect(
-             hostname=hostname, username=username, password=password 
-            )
-        stdin, stdout, stderr = client.exec_command("less " + path)
-        filestring = stdout.read().decode()
-    finally:
-        client.close()
-    return parse_string(filestring, path, *args, **kwargs)
+    with SSHFetcher(hostname, username, password=password) as fetcher:
+        return fetcher.fetch(path, *args, **kwargs)
+
+
+def get_over_ssh(hostname, username, path, password=None):
+    """Gets the contents of a file on a remote machine via SSH.
+
+    :param str hostname: the remote location.
+    :param str username: the username to use.
+    :param str path: the file location on the remote machine.
+    :param str password: if needed, the password to use.
+    :rtype: ``bytes``"""
+
+    with SSHFetcher(hostname, username, password=password) as fetcher:
+        return fetcher.get(path)
+
+
+
+class SSHFetcher:
+    """Fetches files from a remote machine over a single SSH connection, which
+    stays open until the fetcher is closed. Files are transferred with SFTP
+    and parsed as they arrive, and can be in any format atomium can open,
+    compressed or not.
+
+        >>> with atomium.SSHFetcher('cluster', 'sam') as fetcher:
+        ...     pdb = fetcher.fetch('/data/1lol.pdb.gz')
+        ...     files = fetcher.fetch_many(['/data/1lol.cif', '/data/5xme.mmtf'])
+
+    If no password is given, the system's host keys and SSH keys are used.
+
+    :param str hostname: the remote location.
+    :param str username: the username to use.
+    :param str password: if needed, the password to use.
+    :param int port: the port the SSH server is listening on."""
+
+    def __init__(self, hostname, username, password=None, port=22):
+        self._hostname = hostname
+        self._username = username
+        self._client = paramiko.SSHClient()
+        try:
+            self._client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            if not password:
+                self._client.load_system_host_keys()
+                self._client.connect(
+                 hostname=hostname, username=username, port=port
+                )
+            else:
+                self._client.connect(
+                 hostname=hostname, username=username,
+                 password=password, port=port
+                )
+            self._sftp = self._client.open_sftp()
+        except:
+            self._client.close()
+            raise
+
+
+    def __repr__(self):
+        return "<SSHFetcher ({}@{})>".format(self._username, self._hostname)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def fetch(self, path, *args, **kwargs):
+        """Fetches a file from the remote machine and parses it. The file is
+        streamed and parsed as it is transferred (and decompressed, if it is
+        compressed), rather than being downloaded in full first.
+
+        :param str path: the file location on the remote machine.
+        :param bool file_dict: if ``True``, parsing will stop at the file\
+        ``dict``.
+        :param bool data_dict: if ``True``, parsing will stop at the data\
+        ``dict``.
+        :rtype: ``File``"""
+
+        with self._sftp.open(path, "rb") as f:
+            f.prefetch()
+            return parse_stream(io.BufferedReader(f), path, *args, **kwargs)
+
+
+    def fetch_many(self, paths, *args, **kwargs):
+        """Fetches several files from the remote machine, one after another
+        over the same connection, and parses them.
+
+        :param list paths: the file locations on the remote machine.
+        :param bool file_dict: if ``True``, parsing will stop at the file\
+        ``dict``.
+        :param bool data_dict: if ``True``, parsing will stop at the data\
+        ``dict``.
+        :rtype: ``list``"""
+
+        return [self.fetch(path, *args, **kwargs) for path in paths]
+
+
+    def get(self, path):
+        """Gets the raw contents of a file on the remote machine.
+
+        :param str path: the file location on the remote machine.
+        :rtype: ``bytes``"""
+
+        with self._sftp.open(path, "rb") as f:
+            f.prefetch()
+            return f.read()
+
+
+    def close(self):
+        """Closes the connection to the remote machine."""
+
+        self._client.close()
+
+
+
+async def open_async(path, *args, executor=None, **kwargs):
+    """Opens and parses a file without blocking the event loop - the reading
+    and parsing are done in an executor.
+
+        >>> pdb = await atomium.open_async('/path/to/file.pdb')
+
+    By default this is the event loop's default thread pool, but any
+    ``concurrent.futures`` executor can be given. Parsing is mostly CPU-bound,
+    so a ``ProcessPoolExecutor`` will let several files be parsed at once.
+
+    If the awaiting task is cancelled, the result is discarded - though a file
+    which a worker has already started parsing will finish being parsed.
+
+    :param str path: the location of the file.
+    :param executor: the ``concurrent.futures`` executor to parse in.
+    :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
+    :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :rtype: ``File``"""
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+     executor, partial(open, path, *args, **kwargs)
+    )
 
 
-def parse_string(filestring, path, file_dict=False, data_dict=False):
+async def fetch_async(code, *args, executor=None, **kwargs):
+    """Fetches a file over HTTP without blocking the event loop, so that many
+    can be in flight at once.
+
+        >>> files = await asyncio.gather(*[
+        ...  atomium.fetch_async(code) for code in ['1LOL', '5XME']
+        ... ])
+
+    The download happens in the event loop's default thread pool, using the
+    same session, cache and mirror as :py:func:`.fetch`, and the parsing
+    happens in the executor given (or the default thread pool if there isn't
+    one).
+
+    :param str code: the file to fetch.
+    :param executor: the ``concurrent.futures`` executor to parse in.
+    :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
+    :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :raises ValueError: if no file is found.
+    :rtype: ``File``"""
+
+    loop = asyncio.get_running_loop()
+    if not code.startswith("http") and "." not in code: code += ".cif"
+    mirror_path = get_mirror_path(code)
+    if mirror_path and os.path.exists(mirror_path):
+        return await open_async(mirror_path, *args, executor=executor, **kwargs)
+    body = await loop.run_in_executor(None, get_body, get_url(code))
+    return await loop.run_in_executor(
+     executor, partial(parse_bytes, body, code, *args, **kwargs)
+    )
+
+
+async def fetch_over_ssh_async(hostname, username, path, *args,
+                               password=None, executor=None, **kwargs):
+    """Fetches a file from a remote location via SSH without blocking the
+    event loop. The transfer happens in the event loop's default thread pool,
+    and the parsing in the executor given.
+
+    :param str hostname: the remote location.
+    :param str username: the username to use.
+    :param str path: the file location on the remote machine.
+    :param str password: if needed, the password to use.
+    :param executor: the ``concurrent.futures`` executor to parse in.
+    :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
+    :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :rtype: ``File``"""
+
+    loop = asyncio.get_running_loop()
+    body = await loop.run_in_executor(None, partial(
+     get_over_ssh, hostname, username, path, password=password
+    ))
+    return await loop.run_in_executor(
+     executor, partial(parse_bytes, body, path, *args, **kwargs)
+    )
+
+
+def parse_string(filestring, path, file_dict=False, data_dict=False,
+                 alt_loc="first", chains=None, atom_names=None,
+                 skip_waters=False, skip_ligands=False, models=None):
     """Takes a filestring and parses it in the appropriate way. You must provide
     the string to parse itself, and some other string that ends in either .cif,
     .mmtf, or .cif - that will determine how the file is parsed.
@@ -109,19 +756,52 @@ def parse_string(filestring, path, file_dict=False, data_dict=False):
     (If this cannot be inferred from the path string, atomium will guess based
     on the filestring contents.)
 
+    Where a format can build models directly from its file ``dict``, this is
+    done instead of going through the model dictionaries of a data ``dict``.
+
+    Where atoms have alternate locations, only one is used, picked by the
+    ``alt_loc`` policy - see :py:func:`.pick_alt_loc`.
+
+    The models built can be limited to some chains, atom names, molecule
+    types or model numbers. These are checked while the atoms are being read,
+    so rejected atoms never have objects made for them. They do not affect
+    file or data dictionaries.
+
     :param str filestring: the contents of some file.
     :param str path: the filename of the file of origin.
     :param bool file_dict: if ``True``, parsing will stop at the file ``dict``.
     :param bool data_dict: if ``True``, parsing will stop at the data ``dict``.
+    :param str alt_loc: which alternate locations to use.
+    :param chains: if given, only these chains (and the ligands and waters\
+    associated with them) will be loaded.
+    :param atom_names: if given, only atoms with these names will be loaded.
+    :param bool skip_waters: if ``True``, waters will not be loaded.
+    :param bool skip_ligands: if ``True``, ligands will not be loaded.
+    :param models: if given, only these models (counting from 1) will be\
+    loaded.
+    :raises ValueError: if the alternate location policy is not valid, or if\
+    none of the models asked for are in the file.
     :rtype: ``File``"""
 
     file_func, data_func = get_parse_functions(filestring, path)
     parsed = file_func(filestring)
     if not file_dict:
-        parsed = data_func(parsed)
+        model_func = None if data_dict else MODEL_FUNCTIONS.get(data_func)
+        built = model_func(parsed, alt_loc=alt_loc, selection=make_selection(
+         chains, atom_names, skip_waters, skip_ligands, models
+        )) if model_func else None
+        if models is not None and built is not None and not len(built):
+            raise ValueError("The file has none of the models {}".format(
+             sorted(models)
+            ))
+        parsed = data_func(parsed, models=False) if model_func else (
+         data_func(parsed)
+        )
         if not data_dict:
             filetype = data_func.__name__.split("_")[0].replace("mmc", "c")
-            parsed = data_dict_to_file(parsed, filetype)
+            parsed = data_dict_to_file(
+             parsed, filetype, models=built, alt_loc=alt_loc
+            )
     return parsed
 
 
@@ -130,12 +810,15 @@ def get_parse_functions(filestring, path):
     returns them.
 
     (If this cannot be inferred from the path string, atomium will guess based
-    on the filestring contents.)
+    on the first few kilobytes of the filestring contents.)
 
-    :param str filestring: the filestring to inspect.
+    :param str filestring: the filestring (or bytes buffer, or stream) to\
+    inspect.
     :param str path: the path to inspect.
     :rtype: ``tuple``"""
 
+    for ending in COMPRESSION_ENDINGS:
+        if path.endswith(ending): path = path[:-len(ending)]
     if "." in path:
         ending = path.split(".")[-1]
         if ending in ("mmtf", "cif", "pdb"):
@@ -144,21 +827,113 @@ def get_parse_functions(filestring, path):
              "mmtf": (mmtf_bytes_to_mmtf_dict, mmtf_dict_to_data_dict),
              "pdb": (pdb_string_to_pdb_dict, pdb_dict_to_data_dict)
             }[ending]
-    if isinstance(filestring, bytes):
-        return (mmtf_bytes_to_mmtf_dict, mmtf_dict_to_data_dict)
-    elif "_atom_sites" in filestring:
+    if hasattr(filestring, "peek"):
+        head = filestring.peek(SNIFF_SIZE)[:SNIFF_SIZE]
+    else:
+        head = filestring[:SNIFF_SIZE]
+    if not isinstance(head, str):
+        if is_msgpack_map(head[:1]):
+            return (mmtf_bytes_to_mmtf_dict, mmtf_dict_to_data_dict)
+        head = head.decode(errors="replace")
+    if head.lstrip().startswith("data_") or "_atom_site" in head:
         return (mmcif_string_to_mmcif_dict, mmcif_dict_to_data_dict)
     else:
         return (pdb_string_to_pdb_dict, pdb_dict_to_data_dict)
 
 
+def is_msgpack_map(head):
+    """Checks whether some bytes look like the start of a msgpack map - which
+    is what every .mmtf file is, and what no text file can start with.
+
+    :param bytes head: the first byte(s) of the file.
+    :rtype: ``bool``"""
+
+    return bool(head) and (0x80 <= head[0] <= 0x8f or head[0] in (0xde, 0xdf))
+
+
+def save_models(models, path):
+    """Saves a series of models to one file, each as a separate model. The
+    file extension given in the filename will be used to determine which file
+    format to save in, and if it ends in .gz the file will be gzip compressed.
+
+    Any model after the first can be an array of coordinates instead, one row
+    for each of the first model's atoms in order of their IDs, such as the
+    frames of a trajectory - the first model is then written again with its
+    atoms at those coordinates.
+
+        >>> with atomium.open_dcd('run.dcd') as trajectory:
+        ...     atomium.save_models([model, *trajectory], 'run.pdb')
+
+    :param models: the structures and coordinate arrays to save.
+    :param str path: the filename and location to save to.
+    :raises ValueError: if the file extension is not supported."""
+
+    parts = str(path).split(".")
+    ext = parts[-2] if parts[-1] == "gz" and len(parts) > 2 else parts[-1]
+    if ext not in ("cif", "mmtf", "pdb"):
+        raise ValueError("Unsupported file extension: " + ext)
+    with open_for_writing(path, binary=(ext == "mmtf")) as f:
+        write_models(models, f, ext)
+
+
+def write_models(models, f, filetype):
+    """Writes a series of models to any file-like object in the given file
+    format, as they are converted - see :py:func:`.save_models`. Each
+    model is only formatted as it is reached, and the records of the first
+    model are made once and reused for any coordinate arrays after it, so the
+    models can come from a generator. .mmtf files have to gather every model
+    before their lists can be packed.
+
+    The file object must be open in text mode for 'cif' and 'pdb', and in
+    binary mode for 'mmtf'.
+
+    :param models: the structures and coordinate arrays to write.
+    :param f: the file-like object to write to.
+    :param str filetype: 'cif', 'mmtf' or 'pdb'.
+    :raises ValueError: if the file type is not supported."""
+
+    if filetype == "cif":
+        write_lines(models_to_mmcif_lines(models), f)
+    elif filetype == "mmtf":
+        for chunk in models_to_mmtf_chunks(models): f.write(chunk)
+    elif filetype == "pdb":
+        write_lines(models_to_pdb_lines(models), f)
+    else:
+        raise ValueError("Unsupported file extension: " + filetype)
+
+
 def save(filestring, path):
-    """Saves a filestring to file.
+    """Saves a filestring to file. If the path ends in .gz the file will be
+    gzip compressed.
 
-    :param str filestring: the string to save.
+    :param str filestring: the string (or bytestring) to save.
     :param str path: the place to save it."""
-    
-    try:
-        with builtins.open(path, "w") as f: f.write(filestring)
-    except:
-        with builtins.open(path, "wb") as f: f.write(filestring)
+
+    with open_for_writing(path, binary=isinstance(filestring, bytes)) as f:
+        f.write(filestring)
+
+
+def open_for_writing(path, binary=False):
+    """Opens a file for writing, in text mode unless told otherwise. If the
+    path ends in .gz, the returned file object will be a gzip stream, so that
+    anything written to it is compressed as it goes.
+
+    :param str path: the place to save to.
+    :param bool binary: if ``True``, the file will accept bytes.
+    :returns: a writable file object."""
+
+    if str(path)[-3:] == ".gz":
+        return gzip.open(path, "wb" if binary else "wt")
+    return builtins.open(path, "wb" if binary else "w")
+
+
+def write_lines(lines, f):
+    """Writes an iterable of lines to a file-like object one at a time, adding
+    line endings, so that the full filestring never needs to be in memory.
+
+    :param lines: the lines to write.
+    :param f: the file-like object to write to."""
+
+    for line in lines:
+        f.write(line)
+        f.write("\n")
@@ -0,0 +1,20 @@
+#! /usr/bin/env python3
+
+"""This script converts the PDB's Chemical Component Dictionary
+(components.cif, compressed or not) into a component store that atomium can
+look components up in. The store is saved next to the dictionary, unless a
+location is given as a second argument."""
+
+import sys
+import os
+import atomium.components
+
+if len(sys.argv) < 2:
+    print("Please provide a components.cif file to convert")
+    sys.exit()
+
+path = sys.argv[1]
+location = os.path.sep.join(path.split(os.path.sep)[:-1]) or "."
+output = sys.argv[2] if len(sys.argv) > 2 else f"{location}/components.store"
+count = atomium.components.build_component_store(path, output)
+print(f"Saved {count} components to {output}")
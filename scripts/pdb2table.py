@@ -0,0 +1,30 @@
+#! /usr/bin/env python3
+
+"""This script converts a protein structure file, or a directory of them, to
+tables of atoms. A single file's table will be saved in the same location as
+the original file - a directory's tables will be saved in a 'tables'
+subdirectory, with the files converted in parallel.
+
+The format defaults to Parquet (or .npz if pyarrow isn't installed), but can be
+given as a second argument - 'parquet', 'arrow' or 'npz'."""
+
+import sys
+import os
+import atomium.tables
+
+if len(sys.argv) < 2:
+    print("Please provide a file or directory to convert")
+    sys.exit()
+
+path = sys.argv[1]
+ext = sys.argv[2] if len(sys.argv) > 2 else "parquet"
+
+if os.path.isdir(path):
+    outputs = atomium.tables.convert_directory(
+     path, os.path.join(path, "tables"), ext=ext
+    )
+    print(f"Saved {len(outputs)} tables")
+else:
+    location = os.path.sep.join(path.split(os.path.sep)[:-1]) or "."
+    filename = path.split(os.path.sep)[-1].split(".")[0]
+    print(atomium.tables.convert_file(path, f"{location}/{filename}.{ext}"))
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import atomium
+from unittest import TestCase
+
+class BondReadingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def check_bond_lengths(self, model, maximum):
+        table = model.bonds
+        for index1, index2 in table.pairs.tolist():
+            atom1, atom2 = table.atoms[index1], table.atoms[index2]
+            self.assertLess(atom1.distance_to(atom2), maximum)
+
+
+    def test_pdb_conect_records_are_read(self):
+        model = atomium.open("tests/integration/files/1lol.pdb").model
+        self.assertEqual(len(model.bonds), 62)
+        atom = model.atom(3197)
+        self.assertEqual(
+         {a.id for a in atom.bonded_atoms}, {3196, 3198, 3199}
+        )
+        self.assertEqual(atom.bond_order(model.atom(3198)), 1)
+        self.check_bond_lengths(model, 2)
+
+
+    def test_pdb_repeated_conect_atoms_are_bond_orders(self):
+        path = os.path.join(self.directory, "ligand.pdb")
+        with open("tests/integration/files/1lol.pdb") as f:
+            lines = [l for l in f.read().splitlines() if l[:6] != "CONECT"]
+        lines.insert(-1, "CONECT 3197 3196 3198 3198 3199")
+        lines.insert(-1, "CONECT 3198 3197 3197")
+        with open(path, "w") as f: f.write("\n".join(lines))
+        model = atomium.open(path).model
+        self.assertEqual(len(model.bonds), 3)
+        self.assertEqual(model.atom(3198).bond_order(model.atom(3197)), 2)
+        self.assertEqual(model.atom(3196).bond_order(model.atom(3197)), 1)
+
+
+    def test_pdb_bonds_follow_selections(self):
+        model = atomium.open(
+         "tests/integration/files/1xda.pdb", atom_names=["SG"]
+        ).model
+        self.assertEqual(len(model.bonds), 12)
+        for atom in model.atoms():
+            self.assertEqual(len(atom.bonded_atoms), 1)
+            self.assertEqual(atom.bonded_atoms.pop().name, "SG")
+
+
+    def test_cif_struct_conn_is_read(self):
+        model = atomium.open("tests/integration/files/1cbn.cif").model
+        self.assertEqual(len(model.bonds), 3)
+        self.assertEqual(
+         {a.het.id for a in model.residue("A.3").atom(name="SG").bonded_atoms},
+         {"A.40"}
+        )
+        self.check_bond_lengths(model, 2.1)
+        model = atomium.open("tests/integration/files/4y60.cif").model
+        self.assertIsNone(model._bonds)
+
+
+    def test_cif_chem_comp_bond_is_read(self):
+        path = os.path.join(self.directory, "templates.cif")
+        with open("tests/integration/files/1cbn.cif") as f:
+            filestring = f.read()
+        with open(path, "w") as f:
+            f.write(filestring + "\n".join([
+             "loop_", "_chem_comp_bond.comp_id", "_chem_comp_bond.atom_id_1",
+             "_chem_comp_bond.atom_id_2", "_chem_comp_bond.value_order",
+             "THR N CA SING", "THR CA C SING", "THR C O DOUB", "THR C OXT SING",
+             "#"
+            ]) + "\n")
+        model = atomium.open(path).model
+        threonines = model.residues(name="THR")
+        self.assertEqual(len(model.bonds), 3 + 3 * len(threonines))
+        for residue in threonines:
+            c, o = residue.atom(name="C"), residue.atom(name="O")
+            self.assertEqual(c.bond_order(o), 2)
+            self.assertEqual(
+             {a.name for a in c.bonded_atoms}, {"CA", "O"}
+            )
+        self.check_bond_lengths(model, 2.1)
+
+
+    def test_mmtf_bonds_are_read(self):
+        model = atomium.open("tests/integration/files/1lol.mmtf").model
+        self.assertEqual(len(model.bonds), 3297)
+        self.assertEqual(np.bincount(model.bonds.orders).tolist(), [0, 2670, 627])
+        residue = model.residue("A.11")
+        self.assertEqual(
+         {a.name for a in residue.atom(name="CA").bonded_atoms},
+         {"N", "C", "CB"}
+        )
+        self.assertEqual(
+         residue.atom(name="C").bonded_atoms & set(residue.next.atoms()),
+         {residue.next.atom(name="N")}
+        )
+        self.check_bond_lengths(model, 2)
+
+
+    def test_mmtf_bonds_are_shared_by_ensembles(self):
+        f = atomium.open("tests/integration/files/5xme.mmtf")
+        self.assertEqual(len(f.models[0].bonds), len(f.models[7].bonds))
+        self.check_bond_lengths(f.models[7], 2.1)
+        model = atomium.open(
+         "tests/integration/files/1lol.mmtf", atom_names=["CA"]
+        ).model
+        self.assertIsNone(model._bonds)
+
+
+    def test_perceived_bonds_match_mmtf_bonds(self):
+        def bond_names(model):
+            atoms = [(a.het.id, a.name) for a in model.bonds.atoms]
+            return {frozenset((atoms[i], atoms[j]))
+             for i, j in model.bonds.pairs.tolist()}
+        mmtf = atomium.open("tests/integration/files/1lol.mmtf").model
+        model = atomium.open("tests/integration/files/1lol.pdb").model
+        model.perceive_bonds()
+        self.assertEqual(bond_names(model), bond_names(mmtf))
+        self.check_bond_lengths(model, 2)
+
+
+    def test_perceived_bonds_keep_read_orders(self):
+        model = atomium.open("tests/integration/files/1lol.mmtf").model
+        model.perceive_bonds()
+        self.assertEqual(len(model.bonds), 3297)
+        self.assertEqual(np.bincount(model.bonds.orders).tolist(), [0, 2670, 627])
+        model = atomium.open("tests/integration/files/1lol.mmtf").model
+        model.perceive_bonds(tolerance=0)
+        self.assertEqual(len(model.bonds), 3297)
+
+
+    def test_perceived_bonds_only_exclude_atoms_in_the_same_het(self):
+        atoms = [
+         atomium.Atom("C", x, 0, 0, i, "C", 0, 0, [0] * 6)
+         for i, x in enumerate([0, 1.5, 3])
+        ]
+        model = atomium.Model(atomium.Ligand(*atoms, id="A.1", name="LIG"))
+        model.perceive_bonds()
+        self.assertEqual(len(model.bonds), 0)
+        for atom in atoms: atom._het = None
+        model.perceive_bonds()
+        self.assertEqual(len(model.bonds), 2)
+        self.assertEqual(atoms[1].bonded_atoms, {atoms[0], atoms[2]})
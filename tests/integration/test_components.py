@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import atomium
+from atomium.components import build_component_store
+from unittest import TestCase
+from unittest.mock import patch
+
+class ComponentStoreTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "components.store")
+        build_component_store(
+         "tests/integration/files/components.cif", self.path
+        )
+
+
+    def tearDown(self):
+        atomium.use_components(None)
+        shutil.rmtree(self.directory)
+
+
+    def test_can_look_up_components(self):
+        store = atomium.open_components(self.path)
+        self.assertEqual(repr(store), "<ComponentStore (3 components)>")
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.ids, ["ALA", "MSE", "ZN"])
+        self.assertIn("MSE", store)
+        self.assertNotIn("HOH", store)
+        self.assertEqual(store.name("ZN"), "ZINC ION")
+        self.assertEqual(store.type("MSE"), "L-PEPTIDE LINKING")
+        self.assertEqual(store.code("MSE"), "M")
+        self.assertIsNone(store.code("ZN"))
+        self.assertEqual(store.parent("MSE"), "MET")
+        self.assertIsNone(store.parent("ALA"))
+        self.assertEqual(store.atoms("ZN"), [("ZN", "ZN", 2)])
+        self.assertEqual(len(store.atoms("ALA")), 13)
+        self.assertEqual(store.bonds("MSE")[3], ("C", "O", 2))
+        self.assertEqual(len(store.bonds("ALA")), 12)
+        self.assertEqual(store.bonds("ZN"), [])
+        with self.assertRaises(KeyError):
+            store.name("HOH")
+
+
+    def test_lookups_search_sorted_ids(self):
+        store = atomium.open_components(self.path)
+        with patch.object(
+         type(store), "__iter__", side_effect=AssertionError("Decoded IDs")
+        ):
+            for id in ["ALA", "MSE", "ZN"]:
+                self.assertIn(id, store)
+            for id in ["", "AAA", "AL", "ALAA", "MS", "NA", "ZN2", "ZZZ", 1]:
+                self.assertNotIn(id, store)
+            self.assertEqual(store.name("ALA"), "ALANINE")
+            self.assertEqual(store.parent("MSE"), "MET")
+            self.assertEqual(store.name("ZN"), "ZINC ION")
+            for id in ["AAA", "NA", "ZZZ"]:
+                with self.assertRaises(KeyError):
+                    store.name(id)
+
+
+    def test_can_build_store_from_compressed_dictionary(self):
+        import gzip
+        path = os.path.join(self.directory, "components.cif.gz")
+        with open("tests/integration/files/components.cif", "rb") as f:
+            with gzip.open(path, "wb") as g: g.write(f.read())
+        store_path = os.path.join(self.directory, "gzip.store")
+        self.assertEqual(build_component_store(path, store_path), 3)
+        self.assertEqual(
+         atomium.open_components(store_path).bonds("ALA"),
+         atomium.open_components(self.path).bonds("ALA")
+        )
+
+
+    def test_other_files_are_rejected(self):
+        model = atomium.open("tests/integration/files/1lol.pdb").model
+        snapshot = os.path.join(self.directory, "model.snap")
+        model.to_snapshot(snapshot)
+        with self.assertRaises(ValueError):
+            atomium.open_components(snapshot)
+        with self.assertRaises(ValueError):
+            atomium.load_snapshot(self.path)
+
+
+    def test_store_gives_names_and_codes(self):
+        residue = atomium.Residue(name="MSE")
+        self.assertEqual(residue.code, "X")
+        self.assertEqual(residue.full_name, "MSE")
+        atomium.use_components(self.path)
+        self.assertEqual(residue.code, "M")
+        self.assertEqual(residue.full_name, "SELENOMETHIONINE")
+        self.assertEqual(atomium.Residue(name="ALA").full_name, "alanine")
+        self.assertEqual(atomium.Ligand(name="ZN").full_name, "ZINC ION")
+        self.assertEqual(atomium.Residue(name="ZN").code, "X")
+        atomium.use_components(None)
+        self.assertEqual(residue.code, "X")
+
+
+    def test_store_gives_bonds_when_reading_files(self):
+        atomium.use_components(self.path)
+        for filename in ["1lol.pdb", "1lol.cif"]:
+            model = atomium.open("tests/integration/files/" + filename).model
+            residues = model.residues(name="ALA")
+            conect_bonds = 62 if filename.endswith("pdb") else 0
+            self.assertEqual(len(model.bonds), conect_bonds + 4 * len(residues))
+            for residue in residues:
+                c, o = residue.atom(name="C"), residue.atom(name="O")
+                self.assertEqual(c.bond_order(o), 2)
+                self.assertEqual(
+                 {a.name for a in residue.atom(name="CA").bonded_atoms},
+                 {"N", "C", "CB"}
+                )
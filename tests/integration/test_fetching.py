@@ -0,0 +1,192 @@
+import os
+import gzip
+import asyncio
+import shutil
+import tempfile
+import threading
+import atomium
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves files from the integration files directory, failing the first
+    request for any path beginning /flaky/ with a 503. Files have ETags, and
+    requests carrying a matching one get a 304."""
+
+    failed, requests = set(), []
+
+    def do_GET(self):
+        path = self.path
+        if path.startswith("/flaky/"):
+            if path not in self.failed:
+                self.failed.add(path)
+                self.send_response(503)
+                self.end_headers()
+                return
+            path = path[6:]
+        location = os.path.join("tests/integration/files", path.lstrip("/"))
+        if not os.path.isfile(location):
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.requests.append(path)
+        etag = '"{}"'.format(os.path.getsize(location))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        with open(location, "rb") as f: body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, *args):
+        pass
+
+
+
+class FetchingTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = "http://127.0.0.1:{}/".format(cls.server.server_address[1])
+
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+
+    def setUp(self):
+        self.settings = dict(atomium.utilities.FETCH_SETTINGS)
+        atomium.configure_fetching(backoff=0)
+        StandInHandler.failed.clear()
+        StandInHandler.requests.clear()
+
+
+    def tearDown(self):
+        atomium.configure_fetching(**self.settings)
+
+
+    def test_can_fetch_from_server(self):
+        for ext in ["cif", "mmtf", "pdb"]:
+            f = atomium.fetch(self.url + "1lol." + ext)
+            self.assertEqual(f.code, "1LOL")
+            self.assertEqual(len(f.model.chains()), 2)
+
+
+    def test_can_fetch_many(self):
+        urls = [self.url + name for name in [
+         "1lol.cif", "5xme.pdb", "1lol.mmtf", "1cbn.cif"
+        ]]
+        files = atomium.fetch_many(urls, concurrency=3)
+        self.assertEqual([f.code for f in files], ["1LOL", "5XME", "1LOL", "1CBN"])
+
+
+    def test_can_fetch_many_file_dicts(self):
+        dicts = atomium.fetch_many(
+         [self.url + "1lol.cif", self.url + "1lol.pdb"], file_dict=True
+        )
+        self.assertEqual(dicts[0]["entry"], [{"id": "1LOL"}])
+        self.assertTrue(dicts[1]["HEADER"][0].endswith("1LOL"))
+
+
+    def test_can_fetch_async(self):
+        async def fetch_all():
+            return await asyncio.gather(*[atomium.fetch_async(
+             self.url + name
+            ) for name in ["1lol.cif", "5xme.pdb", "1lol.mmtf"]])
+        files = asyncio.run(fetch_all())
+        self.assertEqual([f.code for f in files], ["1LOL", "5XME", "1LOL"])
+
+
+    def test_can_fetch_async_into_process_pool(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            async def fetch_all():
+                return await asyncio.gather(
+                 atomium.fetch_async(self.url + "1lol.mmtf", executor=executor),
+                 atomium.open_async(
+                  "tests/integration/files/1lol.mmtf", executor=executor
+                 )
+                )
+            f1, f2 = asyncio.run(fetch_all())
+        self.assertEqual(f1.model, f2.model)
+        self.assertEqual(len(f1.model.chains()), 2)
+
+
+    def test_failed_requests_are_retried(self):
+        f = atomium.fetch(self.url + "flaky/1lol.cif")
+        self.assertEqual(f.code, "1LOL")
+
+
+    def test_retries_can_be_turned_off(self):
+        atomium.configure_fetching(retries=0)
+        with self.assertRaises(ValueError):
+            atomium.fetch(self.url + "flaky/1lol.pdb")
+
+
+    def test_missing_file_raises_error(self):
+        with self.assertRaises(ValueError):
+            atomium.fetch(self.url + "9zzz.cif")
+
+
+
+class CachedFetchingTests(FetchingTests):
+
+    def setUp(self):
+        FetchingTests.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        atomium.configure_fetching(cache=os.path.join(self.directory, "cache"))
+
+
+    def tearDown(self):
+        FetchingTests.tearDown(self)
+        shutil.rmtree(self.directory)
+
+
+    def test_cached_files_are_revalidated(self):
+        f1 = atomium.fetch(self.url + "1lol.mmtf")
+        f2 = atomium.fetch(self.url + "1lol.mmtf")
+        self.assertEqual(f1.model, f2.model)
+        self.assertEqual(StandInHandler.requests, ["/1lol.mmtf", "/1lol.mmtf"])
+        cached = os.listdir(os.path.join(self.directory, "cache"))
+        self.assertEqual(len(cached), 2)
+
+
+    def test_can_fetch_cached_files_offline(self):
+        f1 = atomium.fetch(self.url + "1lol.pdb")
+        atomium.configure_fetching(offline=True)
+        f2 = atomium.fetch(self.url + "1lol.pdb")
+        self.assertEqual(f1.model, f2.model)
+        self.assertEqual(StandInHandler.requests, ["/1lol.pdb"])
+        with self.assertRaises(ValueError):
+            atomium.fetch(self.url + "1lol.cif")
+
+
+    def test_can_fetch_from_mirror(self):
+        for name, path in [
+         ("1lol.cif", "divided/mmCIF/lo/1lol.cif.gz"),
+         ("1lol.pdb", "divided/pdb/lo/pdb1lol.ent.gz")
+        ]:
+            path = os.path.join(self.directory, "mirror", path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open("tests/integration/files/" + name, "rb") as f:
+                with gzip.open(path, "wb") as g: g.write(f.read())
+        atomium.configure_fetching(
+         mirror=os.path.join(self.directory, "mirror"), offline=True
+        )
+        cif, pdb = atomium.fetch("1LOL"), atomium.fetch("1lol.pdb")
+        self.assertEqual(cif.code, "1LOL")
+        self.assertEqual(pdb.code, "1LOL")
+        self.assertEqual(len(pdb.model.chains()), 2)
+        with self.assertRaises(ValueError):
+            atomium.fetch("5XME")
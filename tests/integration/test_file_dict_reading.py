@@ -1,3 +1,9 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
 import atomium
 from unittest import TestCase
 
@@ -89,4 +95,130 @@ class PdbFileDictReadingTests(TestCase):
         self.assertEqual(
          d["MODEL"][1][4],
          "ATOM      5  CB  ALA A 199      36.093  -8.556  -1.452  1.00  0.00           C"
-        )
\ No newline at end of file
+        )
+
+
+class UnknownExtensionFileDictReadingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def check_file_dict_without_extension(self, filename):
+        path = os.path.join(self.directory, filename.split(".")[0])
+        shutil.copy("tests/integration/files/" + filename, path)
+        d1 = atomium.open("tests/integration/files/" + filename, file_dict=True)
+        d2 = atomium.open(path, file_dict=True)
+        self.assertEqual(d1, d2)
+
+
+    def test_cif_file_dict(self):
+        self.check_file_dict_without_extension("1lol.cif")
+
+
+    def test_mmtf_file_dict(self):
+        self.check_file_dict_without_extension("1lol.mmtf")
+
+
+    def test_pdb_file_dict(self):
+        self.check_file_dict_without_extension("1lol.pdb")
+
+
+
+class CompressedFileDictReadingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def check_compressed_file_dicts(self, compress, ending):
+        for filename in ["1lol.cif", "1lol.mmtf", "1lol.pdb"]:
+            with open("tests/integration/files/" + filename, "rb") as f:
+                compressed = compress(f.read())
+            d1 = atomium.open("tests/integration/files/" + filename, file_dict=True)
+            for name in [filename + ending, filename.split(".")[0]]:
+                path = os.path.join(self.directory, name)
+                with open(path, "wb") as f: f.write(compressed)
+                d2 = atomium.open(path, file_dict=True)
+                self.assertEqual(d1, d2)
+
+
+    def test_gzip_file_dicts(self):
+        self.check_compressed_file_dicts(gzip.compress, ".gz")
+
+
+    def test_bz2_file_dicts(self):
+        self.check_compressed_file_dicts(bz2.compress, ".bz2")
+
+
+    def test_xz_file_dicts(self):
+        self.check_compressed_file_dicts(lzma.compress, ".xz")
+
+
+    def test_zstd_file_dicts(self):
+        try:
+            import zstandard
+        except ImportError: self.skipTest("zstandard is not installed")
+        compress = zstandard.ZstdCompressor().compress
+        self.check_compressed_file_dicts(compress, ".zst")
+
+
+    def test_compressed_file_parses_to_model(self):
+        path = os.path.join(self.directory, "1lol.pdb.gz")
+        with open("tests/integration/files/1lol.pdb", "rb") as f:
+            with gzip.open(path, "wb") as g: g.write(f.read())
+        pdb = atomium.open(path)
+        self.assertEqual(pdb.code, "1LOL")
+        self.assertEqual(len(pdb.model.chains()), 2)
+
+
+
+class CrlfFileReadingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def make_crlf_copy(self, filename):
+        path = os.path.join(self.directory, filename)
+        with open("tests/integration/files/" + filename, "rb") as f:
+            lines = f.read().split(b"\n")
+        with open(path, "wb") as f: f.write(b"\r\n".join(lines))
+        return path
+
+
+    def test_crlf_files_can_be_read(self):
+        for filename in ["1lol.cif", "1lol.pdb", "5xme.cif"]:
+            path = self.make_crlf_copy(filename)
+            original = "tests/integration/files/" + filename
+            self.assertEqual(
+             atomium.open(path, file_dict=True),
+             atomium.open(original, file_dict=True)
+            )
+            f = atomium.open(original)
+            self.assertEqual(atomium.open(path).model, f.model)
+            models = list(atomium.iter_models(path))
+            self.assertEqual(len(models), len(f.models))
+            self.assertEqual(models[-1], f.models[-1])
+
+
+    def test_crlf_component_dictionaries_can_be_read(self):
+        from atomium.components import build_component_store
+        path = self.make_crlf_copy("components.cif")
+        store_path = os.path.join(self.directory, "components.store")
+        self.assertEqual(build_component_store(path, store_path), 3)
+        store = atomium.open_components(store_path)
+        self.assertEqual(store.type("MSE"), "L-PEPTIDE LINKING")
+        self.assertEqual(store.bonds("ALA")[6], ("C", "O", 2))
@@ -1,5 +1,8 @@
 import atomium
 import os
+import gzip
+import struct
+import msgpack
 from unittest import TestCase
 
 class SavingTest(TestCase):
@@ -20,6 +23,10 @@ class SavingTest(TestCase):
         f.model.save("tests/integration/files/saved_" + filename)
         f2 = atomium.open("tests/integration/files/saved_" + filename)
         self.assertEqual(f.model, f2.model)
+        self.assertEqual(
+         sorted((a.id, a.occupancy) for a in f.model.atoms()),
+         sorted((a.id, a.occupancy) for a in f2.model.atoms())
+        )
         self.assertEqual(len(f.model.chains()), len(f2.model.chains()))
         for chain1, chain2 in zip(sorted(f.model.chains(), key=lambda c: c.id),
          sorted(f2.model.chains(), key=lambda c: c.id)):
@@ -33,6 +40,16 @@ class SavingTest(TestCase):
             self.assertEqual(lig1, lig2)
 
 
+    def check_compressed_file_saving(self, filename):
+        f = atomium.open("tests/integration/files/" + filename)
+        f.model.save("tests/integration/files/saved_" + filename + ".gz")
+        with gzip.open("tests/integration/files/saved_" + filename + ".gz") as g:
+            contents = g.read()
+        if not filename.endswith(".mmtf"): contents = contents.decode()
+        f2 = atomium.utilities.parse_string(contents, filename)
+        self.assertEqual(f.model, f2.model)
+
+
 
 class MmcifFileSavingTests(SavingTest):
 
@@ -60,6 +77,22 @@ class MmcifFileSavingTests(SavingTest):
         self.check_file_saving("4y60.cif")
 
 
+    def test_can_save_compressed(self):
+        self.check_compressed_file_saving("1lol.cif")
+
+
+    def test_chains_share_entities(self):
+        f = atomium.open("tests/integration/files/1lol.cif")
+        f.model.save("tests/integration/files/saved_1lol.cif")
+        d = atomium.open("tests/integration/files/saved_1lol.cif", file_dict=True)
+        self.assertEqual([e["type"] for e in d["entity"]], [
+         "polymer", "non-polymer", "non-polymer", "water"
+        ])
+        self.assertEqual([s["entity_id"] for s in d["struct_asym"]], [
+         "1", "1", "2", "3", "2", "3", "4", "4"
+        ])
+
+
     def test_chain(self):
         f = atomium.open("tests/integration/files/1lol.cif")
         f.model.chain("A").save("tests/integration/files/chaina.cif")
@@ -101,6 +134,67 @@ class MmtfFileSavingTests(SavingTest):
         self.check_file_saving("4y60.mmtf")
 
 
+    def test_can_save_compressed(self):
+        self.check_compressed_file_saving("1lol.mmtf")
+
+
+    def test_saved_file_uses_binary_codecs(self):
+        f = atomium.open("tests/integration/files/1lol.mmtf")
+        f.model.save("tests/integration/files/saved_1lol.mmtf")
+        with open("tests/integration/files/saved_1lol.mmtf", "rb") as g:
+            raw = msgpack.unpackb(g.read())
+        for key, codec in [[b"xCoordList", 10], [b"bFactorList", 10],
+         [b"atomIdList", 8], [b"altLocList", 6], [b"occupancyList", 9],
+         [b"groupIdList", 8], [b"groupTypeList", 4], [b"chainIdList", 5]]:
+            self.assertEqual(struct.unpack(">i", raw[key][:4])[0], codec)
+        self.assertLess(
+         os.path.getsize("tests/integration/files/saved_1lol.mmtf"),
+         os.path.getsize("tests/integration/files/1lol.mmtf")
+        )
+
+
+    def test_group_definitions_are_shared(self):
+        f = atomium.open("tests/integration/files/1lol.mmtf")
+        f.model.save("tests/integration/files/saved_1lol.mmtf")
+        d = atomium.open(
+         "tests/integration/files/saved_1lol.mmtf", file_dict=True
+        )
+        hets = f.model.residues() | f.model.ligands() | f.model.waters()
+        self.assertEqual(len(d["groupList"]), len(set((h.name, tuple(
+         a.name for a in sorted(h.atoms(), key=lambda a: a.id)
+        )) for h in hets)))
+        self.assertEqual(len(d["groupTypeList"]), len(hets))
+        self.assertEqual(d["groupsPerChain"][-2:], [
+         len(f.model.waters(chain__id=c)) for c in "AB"
+        ])
+
+
+    def test_chains_share_entities(self):
+        f = atomium.open("tests/integration/files/1lol.mmtf")
+        f.model.save("tests/integration/files/saved_1lol.mmtf")
+        d = atomium.open(
+         "tests/integration/files/saved_1lol.mmtf", file_dict=True
+        )
+        self.assertEqual([[e["type"], e["chainIndexList"]] for e in d[
+         "entityList"
+        ]], [
+         ["polymer", [0, 1]], ["non-polymer", [2, 4]],
+         ["non-polymer", [3, 5]], ["water", [6, 7]]
+        ])
+
+
+    def test_binary_codecs_round_trip(self):
+        from atomium.mmtf import encode_binary_field, parse_binary_field
+        for values, codec, param in [
+         [[1.234, -40000.5, 40000.123, 0, 32.767, -32.768], 10, 1000],
+         [[1, 2, 3, 4, 10, 11, 12, -5], 8, 0], [[1, 1, 0.5, 0.5, 1], 9, 100],
+         [["", "", "A", "B", "B", ""], 6, 0], [[0, 5, -3, 100000], 4, 0],
+         [[-1, 0, 1, 7], 2, 0], [["A", "BB", "CCCC"], 5, 4]]:
+            self.assertEqual(list(parse_binary_field(
+             encode_binary_field(values, codec, param)
+            )), values)
+
+
     def test_chain(self):
         f = atomium.open("tests/integration/files/1lol.mmtf")
         f.model.chain("A").save("tests/integration/files/chaina.mmtf")
@@ -142,6 +236,10 @@ class PdbFileSavingTests(SavingTest):
         self.check_file_saving("4y60.pdb")
 
 
+    def test_can_save_compressed(self):
+        self.check_compressed_file_saving("1lol.pdb")
+
+
     def test_chain(self):
         f = atomium.open("tests/integration/files/1lol.pdb")
         f.model.chain("A").save("tests/integration/files/chaina.pdb")
@@ -154,3 +252,79 @@ class PdbFileSavingTests(SavingTest):
         model = f.generate_assembly(5)
         with self.assertWarns(Warning):
             model.save("tests/integration/files/assembly.cif")
+
+
+
+class MultiModelSavingTests(SavingTest):
+
+    def check_models_saving(self, filename, ext):
+        f = atomium.open("tests/integration/files/" + filename)
+        min(f.models[3].atoms(), key=lambda a: a.id).move_to(1, 2, 3)
+        f.save("tests/integration/files/saved_models." + ext)
+        self.assertEqual(sorted(f.models._models), [0, 3])
+        f2 = atomium.open("tests/integration/files/saved_models." + ext)
+        self.assertEqual(len(f2.models), len(f.models))
+        for index in [0, 3, 9]:
+            model1, model2 = f.models[index], f2.models[index]
+            self.assertEqual(model1, model2)
+            self.assertEqual(
+             [[r.id for r in c.residues()] for c in model1.chains()],
+             [[r.id for r in c.residues()] for c in model2.chains()]
+            )
+        self.assertEqual(
+         min(f2.models[3].atoms(), key=lambda a: a.id).location, (1, 2, 3)
+        )
+
+
+    def test_can_save_ensembles(self):
+        for source in ["cif", "mmtf", "pdb"]:
+            for ext in ["cif", "mmtf", "pdb"]:
+                self.check_models_saving("5xme." + source, ext)
+
+
+    def test_can_save_models_with_different_atoms(self):
+        models = [atomium.open("tests/integration/files/5xme.pdb").model]
+        models.append(atomium.open(
+         "tests/integration/files/5xme.pdb", atom_names=["CA"], models=[2]
+        ).model)
+        for ext in ["cif", "mmtf", "pdb"]:
+            path = "tests/integration/files/saved_models." + ext
+            atomium.save_models(models, path)
+            f2 = atomium.open(path)
+            self.assertIsInstance(f2.models, list)
+            self.assertEqual(
+             [len(m.atoms()) for m in f2.models], [len(m.atoms()) for m in models]
+            )
+
+
+    def test_can_save_coordinate_frames(self):
+        f = atomium.open("tests/integration/files/5xme.pdb")
+        model = f.model
+        frames = (f.coordinates[i] + 1 for i in range(3))
+        path = "tests/integration/files/saved_frames.pdb.gz"
+        atomium.save_models([model, *frames], path)
+        f2 = atomium.open(path)
+        self.assertEqual(len(f2.models), 4)
+        self.assertEqual(f2.coordinates[0].tolist(), f.coordinates[0].tolist())
+        for index in range(3):
+            self.assertTrue((
+             abs(f2.coordinates[index + 1] - f.coordinates[index] - 1) < 1e-6
+            ).all())
+        with self.assertRaises(ValueError):
+            atomium.save_models([model, f.coordinates[0][:10]], path)
+
+
+    def test_file_can_be_written_to_handle(self):
+        f = atomium.open("tests/integration/files/5xme.mmtf")
+        path = "tests/integration/files/saved_models.pdb"
+        with open(path, "w") as handle:
+            f.write(handle, "pdb")
+        with open(path) as handle: lines = handle.read().splitlines()
+        self.assertEqual(
+         [l[:14] for l in lines if l.startswith("MODEL")],
+         ["MODEL        {}".format(i) if i < 10 else "MODEL       10"
+          for i in range(1, 11)]
+        )
+        self.assertEqual(lines.count("ENDMDL"), 10)
+        with self.assertRaises(ValueError):
+            f.save("tests/integration/files/saved_models.xyz")
@@ -1,5 +1,11 @@
 from datetime import date
+import os
 import math
+import gzip
+from collections.abc import Sequence
+import shutil
+import tempfile
+import numpy as np
 import atomium
 from unittest import TestCase
 
@@ -396,6 +402,18 @@ class DeNovoStructureTests(TestCase):
         self.assertIs(chain1.model, model)
         self.assertIs(copper.model, model)
 
+        # The model's bonds are in one table
+        self.assertIs(model.bonds, atom1._bonds)
+        self.assertEqual(len(model.bonds), 17)
+        self.assertEqual(model.bonds.fragments(), [{
+         atom1, atom2, atom3, atom4, atom5, atom6, atom7, atom8, atom9, atom10,
+         atom11, atom12, atom13, atom14, atom15, atom16, atom17, atom18
+        }])
+        self.assertEqual(model.bonds.graph_distance(atom1, atom18), 9)
+        copper_atom = list(copper.atoms())[0]
+        copper_atom.bond(list(hoh1.atoms())[0])
+        self.assertIs(copper_atom._bonds, model.bonds)
+
         # Now that atoms are in a model, find nearby things
         self.assertEqual(atom2.nearby_atoms(1.5), {atom1, atom3, atom4})
         self.assertEqual(atom4.nearby_atoms(1.5), {atom2, atom5, atom6})
@@ -716,3 +734,399 @@ class FileReadingTests(TestCase):
                  f.model.residue("B.6").full_name,
                  "(2R,3AS,4AR,5AR,5BS)-2-(6-AMINO-9H-PURIN-9-YL)-3A-HYDROXYHEXAHYDROCYCLOPROPA[4,5]CYCLOPENTA[1,2-B]FURAN-5A(4H)-YL DIHYDROGEN PHOSPHATE"
                 )
+
+
+
+class ArrayStructureTests(TestCase):
+
+    def test_can_build_model_from_arrays(self):
+        model = atomium.Model.from_arrays(
+         [[0, 0, 0], [1.5, 0, 0], [3, 0, 0], [4.5, 0, 0], [9, 9, 9], [5, 5, 5]],
+         ["N", "C", "N", "C", "O", "ZN"], ["N", "CA", "N", "CA", "O", "ZN"],
+         ["A.1", "A.1", "A.2", "A.2", "A.100", "A.101"],
+         ["A", "A", "A", "A", "A", "A"],
+         res_names=["GLY", "GLY", "ALA", "ALA", "HOH", "ZN"],
+         kinds=["polymer"] * 4 + ["water", "non-polymer"],
+         bvalues=[1, 2, 3, 4, 5, 6], charges=[0, 0, 0, 0, 0, 2],
+         sequences={"A": "GAG"}, helices=[["A.1", "A.2"]]
+        )
+        chain = model.chain()
+        self.assertEqual(chain.id, "A")
+        self.assertEqual(chain.internal_id, "A")
+        self.assertEqual(chain.sequence, "GAG")
+        self.assertEqual([r.id for r in chain], ["A.1", "A.2"])
+        self.assertEqual([r.name for r in chain], ["GLY", "ALA"])
+        self.assertIs(chain[0].next, chain[1])
+        self.assertEqual(chain.helices, ([chain[0], chain[1]],))
+        self.assertEqual(chain[0].full_name, "glycine")
+        self.assertEqual(
+         {a.id: a.location for a in chain[1].atoms()},
+         {3: (3, 0, 0), 4: (4.5, 0, 0)}
+        )
+        self.assertEqual(model.water().id, "A.100")
+        self.assertIs(model.water().chain, chain)
+        zinc = model.ligand()
+        self.assertEqual(zinc.name, "ZN")
+        self.assertEqual(zinc.atom().charge, 2)
+        self.assertEqual(zinc.atom().bvalue, 6)
+        self.assertEqual(zinc.atom().anisotropy, [0] * 6)
+        self.assertEqual(zinc.atom().occupancy, 1)
+
+
+    def test_groups_need_not_be_contiguous(self):
+        model = atomium.Model.from_arrays(
+         np.array([[0, 0, 0], [1, 0, 0], [2, 0, 0], [3, 0, 0]]),
+         np.array(["C", "C", "C", "C"]), np.array(["CA", "CA", "CB", "CB"]),
+         np.array(["A.1", "B.1", "A.1", "B.1"]), np.array(["A", "B", "A", "B"]),
+         atom_ids=np.array([10, 20, 11, 21])
+        )
+        self.assertEqual([c.id for c in model.chains()], ["A", "B"])
+        self.assertEqual(
+         {a.id for a in model.chain("A").atoms()}, {10, 11}
+        )
+        self.assertIsInstance(model.chain("A").residue().atom(10).id, int)
+
+
+    def test_first_alt_loc_is_kept(self):
+        model = atomium.Model.from_arrays(
+         [[0, 0, 0], [1, 0, 0], [1.1, 0, 0], [2, 0, 0], [3, 0, 0]],
+         ["C"] * 5, ["CA", "CB", "CB", "CG", "CA"],
+         ["A.1", "A.1", "A.1", "A.1", "A.2"], ["A"] * 5,
+         occupancies=[1, 0.4, 0.6, 1, 0.5], alt_locs=[None, "B", "A", None, "A"]
+        )
+        self.assertEqual(
+         {a.id for a in model.residue("A.1").atoms()}, {1, 3, 4}
+        )
+        self.assertEqual({a.id for a in model.residue("A.2").atoms()}, {5})
+
+
+    def test_fast_parsing_matches_data_dicts(self):
+        from atomium.utilities import get_parse_functions
+        from atomium.data import data_dict_to_file
+        def describe(model):
+            atoms = lambda s: sorted((
+             a.id, a.name, a.element, a.location, a.bvalue, a.charge,
+             a.occupancy, tuple(a.anisotropy)
+            ) for a in s.atoms())
+            return [(
+             c.id, c.internal_id, c.sequence, [r.id for r in c],
+             [[r.id for r in h] for h in c.helices], [[
+              r.id for r in s] for s in c.strands],
+             [(r.name, r.full_name, atoms(r)) for r in c]
+            ) for c in sorted(model.chains(), key=lambda c: c.id)] + [(
+             l.id, l.name, l.full_name, l.internal_id, l.is_water,
+             l.chain and l.chain.id, atoms(l)
+            ) for l in sorted(
+             model.ligands() | model.waters(), key=lambda l: l.id
+            )]
+        for name in ["1lol.cif", "1lol.pdb", "1cbn.cif", "1cbn.pdb", "5xme.pdb",
+         "4y60.cif", "1m4x.pdb", "1lol.mmtf", "5xme.mmtf",
+         "4y60.mmtf"]:
+            mode = "rb" if name.endswith("mmtf") else "r"
+            with open("tests/integration/files/" + name, mode) as f:
+                filestring = f.read()
+            f1 = atomium.utilities.parse_string(filestring, name)
+            file_func, data_func = get_parse_functions(filestring, name)
+            f2 = data_dict_to_file(data_func(file_func(filestring)), "x")
+            self.assertEqual(len(f1.models), len(f2.models))
+            for model1, model2 in zip(f1.models, f2.models):
+                self.assertEqual(describe(model1), describe(model2))
+
+
+    def test_alt_loc_policies(self):
+        columns = dict(
+         coords=[[0, 0, 0], [1, 0, 0], [1.1, 0, 0], [1.2, 0, 0], [3, 0, 0]],
+         elements=["C"] * 5, names=["CA", "CB", "CB", "CB", "CA"],
+         res_ids=["A.1", "A.1", "A.1", "A.1", "A.2"], chain_ids=["A"] * 5,
+         occupancies=[1, 0.2, 0.5, 0.3, 0.5], alt_locs=[None, "A", "B", "C", "B"],
+        )
+        for policy, ids in [
+         ("first", {1, 2, 5}), ("occupancy", {1, 3, 5}), ("C", {1, 4, 5}),
+         ("all", {1, 2, 5})
+        ]:
+            model = atomium.Model.from_arrays(**columns, alt_loc=policy)
+            self.assertEqual({a.id for a in model.atoms()}, ids)
+        atom = model.atom(2)
+        self.assertEqual(atom.alt_locs, {
+         "A": (1, 0, 0, 0.2, None), "B": (1.1, 0, 0, 0.5, None),
+         "C": (1.2, 0, 0, 0.3, None)
+        })
+        self.assertEqual(model.atom(5).alt_locs, {})
+        self.assertEqual(model.use_alt_loc("C"), 1)
+        self.assertEqual(atom.location, (1.2, 0, 0))
+        self.assertEqual(atom.occupancy, 0.3)
+        with self.assertRaises(ValueError):
+            atomium.Model.from_arrays(**columns, alt_loc="best")
+
+
+
+class AltLocReadingTests(TestCase):
+
+    def test_alt_loc_policies_agree_across_parsers(self):
+        from atomium.utilities import get_parse_functions
+        from atomium.data import data_dict_to_file
+        for ext in ["cif", "pdb"]:
+            path = "tests/integration/files/1cbn." + ext
+            with open(path) as f: filestring = f.read()
+            file_func, data_func = get_parse_functions(filestring, path)
+            data_dict = data_func(file_func(filestring))
+            for policy in ["first", "occupancy", "B", "all"]:
+                model1 = atomium.open(path, alt_loc=policy).model
+                model2 = data_dict_to_file(data_dict, ext, alt_loc=policy).model
+                atoms1 = sorted(model1.atoms(), key=lambda a: a.id)
+                atoms2 = sorted(model2.atoms(), key=lambda a: a.id)
+                self.assertEqual(atoms1, atoms2)
+                self.assertEqual(
+                 [a.alt_locs for a in atoms1], [a.alt_locs for a in atoms2]
+                )
+
+
+    def test_can_switch_conformers(self):
+        first = atomium.open("tests/integration/files/1cbn.cif").model
+        b = atomium.open("tests/integration/files/1cbn.cif", alt_loc="B").model
+        model = atomium.open("tests/integration/files/1cbn.cif", alt_loc="all").model
+        self.assertEqual(len(model.atoms()), len(first.atoms()))
+        atom = model.residue("A.8").atom(name="CB")
+        self.assertEqual(set(atom.alt_locs), {"A", "B"})
+        self.assertEqual(atom.location, first.atom(atom.id).location)
+        self.assertGreater(model.use_alt_loc("B"), 0)
+        self.assertEqual(
+         atom.location, b.residue("A.8").atom(name="CB").location
+        )
+        self.assertEqual(model.use_alt_loc("Z"), 0)
+
+
+    def test_mmtf_alt_locs_match_mmcif(self):
+        for policy in ["first", "occupancy", "B"]:
+            cif = atomium.open("tests/integration/files/1cbn.cif", alt_loc=policy)
+            mmtf = atomium.open("tests/integration/files/1cbn.mmtf", alt_loc=policy)
+            self.assertEqual(
+             [(r.id, r.name, len(r.atoms())) for r in cif.model.chain()
+              if r.id not in ("A.22", "A.25")],
+             [(r.id, r.name, len(r.atoms())) for r in mmtf.model.chain()
+              if r.id not in ("A.22", "A.25")]
+            )
+
+
+    def test_mmtf_microheterogeneity(self):
+        cif = atomium.open("tests/integration/files/1cbn.cif").model
+        mmtf = atomium.open("tests/integration/files/1cbn.mmtf").model
+        self.assertEqual(len(mmtf.atoms()), 644)
+        self.assertEqual(len(mmtf.chain()), len(cif.chain()))
+        self.assertEqual(mmtf.residue("A.22").name, "PRO")
+        self.assertEqual(len(mmtf.residue("A.22").atoms()), 14)
+        self.assertEqual(mmtf.residue("A.25").name, "LEU")
+        self.assertEqual(len(mmtf.residue("A.25").atoms()), 19)
+        self.assertEqual(
+         [r.name for r in mmtf.chain()[:21]], [r.name for r in cif.chain()[:21]]
+        )
+
+
+
+class SelectionReadingTests(TestCase):
+
+    def test_can_select_chains(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            full = atomium.open("tests/integration/files/1lol." + ext).model
+            model = atomium.open(
+             "tests/integration/files/1lol." + ext, chains=["B"]
+            ).model
+            self.assertEqual([c.id for c in model.chains()], ["B"])
+            self.assertEqual(model.chain("B"), full.chain("B"))
+            self.assertEqual(
+             {l.id for l in model.ligands() | model.waters()},
+             {l.id for l in full.ligands() | full.waters() if l.chain.id == "B"}
+            )
+
+
+    def test_can_select_atom_names(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            full = atomium.open("tests/integration/files/1lol." + ext).model
+            model = atomium.open(
+             "tests/integration/files/1lol." + ext, atom_names=["CA"]
+            ).model
+            self.assertEqual(
+             {a.id for a in model.atoms()},
+             {a.id for a in full.atoms(name="CA")}
+            )
+            self.assertEqual(len(model.chain("A")), len(full.chain("A")))
+            self.assertEqual(model.chain("A").sequence, full.chain("A").sequence)
+            self.assertEqual(model.residue("A.11").atom().location,
+             full.residue("A.11").atom(name="CA").location)
+
+
+    def test_can_skip_waters_and_ligands(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            path = "tests/integration/files/1lol." + ext
+            model = atomium.open(path, skip_waters=True).model
+            self.assertEqual((len(model.ligands()), len(model.waters())), (4, 0))
+            model = atomium.open(path, skip_waters=True, skip_ligands=True).model
+            self.assertEqual((len(model.ligands()), len(model.waters())), (0, 0))
+            self.assertEqual(len(model.chains()), 2)
+
+
+    def test_can_select_models(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            path = "tests/integration/files/5xme." + ext
+            full = atomium.open(path)
+            f = atomium.open(path, models=[2, 10])
+            self.assertEqual(len(f.models), 2)
+            self.assertEqual(f.models[0], full.models[1])
+            self.assertEqual(f.models[1], full.models[9])
+            self.assertIs(f.model.file, f)
+
+
+    def test_selecting_missing_models_is_an_error(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            path = "tests/integration/files/1lol." + ext
+            with self.assertRaises(ValueError):
+                atomium.open(path, models=[2])
+            with self.assertRaises(ValueError):
+                atomium.open("tests/integration/files/5xme." + ext, models=[11, 12])
+            self.assertEqual(len(atomium.open(path, models=[1, 2]).models), 1)
+            self.assertEqual(list(atomium.iter_models(path, models=[2])), [])
+
+
+
+class ModelIterationTests(TestCase):
+
+    def test_can_iterate_over_models(self):
+        for name in ["5xme.cif", "5xme.pdb", "5xme.mmtf", "1lol.cif", "1lol.pdb",
+         "1lol.mmtf", "1cbn.cif", "1cbn.pdb", "4y60.cif"]:
+            path = "tests/integration/files/" + name
+            f = atomium.open(path)
+            models = list(atomium.iter_models(path))
+            self.assertEqual(len(models), len(f.models))
+            for model1, model2 in zip(models, f.models):
+                self.assertEqual(model1, model2)
+                self.assertEqual(
+                 sorted(model1.chains(), key=lambda c: c.id),
+                 sorted(model2.chains(), key=lambda c: c.id)
+                )
+            self.assertEqual(models[0].file.code, f.code)
+            self.assertEqual(models[0].file.title, f.title)
+            self.assertIs(models[0].file, models[-1].file)
+
+
+    def test_models_are_built_lazily(self):
+        models = atomium.iter_models("tests/integration/files/5xme.pdb")
+        model = next(models)
+        self.assertEqual(len(model.atoms()), 1827)
+        self.assertEqual(len(list(models)), 9)
+
+
+    def test_can_iterate_over_compressed_models(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "5xme.cif.gz")
+            with open("tests/integration/files/5xme.cif", "rb") as f:
+                with gzip.open(path, "wb") as g: g.write(f.read())
+            models = list(atomium.iter_models(path))
+            self.assertEqual(len(models), 10)
+            self.assertEqual(
+             models[3], atomium.open("tests/integration/files/5xme.cif").models[3]
+            )
+        finally: shutil.rmtree(directory)
+
+
+    def test_can_select_while_iterating(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            path = "tests/integration/files/5xme." + ext
+            full = atomium.open(path)
+            models = list(atomium.iter_models(
+             path, models=[2, 5], atom_names=["CA"]
+            ))
+            self.assertEqual(len(models), 2)
+            self.assertEqual(
+             {a.location for a in models[1].atoms()},
+             {a.location for a in full.models[4].atoms(name="CA")}
+            )
+
+
+
+class EnsembleReadingTests(TestCase):
+
+    def test_models_with_same_atoms_share_them(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            f = atomium.open("tests/integration/files/5xme." + ext)
+            self.assertIsInstance(f.models, atomium.data.Ensemble)
+            self.assertEqual(len(f.models), 10)
+            self.assertEqual(list(f.models._models), [0])
+            self.assertEqual(f.coordinates.shape, (10, 1827, 3))
+            self.assertFalse(f.coordinates.flags.writeable)
+            model = f.models[4]
+            self.assertIs(f.models[-6], model)
+            self.assertIs(model.file, f)
+            self.assertEqual(len(f.models[2:5]), 3)
+            with self.assertRaises(IndexError): f.models[10]
+            atoms = sorted(model.atoms(), key=lambda a: a.id)
+            self.assertEqual(
+             [a.location for a in atoms],
+             [tuple(row) for row in f.coordinates[4].tolist()]
+            )
+            self.assertEqual(len(set(model.atoms()) & set(f.model.atoms())), 0)
+
+
+    def test_ensembles_behave_like_lists(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            path = "tests/integration/files/5xme." + ext
+            f1, f2 = atomium.open(path), atomium.open(path)
+            self.assertEqual(f1.models, f2.models)
+            self.assertEqual(f1.models, list(f2.models))
+            self.assertEqual(list(f1.models), f2.models)
+            self.assertNotEqual(f1.models, f2.models[:9])
+            self.assertNotEqual(
+             f1.models, atomium.open("tests/integration/files/1lol." + ext).models
+            )
+            self.assertIsInstance(f1.models, Sequence)
+            self.assertEqual(f1.models + [f2.model], list(f1.models) + [f2.model])
+            self.assertEqual(len([f2.model] + f1.models), 11)
+            self.assertEqual(f1.models.index(f1.models[3]), 3)
+            self.assertIn(f1.models[5], f1.models)
+
+
+    def test_ensemble_models_match_independent_models(self):
+        for ext in ["cif", "pdb", "mmtf"]:
+            path = "tests/integration/files/5xme." + ext
+            f = atomium.open(path)
+            for model1, model2 in zip(atomium.iter_models(path), f.models):
+                self.assertEqual(
+                 sorted((a.id, a.name, a.location) for a in model1.atoms()),
+                 sorted((a.id, a.name, a.location) for a in model2.atoms())
+                )
+                self.assertEqual(
+                 [[r.id for r in h] for h in model1.chain().helices],
+                 [[r.id for r in h] for h in model2.chain().helices]
+                )
+
+
+    def test_models_with_different_atoms_are_built(self):
+        columns = {
+         "coords": [[0, 0, 0], [1, 0, 0]], "elements": ["N", "C"],
+         "names": ["N", "CA"], "res_ids": ["A.1", "A.1"],
+         "chain_ids": ["A", "A"]
+        }
+        ensemble = atomium.data.columns_to_models([
+         columns, {**columns, "coords": [[0, 1, 0], [1, 1, 0]]}
+        ])
+        self.assertIsInstance(ensemble, atomium.data.Ensemble)
+        self.assertEqual(ensemble.coordinates.tolist(), [
+         [[0, 0, 0], [1, 0, 0]], [[0, 1, 0], [1, 1, 0]]
+        ])
+        models = atomium.data.columns_to_models([
+         columns, {**columns, "coords": [[0, 1, 0], [1, 1, 0]]},
+         {**columns, "names": ["N", "CB"]}
+        ])
+        self.assertIsInstance(models, list)
+        self.assertEqual(len(models), 3)
+        self.assertEqual(models[1].atom(name="CA").location, (1, 1, 0))
+        self.assertIsNone(atomium.open("tests/integration/files/1lol.cif").coordinates)
+
+
+    def test_coordinates_can_be_analysed_across_models(self):
+        f = atomium.open("tests/integration/files/5xme.pdb")
+        centres = f.coordinates.mean(axis=1)
+        for centre, model in zip(centres, f.models):
+            self.assertAlmostEqual(np.linalg.norm(
+             centre - np.mean([a.location for a in model.atoms()], axis=0)
+            ), 0)
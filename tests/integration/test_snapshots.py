@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import atomium
+from atomium.snapshot import read_snapshot
+from unittest import TestCase
+
+class SnapshotTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "model.snap")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def check_snapshot_round_trip(self, filename):
+        f = atomium.open("tests/integration/files/" + filename)
+        f.model.to_snapshot(self.path)
+        model = atomium.load_snapshot(self.path)
+        self.assertEqual(model, f.model)
+        for method in ["chains", "ligands", "waters", "residues", "atoms"]:
+            self.assertEqual(
+             len(getattr(model, method)()), len(getattr(f.model, method)())
+            )
+        for chain in f.model.chains():
+            chain2 = model.chain(chain.id)
+            self.assertEqual(chain2.internal_id, chain.internal_id)
+            self.assertEqual(chain2.sequence, chain.sequence)
+            self.assertEqual(
+             [r.id for r in chain2.residues()], [r.id for r in chain.residues()]
+            )
+            self.assertEqual(
+             [[r.id for r in h] for h in chain2.helices],
+             [[r.id for r in h] for h in chain.helices]
+            )
+            for res in chain.residues():
+                res2 = chain2.residue(res.id)
+                self.assertEqual(res2.name, res.name)
+                self.assertEqual(res2.full_name, res.full_name)
+                if res.next: self.assertEqual(res2.next.id, res.next.id)
+        for ligand in f.model.ligands() | f.model.waters():
+            ligand2 = model.molecule(ligand.id)
+            self.assertEqual(ligand2.name, ligand.name)
+            self.assertEqual(ligand2.internal_id, ligand.internal_id)
+            self.assertEqual(ligand2.chain.id, ligand.chain.id)
+        atoms = {atom.id: atom for atom in model.atoms()}
+        for atom in f.model.atoms():
+            atom2 = atoms[atom.id]
+            self.assertEqual(atom2, atom)
+            self.assertEqual(atom2.het.id, atom.het.id)
+        self.assertIs(model.file.model, model)
+        for key, value in vars(f).items():
+            if key != "_models":
+                self.assertEqual(repr(getattr(model.file, key)), repr(value))
+        return model
+
+
+    def test_cif_snapshot(self):
+        self.check_snapshot_round_trip("1lol.cif")
+
+
+    def test_mmtf_snapshot(self):
+        self.check_snapshot_round_trip("1lol.mmtf")
+
+
+    def test_pdb_snapshot(self):
+        self.check_snapshot_round_trip("1lol.pdb")
+
+
+    def test_snapshot_with_anisotropy(self):
+        model = self.check_snapshot_round_trip("4y60.pdb")
+        self.assertTrue(any(any(a.anisotropy) for a in model.atoms()))
+
+
+    def test_snapshot_with_helices_and_strands(self):
+        model = self.check_snapshot_round_trip("4opj.cif")
+        self.assertTrue(any(chain.helices for chain in model.chains()))
+
+
+    def test_snapshot_with_bonds(self):
+        for filename in ["1lol.mmtf", "1lol.pdb"]:
+            f = atomium.open("tests/integration/files/" + filename)
+            model = self.check_snapshot_round_trip(filename)
+            self.assertEqual(len(model.bonds), len(f.model.bonds))
+            self.assertGreater(len(model.bonds), 0)
+            self.assertEqual(
+             sorted(model.bonds.orders.tolist()),
+             sorted(f.model.bonds.orders.tolist())
+            )
+            atoms = {atom.id: atom for atom in model.atoms()}
+            for atom in f.model.atoms():
+                self.assertEqual(
+                 {a.id for a in atoms[atom.id].bonded_atoms},
+                 {a.id for a in atom.bonded_atoms}
+                )
+                for other in atom.bonded_atoms:
+                    self.assertEqual(
+                     atoms[atom.id].bond_order(atoms[other.id]),
+                     atom.bond_order(other)
+                    )
+        model = self.check_snapshot_round_trip("1cbn.cif")
+        header, arrays = read_snapshot(self.path)
+        self.assertEqual(arrays["bond_atoms"].shape, (3, 2))
+
+
+    def test_snapshot_with_alternate_locations(self):
+        f = atomium.open("tests/integration/files/1cbn.cif", alt_loc="all")
+        model = self.check_snapshot_round_trip("1cbn.cif")
+        self.assertFalse(any(a.alt_locs for a in model.atoms()))
+        f.model.to_snapshot(self.path)
+        model = atomium.load_snapshot(self.path)
+        atoms = {atom.id: atom for atom in model.atoms()}
+        alternates = [a for a in f.model.atoms() if a.alt_locs]
+        self.assertEqual(len(alternates), 104)
+        for atom in alternates:
+            self.assertEqual(atoms[atom.id].alt_locs, atom.alt_locs)
+        self.assertEqual(model.use_alt_loc("B"), f.model.use_alt_loc("B"))
+        for atom in f.model.atoms():
+            self.assertEqual(atoms[atom.id].location, atom.location)
+            self.assertEqual(atoms[atom.id].occupancy, atom.occupancy)
+            self.assertEqual(atoms[atom.id].bvalue, atom.bvalue)
+
+
+    def test_snapshot_without_bonds(self):
+        atomium.open("tests/integration/files/4y60.cif").model.to_snapshot(
+         self.path
+        )
+        header, arrays = read_snapshot(self.path)
+        self.assertNotIn("bond_atoms", arrays)
+        self.assertIsNone(atomium.load_snapshot(self.path)._bonds)
+
+
+    def test_loaded_snapshot_can_be_modified_and_saved(self):
+        f = atomium.open("tests/integration/files/1lol.cif")
+        f.model.to_snapshot(self.path)
+        model = atomium.load_snapshot(self.path)
+        atom = model.atom(1)
+        model.translate(10, 0, 0)
+        self.assertEqual(atom.location[0], f.model.atom(1).location[0] + 10)
+        model.save(os.path.join(self.directory, "1lol.pdb"))
+        saved = atomium.open(os.path.join(self.directory, "1lol.pdb")).model
+        self.assertEqual(len(saved.atoms()), len(model.atoms()))
+
+
+    def test_model_without_file(self):
+        model = atomium.Model(atomium.Ligand(
+         atomium.Atom("C", 1, 2, 3, 1, "C1", 0, 0.5, [0] * 6), id="A.1", name="LIG"
+        ))
+        model.to_snapshot(self.path)
+        loaded = atomium.load_snapshot(self.path)
+        self.assertIsNone(loaded.file)
+        self.assertEqual(loaded, model)
+        self.assertIsNone(loaded.ligand().chain)
+
+
+    def test_arrays_are_memory_mapped(self):
+        f = atomium.open("tests/integration/files/1lol.mmtf")
+        f.model.to_snapshot(self.path)
+        header, arrays = read_snapshot(self.path)
+        self.assertEqual(arrays["coords"].shape, (3431, 3))
+        self.assertFalse(arrays["coords"].flags.writeable)
+        self.assertEqual(arrays["coords"].ctypes.data % 64, 0)
+        self.assertEqual(header["file"]["code"], "1LOL")
+        np.testing.assert_array_equal(
+         np.sort(arrays["atom_ids"]), sorted(a.id for a in f.model.atoms())
+        )
+
+
+    def test_other_files_are_rejected(self):
+        with self.assertRaises(ValueError):
+            atomium.load_snapshot("tests/integration/files/1lol.mmtf")
@@ -0,0 +1,160 @@
+import os
+import bz2
+import gzip
+import shutil
+import socket
+import tempfile
+import threading
+import paramiko
+import atomium
+from unittest import TestCase
+
+class StandInServer(paramiko.ServerInterface):
+    """Accepts a single username and password, and SFTP sessions."""
+
+    def check_auth_password(self, username, password):
+        if (username, password) == ("user", "pass"):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session": return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+
+class StandInHandle(paramiko.SFTPHandle):
+
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+
+class StandInSFTP(paramiko.SFTPServerInterface):
+    """Serves local files read-only."""
+
+    def open(self, path, flags, attr):
+        try:
+            f = open(path, "rb")
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        handle = StandInHandle(flags)
+        handle.filename, handle.readfile = path, f
+        return handle
+
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+    lstat = stat
+
+
+
+class SshFetchingTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.key = paramiko.RSAKey.generate(2048)
+        cls.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        cls.socket.bind(("127.0.0.1", 0))
+        cls.socket.listen(5)
+        cls.port = cls.socket.getsockname()[1]
+        cls.transports = []
+        cls.thread = threading.Thread(target=cls.serve)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+
+    @classmethod
+    def serve(cls):
+        while True:
+            try:
+                connection, address = cls.socket.accept()
+            except OSError: return
+            transport = paramiko.Transport(connection)
+            transport.add_server_key(cls.key)
+            transport.set_subsystem_handler(
+             "sftp", paramiko.SFTPServer, StandInSFTP
+            )
+            transport.start_server(server=StandInServer())
+            cls.transports.append(transport)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.socket.close()
+        for transport in cls.transports: transport.close()
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.transports.clear()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def make_fetcher(self):
+        return atomium.SSHFetcher(
+         "127.0.0.1", "user", password="pass", port=self.port
+        )
+
+
+    def test_can_fetch_files(self):
+        with self.make_fetcher() as fetcher:
+            for ext in ["cif", "mmtf", "pdb"]:
+                path = os.path.abspath("tests/integration/files/1lol." + ext)
+                f1 = atomium.open(path)
+                f2 = fetcher.fetch(path)
+                self.assertEqual(f1.model, f2.model)
+                self.assertEqual(f2.code, "1LOL")
+
+
+    def test_can_fetch_compressed_files(self):
+        with self.make_fetcher() as fetcher:
+            for ext, compress in [("mmtf", gzip.compress), ("pdb", bz2.compress)]:
+                path = os.path.abspath("tests/integration/files/1lol." + ext)
+                with open(path, "rb") as f: compressed = compress(f.read())
+                remote = os.path.join(self.directory, "1lol")
+                with open(remote, "wb") as f: f.write(compressed)
+                f1 = atomium.open(path)
+                f2 = fetcher.fetch(remote)
+                self.assertEqual(f1.model, f2.model)
+
+
+    def test_can_fetch_many_over_one_connection(self):
+        paths = [os.path.abspath("tests/integration/files/" + name) for name in [
+         "1lol.cif", "5xme.pdb", "1cbn.mmtf"
+        ]]
+        with self.make_fetcher() as fetcher:
+            files = fetcher.fetch_many(paths)
+        self.assertEqual([f.code for f in files], ["1LOL", "5XME", "1CBN"])
+        self.assertEqual(len(self.transports), 1)
+
+
+    def test_can_get_raw_bytes(self):
+        path = os.path.abspath("tests/integration/files/1lol.mmtf")
+        with self.make_fetcher() as fetcher:
+            body = fetcher.get(path)
+        with open(path, "rb") as f: self.assertEqual(body, f.read())
+
+
+    def test_missing_file_raises_error(self):
+        with self.make_fetcher() as fetcher:
+            with self.assertRaises(IOError):
+                fetcher.fetch(os.path.join(self.directory, "9zzz.cif"))
+
+
+    def test_wrong_password_raises_error(self):
+        with self.assertRaises(paramiko.AuthenticationException):
+            atomium.SSHFetcher("127.0.0.1", "user", password="x", port=self.port)
@@ -0,0 +1,199 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import atomium
+from unittest import TestCase
+from unittest.mock import patch
+from atomium.tables import *
+
+class TableTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def check_table_round_trip(self, ext):
+        f = atomium.open("tests/integration/files/1cbn.cif")
+        table = structure_to_table(f.model)
+        path = save_table(table, os.path.join(self.directory, "1cbn." + ext))
+        self.assertEqual(path, os.path.join(self.directory, "1cbn." + ext))
+        loaded = load_table(path)
+        self.assertEqual(list(loaded.keys()), COLUMNS)
+        for name in COLUMNS:
+            self.assertEqual(list(loaded[name]), list(table[name]))
+
+
+
+class TableCreationTests(TableTest):
+
+    def test_can_flatten_model(self):
+        model = atomium.open("tests/integration/files/1cbn.cif").model
+        table = structure_to_table(model)
+        self.assertEqual(list(table.keys()), COLUMNS)
+        atoms = sorted(model.atoms(), key=lambda a: a.id)
+        for column in table.values(): self.assertEqual(len(column), len(atoms))
+        self.assertEqual(list(table["atom_id"]), [a.id for a in atoms])
+        self.assertEqual(set(table["model"]), {1})
+        self.assertEqual(table["chain"][0], "A")
+        self.assertEqual(table["residue_id"][0], "A.1")
+        self.assertEqual(table["residue_name"][0], "THR")
+        self.assertEqual(table["atom_name"][0], "N")
+        self.assertEqual(table["element"][0], "N")
+        self.assertEqual(table["x"][0], atoms[0].location[0])
+        self.assertEqual(table["occupancy"][0], 0.8)
+        self.assertEqual(table["bvalue"][0], 6.22)
+        self.assertEqual(table["x"].dtype, np.float64)
+
+
+    def test_can_flatten_all_models_of_file(self):
+        f = atomium.open("tests/integration/files/5xme.pdb")
+        table = structure_to_table(f)
+        self.assertEqual(
+         len(table["atom_id"]), sum(len(m.atoms()) for m in f.models)
+        )
+        self.assertEqual(set(table["model"]), set(range(1, len(f.models) + 1)))
+
+
+    def test_can_flatten_waters_and_chains(self):
+        model = atomium.open("tests/integration/files/1lol.cif").model
+        table = structure_to_table(model.chain("A"))
+        self.assertEqual(len(table["atom_id"]), len(model.chain("A").atoms()))
+        table = structure_to_table(model)
+        waters = table["residue_name"] == "HOH"
+        self.assertEqual(waters.sum(), len(model.waters()))
+
+
+
+class TableSavingTests(TableTest):
+
+    def test_can_save_npz(self):
+        self.check_table_round_trip("npz")
+
+
+    def test_can_save_parquet(self):
+        if not pyarrow: self.skipTest("pyarrow is not installed")
+        self.check_table_round_trip("parquet")
+
+
+    def test_can_save_arrow(self):
+        if not pyarrow: self.skipTest("pyarrow is not installed")
+        self.check_table_round_trip("arrow")
+
+
+    def test_falls_back_to_npz(self):
+        table = structure_to_table(atomium.open("tests/integration/files/1lol.pdb"))
+        with patch("atomium.tables.pyarrow", None):
+            path = save_table(table, os.path.join(self.directory, "1lol.parquet"))
+        self.assertEqual(path, os.path.join(self.directory, "1lol.npz"))
+        self.assertEqual(len(load_table(path)["x"]), len(table["x"]))
+
+
+    def test_loading_arrow_tables_needs_pyarrow(self):
+        for ext in ["parquet", "arrow"]:
+            with patch("atomium.tables.pyarrow", None):
+                with self.assertRaises(ImportError) as e:
+                    load_table(os.path.join(self.directory, "1lol." + ext))
+            self.assertIn("pyarrow", str(e.exception))
+
+
+    def test_unknown_extension_raises_error(self):
+        with self.assertRaises(ValueError):
+            save_table({}, os.path.join(self.directory, "1lol.csv"))
+
+
+    def test_can_convert_directory(self):
+        source = os.path.join(self.directory, "source")
+        os.mkdir(source)
+        for name in ["1lol.cif", "1lol.mmtf", "5xme.pdb"]:
+            shutil.copy("tests/integration/files/" + name, source)
+        with open(os.path.join(source, "notes.txt"), "w") as f: f.write("")
+        paths = convert_directory(
+         source, os.path.join(self.directory, "tables"), ext="npz", processes=2
+        )
+        self.assertEqual([os.path.basename(p) for p in paths], [
+         "1lol.cif.npz", "1lol.mmtf.npz", "5xme.pdb.npz"
+        ])
+        cif, mmtf = load_table(paths[0]), load_table(paths[1])
+        self.assertEqual(list(cif["atom_id"]), list(mmtf["atom_id"]))
+
+
+
+class ModelArrayTests(TestCase):
+
+    def setUp(self):
+        self.model = atomium.open("tests/integration/files/1lol.cif").model
+
+
+    def test_atom_arrays(self):
+        arrays = self.model.to_arrays()
+        atoms = {a.id: a for a in self.model.atoms()}
+        self.assertEqual(len(arrays["atom_id"]), len(atoms))
+        self.assertEqual(set(arrays["atom_id"]), set(atoms))
+        for i in [0, 1000, len(atoms) - 1]:
+            atom = atoms[arrays["atom_id"][i]]
+            self.assertEqual(
+             tuple(arrays[c][i] for c in "xyz"), atom.location
+            )
+            self.assertEqual(arrays["atom_name"][i], atom.name)
+            self.assertEqual(arrays["element"][i], atom.element)
+            self.assertEqual(arrays["bvalue"][i], atom.bvalue)
+            self.assertEqual(arrays["residue_id"][i], atom.het.id)
+            self.assertEqual(arrays["chain"][i], atom.chain.id)
+
+
+    def test_residue_arrays(self):
+        atoms, residues = self.model.to_arrays(), self.model.to_arrays(True)
+        self.assertEqual(len(residues["residue_id"]), sum(len(s) for s in [
+         self.model.residues(), self.model.ligands(), self.model.waters()
+        ]))
+        self.assertEqual(list(residues["kind"]).count("ligand"), 4)
+        self.assertEqual(residues["atom_count"].sum(), len(atoms["atom_id"]))
+        residue = self.model.residue("A.11")
+        i = list(residues["residue_id"]).index("A.11")
+        self.assertEqual(residues["residue_name"][i], "VAL")
+        start, count = residues["atom_start"][i], residues["atom_count"][i]
+        self.assertEqual(
+         set(atoms["atom_id"][start:start + count]),
+         {a.id for a in residue.atoms()}
+        )
+        self.assertEqual(set(atoms["residue_index"][start:start + count]), {i})
+        self.assertAlmostEqual(residues["x"][i], np.mean(
+         [a.location[0] for a in residue.atoms()]
+        ))
+
+
+    def test_arrays_are_cached_until_model_changes(self):
+        arrays = self.model.to_arrays()
+        self.assertIs(self.model.to_arrays()["x"], arrays["x"])
+        with self.assertRaises(ValueError): arrays["x"][0] = 0
+        self.model.chain("A").translate(10, 0, 0)
+        self.assertEqual(self.model.to_arrays()["x"][0], arrays["x"][0] + 10)
+        atom = self.model.atom(self.model.to_arrays()["atom_id"][0])
+        atom.bvalue = 100
+        self.assertEqual(self.model.to_arrays()["bvalue"][0], 100)
+        atom.het.name = "XXX"
+        self.assertEqual(self.model.to_arrays()["residue_name"][0], "XXX")
+        self.model.dehydrate()
+        self.assertNotIn("water", self.model.to_arrays(True)["kind"])
+
+
+    def test_dataframes(self):
+        try:
+            import pandas
+        except ImportError: self.skipTest("pandas is not installed")
+        df = self.model.to_dataframe()
+        self.assertEqual(len(df), len(self.model.atoms()))
+        self.assertEqual(list(df.columns), list(self.model.to_arrays().keys()))
+        df = self.model.to_dataframe(residues=True)
+        self.assertEqual(df.groupby("kind").size()["ligand"], 4)
+
+
+    def test_dataframes_need_pandas(self):
+        with patch("atomium.tables.pandas", None):
+            with self.assertRaises(ImportError):
+                self.model.to_dataframe()
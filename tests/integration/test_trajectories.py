@@ -0,0 +1,106 @@
+import os
+import struct
+import shutil
+import tempfile
+import numpy as np
+import atomium
+from unittest import TestCase
+
+def write_dcd(path, frames, endian="<", cells=False):
+    count = frames.shape[1]
+    def record(data): return struct.pack(endian + "i", len(data)) + data + (
+     struct.pack(endian + "i", len(data))
+    )
+    control = [len(frames), 100, 10, 0, 0, 0, 0, 0, 0]
+    control += [0.5, int(cells)] + [0] * 8 + [24]
+    with open(path, "wb") as f:
+        f.write(record(b"CORD" + struct.pack(endian + "9if10i", *control)))
+        f.write(record(struct.pack(endian + "i", 2) + b"REMARKS test".ljust(80)
+         + b"REMARKS frames".ljust(80)))
+        f.write(record(struct.pack(endian + "i", count)))
+        for frame in frames:
+            if cells: f.write(record(struct.pack(endian + "6d", *[50.0] * 6)))
+            for axis in range(3):
+                f.write(record(frame[:, axis].astype(endian + "f4").tobytes()))
+
+
+
+class TrajectoryTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "run.dcd")
+        self.pdb = atomium.open("tests/integration/files/5xme.pdb")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_can_read_frames(self):
+        for endian in "<>":
+            for cells in [False, True]:
+                write_dcd(self.path, self.pdb.coordinates, endian, cells)
+                with atomium.open_dcd(self.path) as trajectory:
+                    self.assertEqual(len(trajectory), 10)
+                    self.assertEqual(trajectory.atom_count, 1827)
+                    self.assertEqual(
+                     trajectory.title, ["REMARKS test", "REMARKS frames"]
+                    )
+                    self.assertEqual(trajectory.first_step, 100)
+                    self.assertEqual(trajectory.interval, 10)
+                    self.assertEqual(trajectory.timestep, 0.5)
+                    self.assertEqual(
+                     repr(trajectory), "<Trajectory (10 frames, 1827 atoms)>"
+                    )
+                    self.assertTrue(np.allclose(
+                     trajectory[3], self.pdb.coordinates[3], atol=1e-4
+                    ))
+                    self.assertEqual(trajectory[2:5].shape, (3, 1827, 3))
+                    self.assertTrue(np.allclose(
+                     np.array(list(trajectory)), self.pdb.coordinates, atol=1e-4
+                    ))
+
+
+    def test_can_move_model_through_frames(self):
+        write_dcd(self.path, self.pdb.coordinates)
+        model = self.pdb.model
+        model.optimise_distances()
+        with atomium.open_dcd(self.path) as trajectory:
+            self.assertEqual(list(trajectory.iter_frames(model)), list(range(10)))
+            for index in [7, 2]:
+                trajectory.apply(model, index)
+                atoms = {a.id: a for a in model.atoms()}
+                for atom in self.pdb.models[index].atoms():
+                    self.assertTrue(np.allclose(
+                     atoms[atom.id].location, atom.location, atol=1e-4
+                    ))
+                self.assertTrue(np.allclose(model.to_arrays()["x"], [
+                 atoms[id].location[0] for id in model.to_arrays()["atom_id"]
+                ]))
+                self.assertIsNone(model._internal_grid)
+
+
+    def test_moved_atoms_can_be_rebound(self):
+        write_dcd(self.path, self.pdb.coordinates)
+        model = self.pdb.model
+        with atomium.open_dcd(self.path) as trajectory:
+            trajectory.apply(model, 1)
+            atom = model.atom(1)
+            atom.trim(1)
+            trajectory.apply(model, 2)
+            self.assertNotAlmostEqual(atom.location[0], self.pdb.coordinates[2][0][0], 3)
+            trajectory.apply(model, 2, rebind=True)
+            self.assertAlmostEqual(atom.location[0], self.pdb.coordinates[2][0][0], 3)
+
+
+    def test_model_must_match_trajectory(self):
+        write_dcd(self.path, self.pdb.coordinates[:, :100])
+        with atomium.open_dcd(self.path) as trajectory:
+            with self.assertRaises(ValueError):
+                trajectory.apply(self.pdb.model, 0)
+
+
+    def test_non_dcd_files_are_rejected(self):
+        with self.assertRaises(ValueError):
+            atomium.open_dcd("tests/integration/files/1lol.mmtf")
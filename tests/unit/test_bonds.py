@@ -0,0 +1,173 @@
+import numpy as np
+from unittest import TestCase
+from atomium.bonds import *
+from atomium.data import match_bond_keys
+from atomium.structures import Atom
+
+def make_atoms(count):
+    return [Atom("C", i, 0, 0, i, "C", 0, 0, [0] * 6) for i in range(count)]
+
+
+
+class BondTableTests(TestCase):
+
+    def test_can_create_table_from_arrays(self):
+        atoms = make_atoms(5)
+        table = BondTable.from_arrays(
+         atoms, [[4, 1], [1, 4], [3, 1], [2, 2]], [1, 2, 1, 1]
+        )
+        self.assertEqual(table.atoms, (atoms[1], atoms[3], atoms[4]))
+        self.assertEqual(table.pairs.tolist(), [[0, 2], [0, 1]])
+        self.assertEqual(table.orders.tolist(), [2, 1])
+        self.assertIsNone(atoms[0]._bonds)
+        self.assertEqual(atoms[1].bonded_atoms, {atoms[3], atoms[4]})
+        self.assertEqual(atoms[4].bond_order(atoms[1]), 2)
+
+
+    def test_atoms_have_no_table_until_bonded(self):
+        atom1, atom2 = make_atoms(2)
+        self.assertIsNone(atom1._bonds)
+        self.assertEqual(atom1.bonded_atoms, set())
+        self.assertIsNone(atom1.bond_order(atom2))
+        atom1.bond(atom2, 2)
+        self.assertIs(atom1._bonds, atom2._bonds)
+        self.assertEqual(repr(atom1._bonds), "<BondTable (1 bond, 2 atoms)>")
+        self.assertEqual(atom2.bonded_atoms, {atom1})
+        self.assertEqual(atom2.bond_order(atom1), 2)
+
+
+    def test_bonds_are_stored_as_csr(self):
+        atoms = make_atoms(4)
+        for atom in atoms[1:]: atoms[0].bond(atom)
+        atoms[3].bond(atoms[2], 2)
+        atoms[2].bond(atoms[3], 3)
+        table = atoms[0]._bonds
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.pairs.tolist(), [[0, 1], [0, 2], [0, 3], [2, 3]])
+        self.assertEqual(table.orders.tolist(), [1, 1, 1, 3])
+        starts, neighbours, orders = table.csr
+        self.assertEqual(starts.tolist(), [0, 3, 4, 6, 8])
+        self.assertEqual(neighbours.tolist(), [1, 2, 3, 0, 0, 3, 0, 2])
+        self.assertEqual(orders.tolist(), [1, 1, 1, 1, 1, 3, 1, 3])
+
+
+    def test_tables_are_merged_when_atoms_are_bonded(self):
+        atoms = make_atoms(4)
+        atoms[0].bond(atoms[1])
+        atoms[2].bond(atoms[3], 2)
+        old = atoms[2]._bonds
+        atoms[1].bond(atoms[2])
+        self.assertEqual(len({a._bonds for a in atoms}), 1)
+        self.assertEqual(len(old), 0)
+        self.assertEqual(atoms[3].bond_order(atoms[2]), 2)
+        self.assertEqual(atoms[1].bonded_atoms, {atoms[0], atoms[2]})
+
+
+    def test_can_get_graph_distances(self):
+        atoms, table = make_atoms(5), BondTable()
+        for atom1, atom2 in zip(atoms, atoms[1:3]): table.add(atom1, atom2)
+        table.add(atoms[3], atoms[4])
+        self.assertEqual(table.graph_distances(atoms[2]).tolist(), [2, 1, 0, -1, -1])
+        self.assertEqual(table.graph_distance(atoms[0], atoms[2]), 2)
+        self.assertIsNone(table.graph_distance(atoms[0], atoms[4]))
+
+
+    def test_can_get_fragments(self):
+        atoms, table = make_atoms(6), BondTable()
+        table.add(atoms[0], atoms[5])
+        table.add(atoms[1], atoms[2])
+        table.add(atoms[2], atoms[3])
+        table.add(atoms[3], atoms[4])
+        self.assertEqual(table.fragments(), [
+         set(atoms[1:5]), {atoms[0], atoms[5]}
+        ])
+        self.assertEqual(BondTable().fragments(), [])
+
+
+    def test_can_get_rings(self):
+        atoms = make_atoms(12)
+        for i in range(6): atoms[i].bond(atoms[(i + 1) % 6])
+        for i, j in [(4, 6), (6, 7), (7, 8), (8, 9), (9, 5), (9, 10), (10, 11)]:
+            atoms[i].bond(atoms[j])
+        rings = atoms[0]._bonds.rings()
+        self.assertEqual([set(ring) for ring in rings], [
+         set(atoms[:6]), set(atoms[4:10])
+        ])
+        for ring in rings:
+            for atom1, atom2 in zip(ring, ring[1:] + ring[:1]):
+                self.assertIn(atom2, atom1.bonded_atoms)
+        atoms[0]._bonds.add(atoms[10], atoms[11])
+        self.assertEqual(len(atoms[0]._bonds.rings()), 2)
+
+
+
+class BondExtendingTests(TestCase):
+
+    def test_can_extend_table(self):
+        atoms = make_atoms(5)
+        atoms[0].bond(atoms[1], 2)
+        atoms[3].bond(atoms[4], 3)
+        table = atoms[0]._bonds
+        table.extend(atoms, [[1, 0], [2, 1], [3, 2], [3, 3]])
+        self.assertEqual(len(table), 4)
+        self.assertEqual(len({a._bonds for a in atoms}), 1)
+        self.assertEqual(atoms[0].bond_order(atoms[1]), 2)
+        self.assertEqual(atoms[4].bond_order(atoms[3]), 3)
+        self.assertEqual(atoms[2].bonded_atoms, {atoms[1], atoms[3]})
+
+
+
+class BondFindingTests(TestCase):
+
+    def test_can_find_bonds(self):
+        coordinates = np.array([
+         [0, 0, 0], [1.5, 0, 0], [3, 0, 0], [3.2, 0, 0], [10, 10, 10], [11, 10, 10]
+        ])
+        radii = np.array([0.76, 0.76, 0.76, 0.76, 0.76, 0])
+        pairs = find_bonds(coordinates, radii)
+        self.assertEqual(sorted(pairs.tolist()), [[0, 1], [1, 2], [1, 3]])
+        pairs = find_bonds(coordinates, radii, 0.1)
+        self.assertEqual(sorted(pairs.tolist()), [[0, 1], [1, 2]])
+
+
+    def test_can_exclude_groups(self):
+        coordinates = np.array([[0, 0, 0], [1.5, 0, 0], [1.6, 0, 0]])
+        pairs = find_bonds(coordinates, np.full(3, 0.76), groups=np.array([0, 1, 1]))
+        self.assertEqual(sorted(pairs.tolist()), [[0, 1], [0, 2]])
+
+
+    def test_finding_bonds_matches_all_distances(self):
+        coordinates = np.random.default_rng(1).random((500, 3)) * 12
+        radii = np.full(500, 0.7)
+        distances = np.sqrt(((
+         coordinates[:, None] - coordinates[None]
+        ) ** 2).sum(axis=2))
+        expected = np.argwhere(np.triu((distances <= 1.85) & (distances >= 0.4), 1))
+        self.assertEqual(
+         sorted(find_bonds(coordinates, radii, 0.45).tolist()),
+         expected.tolist()
+        )
+
+
+    def test_can_find_no_bonds(self):
+        self.assertEqual(find_bonds(np.zeros((0, 3)), np.zeros(0)).shape, (0, 2))
+
+
+
+class BondKeyMatchingTests(TestCase):
+
+    def test_can_match_bond_keys(self):
+        pairs, bonds = match_bond_keys(
+         np.array([10, 20, 30, 20]), np.array([10, 30, 40]),
+         np.array([20, 10, 10])
+        )
+        self.assertEqual(pairs.tolist(), [[0, 1], [0, 3], [2, 0]])
+        self.assertEqual(bonds.tolist(), [0, 0, 1])
+
+
+    def test_can_match_no_bond_keys(self):
+        pairs, bonds = match_bond_keys(
+         np.array([10, 20]), np.array([], dtype="i8"), np.array([], dtype="i8")
+        )
+        self.assertEqual(pairs.shape, (0, 2))
+        self.assertEqual(bonds.tolist(), [])
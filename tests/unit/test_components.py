@@ -0,0 +1,80 @@
+import numpy as np
+from unittest import TestCase
+from atomium.components import *
+
+class ComponentBlockTests(TestCase):
+
+    def test_can_split_lines_into_blocks(self):
+        blocks = list(iter_component_blocks(iter([
+         "data_ALA", "_chem_comp.id ALA", "#", "data_ZN", "_chem_comp.id ZN"
+        ])))
+        self.assertEqual(blocks, [
+         ["data_ALA", "_chem_comp.id ALA", "#"], ["data_ZN", "_chem_comp.id ZN"]
+        ])
+        self.assertEqual(list(iter_component_blocks(iter([]))), [])
+
+
+
+class ComponentReadingTests(TestCase):
+
+    def test_can_read_component(self):
+        component = mmcif_dict_to_component({
+         "chem_comp": [{
+          "id": "MSE", "name": "SELENOMETHIONINE", "type": "L-PEPTIDE LINKING",
+          "one_letter_code": "M", "mon_nstd_parent_comp_id": "MET"
+         }], "chem_comp_atom": [
+          {"atom_id": "CG", "type_symbol": "C", "charge": "0"},
+          {"atom_id": "SE", "type_symbol": "SE", "charge": "?"},
+          {"atom_id": "CE", "type_symbol": "C", "charge": "-1"}
+         ], "chem_comp_bond": [
+          {"atom_id_1": "CG", "atom_id_2": "SE", "value_order": "SING"},
+          {"atom_id_1": "SE", "atom_id_2": "CE", "value_order": "DOUB"},
+          {"atom_id_1": "SE", "atom_id_2": "XX", "value_order": "SING"}
+         ]
+        })
+        self.assertEqual(component, (
+         "MSE", "SELENOMETHIONINE", "M", "L-PEPTIDE LINKING", "MET",
+         [("CG", "C", 0), ("SE", "SE", 0), ("CE", "C", -1)],
+         [(0, 1, 1), (1, 2, 2)]
+        ))
+
+
+    def test_unknown_values_are_none(self):
+        component = mmcif_dict_to_component({"chem_comp": [{
+         "id": "ZN", "name": "ZINC ION", "type": "NON-POLYMER",
+         "one_letter_code": "?", "mon_nstd_parent_comp_id": "?"
+        }]})
+        self.assertEqual(component, (
+         "ZN", "ZINC ION", None, "NON-POLYMER", None, [], []
+        ))
+
+
+    def test_blocks_without_components_are_ignored(self):
+        self.assertIsNone(mmcif_dict_to_component({}))
+
+
+
+class ComponentArrayTests(TestCase):
+
+    def test_can_make_arrays(self):
+        arrays = components_to_arrays([
+         ("ZN", "ZINC ION", None, "NON-POLYMER", None, [("ZN", "ZN", 2)], []),
+         ("HOH", "WATER", None, "NON-POLYMER", None, [
+          ("O", "O", 0), ("H1", "H", 0), ("H2", "H", 0)
+         ], [(0, 1, 1), (0, 2, 1)])
+        ])
+        self.assertEqual(arrays["ids"].tolist(), [b"HOH", b"ZN"])
+        self.assertEqual(arrays["atom_offsets"].tolist(), [0, 3, 4])
+        self.assertEqual(arrays["atom_charges"].tolist(), [0, 0, 0, 2])
+        self.assertEqual(arrays["bond_offsets"].tolist(), [0, 2, 2])
+        self.assertEqual(arrays["bond_atoms"].tolist(), [[0, 1], [0, 2]])
+        self.assertEqual(arrays["bond_orders"].tolist(), [1, 1])
+        self.assertEqual(arrays["codes"].tolist(), [-1, -1])
+        self.assertEqual(arrays["atom_names"].tolist(), [0, 1, 2, 3])
+
+
+    def test_can_make_empty_arrays(self):
+        arrays = components_to_arrays([])
+        self.assertEqual(arrays["ids"].shape, (0,))
+        self.assertEqual(arrays["atom_offsets"].tolist(), [0])
+        self.assertEqual(arrays["bond_atoms"].shape, (0, 2))
@@ -0,0 +1,85 @@
+import os
+import json
+import shutil
+import tempfile
+from itertools import product
+import numpy as np
+from datetime import date, datetime
+from unittest import TestCase
+from atomium.snapshot import *
+
+class StringColumnTests(TestCase):
+
+    def test_can_store_strings_as_categories(self):
+        arrays = {}
+        add_strings(arrays, "names", ["CA", "N", "CA", None, "Å"])
+        self.assertEqual(arrays["names"].tolist(), [0, 1, 0, -1, 2])
+        self.assertEqual(arrays["names"].dtype, np.dtype("i4"))
+        self.assertEqual(
+         arrays["names_values"].tolist(), [b"CA", b"N", "Å".encode()]
+        )
+        self.assertEqual(
+         get_strings(arrays, "names"), ["CA", "N", "CA", None, "Å"]
+        )
+
+
+    def test_can_store_no_strings(self):
+        arrays = {}
+        add_strings(arrays, "names", [])
+        self.assertEqual(arrays["names"].shape, (0,))
+        self.assertEqual(arrays["names_values"].shape, (0,))
+        self.assertEqual(get_strings(arrays, "names"), [])
+
+
+
+class JsonEncodingTests(TestCase):
+
+    def test_can_round_trip_dates_and_arrays(self):
+        d = {
+         "date": date(2002, 5, 6), "time": datetime(2002, 5, 6, 12, 30),
+         "matrix": [np.array([1.0, 0.0]), np.array([0.0, 1.0])],
+         "number": np.float64(1.5)
+        }
+        decoded = json.loads(
+         json.dumps(d, default=encode_json), object_hook=decode_json
+        )
+        self.assertEqual(decoded["date"], date(2002, 5, 6))
+        self.assertEqual(decoded["time"], datetime(2002, 5, 6, 12, 30))
+        self.assertEqual(decoded["matrix"][1].tolist(), [0.0, 1.0])
+        self.assertEqual(decoded["number"], 1.5)
+
+
+    def test_unknown_objects_raise_error(self):
+        with self.assertRaises(TypeError):
+            json.dumps({"x": object()}, default=encode_json)
+
+
+
+class ArrayFileTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_can_save_and_read_arrays_with_any_magic(self):
+        path = os.path.join(self.directory, "arrays.bin")
+        arrays = {
+         "a": np.arange(5, dtype="i1"), "b": np.ones((3, 2), dtype="f8")
+        }
+        for magic, padding in product(
+         [b"ATOMSNAP", b"AB", b"LONGERMAGIC"], range(0, 64, 3)
+        ):
+            save_arrays(arrays, {"x": "x" * padding}, path, magic, 2)
+            header, loaded = read_arrays(path, magic, 2)
+            self.assertEqual(header, {"x": "x" * padding})
+            self.assertEqual(loaded["a"].tolist(), arrays["a"].tolist())
+            self.assertEqual(loaded["b"].tolist(), arrays["b"].tolist())
+            self.assertEqual(loaded["b"].ctypes.data % ALIGNMENT, 0)
+            with self.assertRaises(ValueError):
+                read_arrays(path, magic, 1)
+        with self.assertRaises(ValueError):
+            read_arrays(path, b"ATOMSNAP")
@@ -1,5 +1,18 @@
 from unittest import TestCase
 from unittest.mock import Mock, patch, PropertyMock, MagicMock
+import os
+import builtins
+import asyncio
+import threading
+import io
+import shutil
+import tempfile
+import mmap
+import gzip
+import bz2
+import lzma
+import atomium
+from concurrent.futures import ThreadPoolExecutor
 from atomium.utilities import *
 
 class OpeningTests(TestCase):
@@ -7,97 +20,404 @@ class OpeningTests(TestCase):
     def setUp(self):
         self.patch1 = patch("builtins.open")
         self.patch2 = patch("atomium.utilities.parse_string")
+        self.patch3 = patch("mmap.mmap")
         self.mock_open = self.patch1.start()
         self.mock_parse = self.patch2.start()
+        self.mock_mmap = self.patch3.start()
         open_return = MagicMock()
-        mock_file = Mock()
-        open_return.__enter__.return_value = mock_file
-        mock_file.read.return_value = "returnstring"
+        self.mock_file = Mock()
+        open_return.__enter__.return_value = self.mock_file
+        self.mock_file.read.return_value = b"returnstring"
+        self.mock_file.peek.return_value = b"returnstring"
+        self.mock_file.fileno.return_value = 3
         self.mock_open.return_value = open_return
 
 
     def tearDown(self):
         self.patch1.stop()
         self.patch2.stop()
+        self.patch3.stop()
+
+
+    def test_can_open_file_as_memory_map(self):
+        self.assertEqual(open("path/to/file", 1, a=2), self.mock_parse.return_value)
+        self.mock_open.assert_called_with("path/to/file", "rb")
+        self.mock_mmap.assert_called_with(3, 0, access=mmap.ACCESS_READ)
+        self.assertFalse(self.mock_file.read.called)
+        self.mock_parse.assert_called_with(
+         self.mock_mmap.return_value, "path/to/file", 1, a=2
+        )
+        self.assertTrue(self.mock_mmap.return_value.close.called)
+
 
+    def test_memory_map_is_closed_if_parsing_fails(self):
+        self.mock_parse.side_effect = ValueError
+        with self.assertRaises(ValueError): open("path/to/file")
+        self.assertTrue(self.mock_mmap.return_value.close.called)
 
-    def test_can_open_string(self):
+
+    def test_can_open_empty_file(self):
+        self.mock_mmap.side_effect = ValueError
         self.assertEqual(open("path/to/file", 1, a=2), self.mock_parse.return_value)
-        self.mock_open.assert_called_with("path/to/file")
-        self.mock_parse.assert_called_with("returnstring", "path/to/file", 1, a=2)
+        self.mock_open.assert_called_with("path/to/file", "rb")
+        self.mock_parse.assert_called_with(b"returnstring", "path/to/file", 1, a=2)
 
 
-    def test_can_open_bytestring(self):
-        self.mock_open.side_effect = [Exception, self.mock_open.return_value]
+    @patch("atomium.utilities.get_decompressed_stream")
+    def test_can_open_compressed_file(self, mock_stream):
+        stream = mock_stream.return_value
         self.assertEqual(open("path/to/file", 1, a=2), self.mock_parse.return_value)
         self.mock_open.assert_called_with("path/to/file", "rb")
-        self.mock_parse.assert_called_with("returnstring", "path/to/file", 1, a=2)
+        mock_stream.assert_called_with(self.mock_file)
+        self.assertFalse(self.mock_mmap.called)
+        self.mock_parse.assert_called_with(stream, "path/to/file", 1, a=2)
+        self.assertTrue(stream.__exit__.called)
+
+
+
+class DecompressedStreamTests(TestCase):
+
+    def make_file(self, contents):
+        return io.BufferedReader(io.BytesIO(contents))
+
+
+    def test_uncompressed_file_gives_none(self):
+        self.assertIsNone(get_decompressed_stream(self.make_file(b"HEADER")))
+        self.assertIsNone(get_decompressed_stream(self.make_file(b"")))
+
+
+    def test_can_decompress_gzip(self):
+        f = self.make_file(gzip.compress(b"line1\nline2"))
+        self.assertEqual(get_decompressed_stream(f).read(), b"line1\nline2")
+
+
+    def test_can_decompress_bz2(self):
+        f = self.make_file(bz2.compress(b"line1\nline2"))
+        self.assertEqual(get_decompressed_stream(f).read(), b"line1\nline2")
+
+
+    def test_can_decompress_xz(self):
+        f = self.make_file(lzma.compress(b"line1\nline2"))
+        self.assertEqual(get_decompressed_stream(f).read(), b"line1\nline2")
+
+
+    def test_peek_does_not_consume(self):
+        f = self.make_file(gzip.compress(b"line1\nline2"))
+        stream = get_decompressed_stream(f)
+        self.assertEqual(stream.peek(5)[:5], b"line1")
+        self.assertEqual(stream.read(), b"line1\nline2")
 
 
 
 class FetchingTests(TestCase):
 
     def setUp(self):
-        self.patch1 = patch("atomium.utilities.get")
-        self.mock_get = self.patch1.start()
-        self.mock_get.return_value = Mock(status_code=200, text="ABC")
-        self.patch2 = patch("atomium.utilities.parse_string")
+        self.patch1 = patch("atomium.utilities.get_body")
+        self.mock_body = self.patch1.start()
+        self.mock_body.return_value = b"ABC"
+        self.patch2 = patch("atomium.utilities.parse_bytes")
         self.mock_parse = self.patch2.start()
+        self.patch3 = patch("atomium.utilities.get_mirror_path")
+        self.mock_mirror = self.patch3.start()
+        self.mock_mirror.return_value = None
 
 
     def tearDown(self):
         self.patch1.stop()
         self.patch2.stop()
+        self.patch3.stop()
 
 
     def test_can_fetch_cif(self):
         f = fetch("1ABC", 1, b=2)
-        self.mock_get.assert_called_with("https://files.rcsb.org/view/1abc.cif", stream=True)
-        self.mock_parse.assert_called_with("ABC", "1ABC.cif", 1, b=2)
+        self.mock_body.assert_called_with("https://files.rcsb.org/view/1abc.cif")
+        self.mock_parse.assert_called_with(b"ABC", "1ABC.cif", 1, b=2)
         self.assertEqual(f, self.mock_parse.return_value)
 
 
     def test_can_fetch_pdb(self):
         f = fetch("1ABC.pdb", 1, b=2)
-        self.mock_get.assert_called_with("https://files.rcsb.org/view/1abc.pdb", stream=True)
-        self.mock_parse.assert_called_with("ABC", "1ABC.pdb", 1, b=2)
+        self.mock_body.assert_called_with("https://files.rcsb.org/view/1abc.pdb")
+        self.mock_parse.assert_called_with(b"ABC", "1ABC.pdb", 1, b=2)
         self.assertEqual(f, self.mock_parse.return_value)
 
 
     def test_can_fetch_mmtf(self):
-        self.mock_get.return_value.content = b"ABC"
         f = fetch("1ABC.mmtf", 1, b=2)
-        self.mock_get.assert_called_with("https://mmtf.rcsb.org/v1.0/full/1abc", stream=True)
+        self.mock_body.assert_called_with("https://mmtf.rcsb.org/v1.0/full/1abc")
         self.mock_parse.assert_called_with(b"ABC", "1ABC.mmtf", 1, b=2)
         self.assertEqual(f, self.mock_parse.return_value)
 
 
     def test_can_fetch_by_url(self):
         f = fetch("https://website.com/1ABC", 1, b=2)
-        self.mock_get.assert_called_with("https://website.com/1ABC", stream=True)
-        self.mock_parse.assert_called_with("ABC", "https://website.com/1ABC", 1, b=2)
+        self.mock_body.assert_called_with("https://website.com/1ABC")
+        self.mock_parse.assert_called_with(b"ABC", "https://website.com/1ABC", 1, b=2)
         self.assertEqual(f, self.mock_parse.return_value)
 
 
     def test_can_handle_no_results(self):
-        self.mock_get.return_value.status_code = 400
+        self.mock_body.side_effect = ValueError
         with self.assertRaises(ValueError):
             f = fetch("1ABC", 1, b=2)
 
 
+    @patch("atomium.utilities.open")
+    @patch("os.path.exists")
+    def test_can_fetch_from_mirror(self, mock_exists, mock_open):
+        self.mock_mirror.return_value = "/mirror/1abc.cif.gz"
+        mock_exists.return_value = True
+        f = fetch("1ABC", 1, b=2)
+        self.mock_mirror.assert_called_with("1ABC.cif")
+        mock_exists.assert_called_with("/mirror/1abc.cif.gz")
+        mock_open.assert_called_with("/mirror/1abc.cif.gz", 1, b=2)
+        self.assertFalse(self.mock_body.called)
+        self.assertEqual(f, mock_open.return_value)
+
+
+    @patch("os.path.exists")
+    def test_missing_mirror_file_is_downloaded(self, mock_exists):
+        self.mock_mirror.return_value = "/mirror/1abc.cif.gz"
+        mock_exists.return_value = False
+        f = fetch("1ABC", 1, b=2)
+        self.mock_parse.assert_called_with(b"ABC", "1ABC.cif", 1, b=2)
+
+
+
+class FetchSettingsTestCase(TestCase):
+
+    def setUp(self):
+        self.settings = dict(atomium.utilities.FETCH_SETTINGS)
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        configure_fetching(**self.settings)
+        shutil.rmtree(self.directory)
+
+
+
+class MirrorPathTests(FetchSettingsTestCase):
+
+    def test_no_mirror_gives_none(self):
+        self.assertIsNone(get_mirror_path("1LOL.cif"))
+
+
+    def test_can_get_mirror_paths(self):
+        configure_fetching(mirror="/pdb")
+        self.assertEqual(
+         get_mirror_path("1LOL.cif"), "/pdb/divided/mmCIF/lo/1lol.cif.gz"
+        )
+        self.assertEqual(
+         get_mirror_path("1LOL.pdb"), "/pdb/divided/pdb/lo/pdb1lol.ent.gz"
+        )
+        self.assertIsNone(get_mirror_path("1LOL.mmtf"))
+        self.assertIsNone(get_mirror_path("https://website.com/1lol.cif"))
+
+
+
+class BodyGettingTests(FetchSettingsTestCase):
+
+    def setUp(self):
+        FetchSettingsTestCase.setUp(self)
+        self.patch1 = patch("atomium.utilities.get")
+        self.mock_get = self.patch1.start()
+        self.mock_get.return_value = Mock(
+         status_code=200, content=b"ABC", headers={"ETag": '"xyz"'}
+        )
+
+
+    def tearDown(self):
+        self.patch1.stop()
+        FetchSettingsTestCase.tearDown(self)
+
+
+    def test_can_get_body_without_cache(self):
+        self.assertEqual(get_body("URL"), b"ABC")
+        self.mock_get.assert_called_with("URL", headers={})
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+    def test_missing_body_raises_error(self):
+        self.mock_get.return_value.status_code = 404
+        with self.assertRaises(ValueError):
+            get_body("URL")
+
+
+    def test_body_is_cached_compressed(self):
+        configure_fetching(cache=self.directory)
+        self.assertEqual(get_body("URL"), b"ABC")
+        body_path, meta_path = get_cache_paths("URL")
+        with builtins.open(body_path, "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), b"ABC")
+        self.assertEqual(get_cache_entry("URL")["etag"], '"xyz"')
+
+
+    def test_cached_body_is_revalidated(self):
+        configure_fetching(cache=self.directory)
+        get_body("URL")
+        self.mock_get.return_value = Mock(status_code=304, headers={})
+        body = get_body("URL")
+        self.mock_get.assert_called_with("URL", headers={"If-None-Match": '"xyz"'})
+        self.assertEqual(gzip.decompress(body), b"ABC")
+
+
+    def test_changed_body_replaces_cached_body(self):
+        configure_fetching(cache=self.directory)
+        get_body("URL")
+        self.mock_get.return_value = Mock(status_code=200, content=b"DEF", headers={
+         "Last-Modified": "Mon, 06 May 2002 00:00:00 GMT"
+        })
+        self.assertEqual(get_body("URL"), b"DEF")
+        self.assertEqual(gzip.decompress(read_from_cache("URL")), b"DEF")
+        self.assertIsNone(get_cache_entry("URL")["etag"])
+        get_body("URL")
+        self.mock_get.assert_called_with("URL", headers={
+         "If-Modified-Since": "Mon, 06 May 2002 00:00:00 GMT"
+        })
+
+
+    def test_offline_mode_uses_cache_only(self):
+        configure_fetching(cache=self.directory)
+        get_body("URL")
+        configure_fetching(offline=True)
+        self.mock_get.reset_mock()
+        self.assertEqual(gzip.decompress(get_body("URL")), b"ABC")
+        with self.assertRaises(ValueError):
+            get_body("URL2")
+        self.assertFalse(self.mock_get.called)
+
+
+    def test_least_recently_used_bodies_are_evicted(self):
+        configure_fetching(cache=self.directory, cache_size=60)
+        get_body("URL1")
+        get_body("URL2")
+        path1, path2 = get_cache_paths("URL1")[0], get_cache_paths("URL2")[0]
+        os.utime(path1, (1, 1))
+        os.utime(path2, (2, 2))
+        read_from_cache("URL1")
+        get_body("URL3")
+        self.assertIsNotNone(get_cache_entry("URL1"))
+        self.assertIsNone(get_cache_entry("URL2"))
+        self.assertIsNotNone(get_cache_entry("URL3"))
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+
+
+class ByteParsingTests(TestCase):
+
+    @patch("atomium.utilities.parse_string")
+    def test_can_parse_uncompressed_bytes(self, mock_parse):
+        f = parse_bytes(b"ABC", "1abc.cif", 1, b=2)
+        mock_parse.assert_called_with(b"ABC", "1abc.cif", 1, b=2)
+        self.assertIs(f, mock_parse.return_value)
+
+
+    @patch("atomium.utilities.parse_string")
+    def test_can_parse_compressed_bytes(self, mock_parse):
+        mock_parse.side_effect = lambda s, *args, **kwargs: s.read()
+        f = parse_bytes(gzip.compress(b"ABC"), "1abc.cif", 1, b=2)
+        self.assertEqual(f, b"ABC")
+
+
+
+class ManyFetchingTests(TestCase):
+
+    @patch("atomium.utilities.fetch")
+    def test_can_fetch_many_in_order(self, mock_fetch):
+        mock_fetch.side_effect = lambda code, *args, **kwargs: code.lower()
+        files = fetch_many(["1A", "2B", "3C"], 1, concurrency=2, b=2)
+        self.assertEqual(files, ["1a", "2b", "3c"])
+        for code in ["1A", "2B", "3C"]:
+            mock_fetch.assert_any_call(code, 1, b=2)
+
+
+    @patch("atomium.utilities.fetch")
+    def test_errors_are_raised(self, mock_fetch):
+        mock_fetch.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            fetch_many(["1A", "2B"])
+
+
+
+class SessionTests(TestCase):
+
+    def setUp(self):
+        self.settings = dict(atomium.utilities.FETCH_SETTINGS)
+
+
+    def tearDown(self):
+        configure_fetching(**self.settings)
+
+
+    @patch("atomium.utilities.get_session")
+    def test_get_uses_session_with_timeout(self, mock_session):
+        response = get("URL", stream=True)
+        mock_session.return_value.get.assert_called_with(
+         "URL", stream=True, timeout=self.settings["timeout"]
+        )
+        self.assertIs(response, mock_session.return_value.get.return_value)
+        get("URL", timeout=2)
+        mock_session.return_value.get.assert_called_with("URL", timeout=2)
+
+
+    def test_session_is_shared(self):
+        session = get_session()
+        self.assertIs(get_session(), session)
+        adapter = session.get_adapter("https://files.rcsb.org")
+        self.assertEqual(adapter.max_retries.total, self.settings["retries"])
+
+
+    def test_can_configure_fetching(self):
+        session = get_session()
+        configure_fetching(timeout=5, retries=7)
+        self.assertEqual(atomium.utilities.FETCH_SETTINGS["timeout"], 5)
+        self.assertIsNot(get_session(), session)
+        adapter = get_session().get_adapter("https://files.rcsb.org")
+        self.assertEqual(adapter.max_retries.total, 7)
+
+
+    def test_unknown_settings_are_rejected(self):
+        with self.assertRaises(ValueError):
+            configure_fetching(timout=5)
+
+
+
 class FetchingOverSshTests(TestCase):
 
+    @patch("atomium.utilities.SSHFetcher")
+    def test_can_fetch_over_ssh(self, mock_fetcher):
+        fetcher = mock_fetcher.return_value.__enter__.return_value
+        f = fetch_over_ssh("HOST", "USER", "/path/", 1, password="xxx", a=2)
+        mock_fetcher.assert_called_with("HOST", "USER", password="xxx")
+        fetcher.fetch.assert_called_with("/path/", 1, a=2)
+        self.assertIs(f, fetcher.fetch.return_value)
+        self.assertTrue(mock_fetcher.return_value.__exit__.called)
+
+
+    @patch("atomium.utilities.SSHFetcher")
+    def test_can_get_over_ssh(self, mock_fetcher):
+        fetcher = mock_fetcher.return_value.__enter__.return_value
+        body = get_over_ssh("HOST", "USER", "/path/")
+        mock_fetcher.assert_called_with("HOST", "USER", password=None)
+        fetcher.get.assert_called_with("/path/")
+        self.assertIs(body, fetcher.get.return_value)
+
+
+
+class SSHFetcherTests(TestCase):
+
     def setUp(self):
         self.patch1 = patch("paramiko.SSHClient")
         self.mock_ssh = self.patch1.start()
-        self.mock_client = Mock()
+        self.mock_client = MagicMock()
         self.mock_ssh.return_value = self.mock_client
-        self.mock_client.exec_command.return_value = (Mock(), Mock(), Mock())
-        self.mock_client.exec_command.return_value[1].read.return_value = b"STRING"
+        self.mock_sftp = self.mock_client.open_sftp.return_value
+        self.mock_file = self.mock_sftp.open.return_value.__enter__.return_value
         self.patch2 = patch("paramiko.AutoAddPolicy")
         self.mock_policy = self.patch2.start()
         self.mock_policy.return_value = "POLICY"
-        self.patch3 = patch("atomium.utilities.parse_string")
+        self.patch3 = patch("atomium.utilities.parse_stream")
         self.mock_parse = self.patch3.start()
 
 
@@ -107,38 +427,156 @@ class FetchingOverSshTests(TestCase):
         self.patch3.stop()
 
 
-    def test_can_get_filestring_over_ssh_with_keys(self):
-        f = fetch_over_ssh("HOST", "USER", "/path/", 1, a=2)
+    def test_can_connect_with_keys(self):
+        fetcher = SSHFetcher("HOST", "USER")
         self.mock_client.set_missing_host_key_policy.assert_called_with("POLICY")
         self.mock_client.load_system_host_keys.assert_called_with()
-        self.mock_client.connect.assert_called_with(hostname="HOST", username="USER")
-        self.mock_client.exec_command.assert_called_with("less /path/")
-        self.mock_client.close.assert_called_with()
-        self.mock_parse.assert_called_with("STRING", "/path/", 1, a=2)
-        self.assertIs(f, self.mock_parse.return_value)
+        self.mock_client.connect.assert_called_with(
+         hostname="HOST", username="USER", port=22
+        )
+        self.mock_client.open_sftp.assert_called_with()
+        self.assertFalse(self.mock_client.close.called)
+        self.assertEqual(repr(fetcher), "<SSHFetcher (USER@HOST)>")
 
 
-    def test_can_get_filestring_over_ssh_with_password(self):
-        f = fetch_over_ssh("HOST", "USER", "/path/", 1, password="xxx", a=2)
-        self.mock_client.set_missing_host_key_policy.assert_called_with("POLICY")
+    def test_can_connect_with_password(self):
+        SSHFetcher("HOST", "USER", password="xxx", port=2222)
         self.assertFalse(self.mock_client.load_system_host_keys.called)
         self.mock_client.connect.assert_called_with(
-         hostname="HOST", username="USER", password="xxx"
+         hostname="HOST", username="USER", password="xxx", port=2222
         )
-        self.mock_client.exec_command.assert_called_with("less /path/")
+
+
+    def test_failed_connection_is_closed(self):
+        self.mock_client.connect.side_effect = Exception
+        with self.assertRaises(Exception):
+            SSHFetcher("HOST", "USER")
         self.mock_client.close.assert_called_with()
-        self.mock_parse.assert_called_with("STRING", "/path/", 1, a=2)
-        self.assertIs(f, self.mock_parse.return_value)
 
 
-    def test_connection_is_always_closed(self):
-        self.mock_client.set_missing_host_key_policy.side_effect = Exception
-        try:
-            fetch_over_ssh("HOST", "USER", "/path/")
-        except: pass
+    def test_context_manager_closes_connection(self):
+        with SSHFetcher("HOST", "USER") as fetcher:
+            self.assertFalse(self.mock_client.close.called)
         self.mock_client.close.assert_called_with()
 
 
+    @patch("io.BufferedReader")
+    def test_can_fetch_file(self, mock_buffer):
+        fetcher = SSHFetcher("HOST", "USER")
+        f = fetcher.fetch("/path/", 1, a=2)
+        self.mock_sftp.open.assert_called_with("/path/", "rb")
+        self.mock_file.prefetch.assert_called_with()
+        mock_buffer.assert_called_with(self.mock_file)
+        self.mock_parse.assert_called_with(
+         mock_buffer.return_value, "/path/", 1, a=2
+        )
+        self.assertIs(f, self.mock_parse.return_value)
+
+
+    def test_can_fetch_many_files(self):
+        fetcher = SSHFetcher("HOST", "USER")
+        fetcher.fetch = Mock(side_effect=lambda path, *args, **kwargs: path)
+        self.assertEqual(fetcher.fetch_many(["/1", "/2"], 1, a=2), ["/1", "/2"])
+        fetcher.fetch.assert_called_with("/2", 1, a=2)
+        self.assertEqual(self.mock_ssh.call_count, 1)
+
+
+    def test_can_get_bytes(self):
+        fetcher = SSHFetcher("HOST", "USER")
+        self.assertIs(fetcher.get("/path/"), self.mock_file.read.return_value)
+        self.mock_file.prefetch.assert_called_with()
+
+
+
+class StreamParsingTests(TestCase):
+
+    @patch("atomium.utilities.parse_string")
+    def test_can_parse_uncompressed_stream(self, mock_parse):
+        stream = io.BufferedReader(io.BytesIO(b"ABC"))
+        f = parse_stream(stream, "/path/", 1, a=2)
+        mock_parse.assert_called_with(stream, "/path/", 1, a=2)
+        self.assertIs(f, mock_parse.return_value)
+
+
+    @patch("atomium.utilities.parse_string")
+    def test_can_parse_compressed_stream(self, mock_parse):
+        mock_parse.side_effect = lambda s, *args, **kwargs: s.read()
+        stream = io.BufferedReader(io.BytesIO(bz2.compress(b"ABC")))
+        self.assertEqual(parse_stream(stream, "/path/"), b"ABC")
+
+
+
+class AsyncTests(TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+
+    @patch("atomium.utilities.open")
+    def test_can_open_async(self, mock_open):
+        f = asyncio.run(open_async("/path/", 1, executor=self.executor, a=2))
+        mock_open.assert_called_with("/path/", 1, a=2)
+        self.assertIs(f, mock_open.return_value)
+
+
+    @patch("atomium.utilities.get_body")
+    @patch("atomium.utilities.parse_bytes")
+    def test_can_fetch_async(self, mock_parse, mock_body):
+        mock_body.return_value = b"ABC"
+        f = asyncio.run(fetch_async("1ABC", 1, executor=self.executor, a=2))
+        mock_body.assert_called_with("https://files.rcsb.org/view/1abc.cif")
+        mock_parse.assert_called_with(b"ABC", "1ABC.cif", 1, a=2)
+        self.assertIs(f, mock_parse.return_value)
+
+
+    @patch("atomium.utilities.get_body")
+    def test_fetch_async_errors_are_raised(self, mock_body):
+        mock_body.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            asyncio.run(fetch_async("1ABC"))
+
+
+    @patch("atomium.utilities.get_mirror_path")
+    @patch("atomium.utilities.open")
+    @patch("os.path.exists")
+    def test_can_fetch_async_from_mirror(self, mock_exists, mock_open, mock_mirror):
+        mock_mirror.return_value = "/mirror/1abc.cif.gz"
+        mock_exists.return_value = True
+        f = asyncio.run(fetch_async("1ABC", 1, a=2))
+        mock_open.assert_called_with("/mirror/1abc.cif.gz", 1, a=2)
+        self.assertIs(f, mock_open.return_value)
+
+
+    @patch("atomium.utilities.get_over_ssh")
+    @patch("atomium.utilities.parse_bytes")
+    def test_can_fetch_over_ssh_async(self, mock_parse, mock_get):
+        f = asyncio.run(fetch_over_ssh_async(
+         "HOST", "USER", "/path/", 1, password="xxx", executor=self.executor, a=2
+        ))
+        mock_get.assert_called_with("HOST", "USER", "/path/", password="xxx")
+        mock_parse.assert_called_with(mock_get.return_value, "/path/", 1, a=2)
+        self.assertIs(f, mock_parse.return_value)
+
+
+    @patch("atomium.utilities.open")
+    def test_can_cancel(self, mock_open):
+        event = threading.Event()
+        mock_open.side_effect = lambda *args, **kwargs: event.wait(5)
+        async def run():
+            task = asyncio.ensure_future(open_async("/path/", executor=self.executor))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            try:
+                await task
+            finally: event.set()
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(run())
+
+
 
 class StringParsingTests(TestCase):
 
@@ -170,7 +608,10 @@ class StringParsingTests(TestCase):
         mock_get.assert_called_with("ABCD", "file.cif")
         mock_get.return_value[0].assert_called_with("ABCD")
         mock_get.return_value[1].assert_called_with(mock_get.return_value[0].return_value)
-        mock_data.assert_called_with(mock_get.return_value[1].return_value, "cif")
+        mock_data.assert_called_with(
+         mock_get.return_value[1].return_value, "cif", models=None,
+         alt_loc="first"
+        )
         self.assertEqual(f, mock_data.return_value)
 
 
@@ -195,10 +636,49 @@ class ParseFunctionGettingTests(TestCase):
         self.assertIs(f2, pdb_dict_to_data_dict)
 
 
-    def test_bytes_mean_mmtf(self):
+    def test_can_identify_mmtf(self):
+        for start in (b"\xde", b"\xdf", b"\x80", b"\x8f"):
+            f1, f2 = get_parse_functions(start + b"ABC", "x.xxx")
+            self.assertIs(f1, mmtf_bytes_to_mmtf_dict)
+            self.assertIs(f2, mmtf_dict_to_data_dict)
+
+
+    def test_can_identify_cif_bytes(self):
+        f1, f2 = get_parse_functions(b"ABC_atom_sites", "x.xxx")
+        self.assertIs(f1, mmcif_string_to_mmcif_dict)
+        self.assertIs(f2, mmcif_dict_to_data_dict)
+
+
+    def test_can_identify_pdb_bytes(self):
         f1, f2 = get_parse_functions(b"ABC", "x.xxx")
+        self.assertIs(f1, pdb_string_to_pdb_dict)
+        self.assertIs(f2, pdb_dict_to_data_dict)
+
+
+    def test_compression_extension_is_ignored(self):
+        for ending in (".gz", ".bz2", ".xz", ".zst"):
+            f1, f2 = get_parse_functions("ABC", "x.cif" + ending)
+            self.assertIs(f1, mmcif_string_to_mmcif_dict)
+        f1, f2 = get_parse_functions(b"ABC", "x.gz")
+        self.assertIs(f1, pdb_string_to_pdb_dict)
+
+
+    def test_can_identify_cif_from_stream(self):
+        stream = io.BufferedReader(io.BytesIO(b"data_1LOL\n#\nloop_"))
+        f1, f2 = get_parse_functions(stream, "x.xxx")
+        self.assertIs(f1, mmcif_string_to_mmcif_dict)
+        self.assertEqual(stream.read(), b"data_1LOL\n#\nloop_")
+
+
+    def test_can_identify_mmtf_from_stream(self):
+        stream = io.BufferedReader(io.BytesIO(b"\xdeABC"))
+        f1, f2 = get_parse_functions(stream, "x.xxx")
         self.assertIs(f1, mmtf_bytes_to_mmtf_dict)
-        self.assertIs(f2, mmtf_dict_to_data_dict)
+
+
+    def test_only_start_of_file_is_inspected(self):
+        f1, f2 = get_parse_functions("HEADER" + " " * 5000 + "_atom_site", "x")
+        self.assertIs(f1, pdb_string_to_pdb_dict)
 
 
     def test_can_identify_cif(self):
@@ -237,7 +717,76 @@ class Saving(TestCase):
         mock_file.write = mock_write
         open_return.__enter__.return_value = mock_file
         mock_open.return_value = open_return
-        mock_write.side_effect = [Exception, None]
         save(b"filestring", "filename")
-        mock_open.assert_called_with("filename", "wb")
-        mock_write.assert_called_with(b"filestring")
+        mock_open.assert_called_once_with("filename", "wb")
+        mock_write.assert_called_once_with(b"filestring")
+
+
+    @patch("gzip.open")
+    def test_saves_compressed_string_to_file(self, mock_open):
+        open_return = MagicMock()
+        mock_file = Mock()
+        open_return.__enter__.return_value = mock_file
+        mock_open.return_value = open_return
+        save("filestring", "filename.gz")
+        mock_open.assert_called_once_with("filename.gz", "wt")
+        mock_file.write.assert_called_once_with("filestring")
+
+
+
+class WritingTests(TestCase):
+
+    @patch("builtins.open")
+    def test_can_open_text_file_for_writing(self, mock_open):
+        f = open_for_writing("filename.pdb")
+        mock_open.assert_called_with("filename.pdb", "w")
+        self.assertIs(f, mock_open.return_value)
+
+
+    @patch("builtins.open")
+    def test_can_open_binary_file_for_writing(self, mock_open):
+        f = open_for_writing("filename.mmtf", binary=True)
+        mock_open.assert_called_with("filename.mmtf", "wb")
+        self.assertIs(f, mock_open.return_value)
+
+
+    @patch("gzip.open")
+    def test_can_open_gzip_stream_for_writing(self, mock_open):
+        f = open_for_writing("filename.cif.gz")
+        mock_open.assert_called_with("filename.cif.gz", "wt")
+        f = open_for_writing("filename.mmtf.gz", binary=True)
+        mock_open.assert_called_with("filename.mmtf.gz", "wb")
+        self.assertIs(f, mock_open.return_value)
+
+
+    def test_can_write_lines(self):
+        f = Mock()
+        write_lines((line for line in ["A", "B"]), f)
+        self.assertEqual(
+         [c[0][0] for c in f.write.call_args_list], ["A", "\n", "B", "\n"]
+        )
+
+
+    @patch("atomium.utilities.write_models")
+    @patch("atomium.utilities.open_for_writing")
+    def test_can_save_models(self, mock_open, mock_write):
+        models = [Mock(), Mock()]
+        save_models(models, "models.mmtf.gz")
+        mock_open.assert_called_with("models.mmtf.gz", binary=True)
+        mock_write.assert_called_with(
+         models, mock_open.return_value.__enter__.return_value, "mmtf"
+        )
+        with self.assertRaises(ValueError):
+            save_models(models, "models.xyz")
+
+
+    @patch("atomium.utilities.models_to_pdb_lines")
+    def test_can_write_models(self, mock_lines):
+        f = Mock()
+        mock_lines.return_value = iter(["MODEL        1", "ENDMDL"])
+        write_models([Mock()], f, "pdb")
+        self.assertEqual([c[0][0] for c in f.write.call_args_list], [
+         "MODEL        1", "\n", "ENDMDL", "\n"
+        ])
+        with self.assertRaises(ValueError):
+            write_models([Mock()], f, "xyz")